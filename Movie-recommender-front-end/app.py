@@ -1,112 +1,65 @@
-import pickle
-import pandas as pd
 import streamlit as st
-import requests
-from requests.exceptions import RequestException
 import sqlite3
 from datetime import datetime
-import numpy as np
 
-# --- 1. Database Setup and User Management ---
-conn = sqlite3.connect('user_profiles.db')
-cursor = conn.cursor()
-
-cursor.execute('''CREATE TABLE IF NOT EXISTS users
-                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   username TEXT UNIQUE,
-                   password TEXT,
-                   created_at TIMESTAMP)''')
-
-cursor.execute('''CREATE TABLE IF NOT EXISTS user_watchlist
-                  (user_id INTEGER,
-                   movie_id INTEGER,
-                   movie_title TEXT,
-                   PRIMARY KEY (user_id, movie_id),
-                   FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE)''')
-
-cursor.execute('''CREATE TABLE IF NOT EXISTS movie_ratings
-                  (user_id INTEGER,
-                   movie_id INTEGER,
-                   rating INTEGER, -- 1 to 5 stars
-                   timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                   PRIMARY KEY (user_id, movie_id),
-                   FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE)''')
-
-cursor.execute('''CREATE TABLE IF NOT EXISTS movie_reviews
-                  (review_id INTEGER PRIMARY KEY AUTOINCREMENT,
-                   user_id INTEGER,
-                   movie_id INTEGER,
-                   review_text TEXT,
-                   timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
-                   FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE)''')
-
-conn.commit()
+from recommender import ann, db, instrument, metadata, posters, service
+from recommender.artifacts import ArtifactError
 
+# With RECOMMENDER_INSTRUMENT=1 every script run records timing spans and call
+# counters, shown in the sidebar's debug panel; otherwise these calls do nothing.
+# A run cut short by st.rerun() is closed when the next one starts.
+if st.session_state.get('instrument_run') is not None:
+    instrument.finish_run(st.session_state.instrument_run, interrupted=True)
+st.session_state.instrument_run = instrument.start_run('app')
 
+# --- 1. Database Setup and User Management ---
+# Connections, pragmas and schema creation live in recommender.db; the pool is
+# opened once per process, so reruns do not re-run the CREATE TABLE statements.
 def create_user(username, password):
-    try:
-        cursor.execute("INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)",
-                       (username, password, datetime.now()))
-        conn.commit()
-        return True
-    except sqlite3.IntegrityError:
-        return False
+    return db.create_user(username, password)
 
 
 def verify_user(username, password):
-    cursor.execute("SELECT id FROM users WHERE username=? AND password=?", (username, password))
-    return cursor.fetchone()
+    return db.verify_user(username, password)
 
 
 def get_username_by_id(user_id):
-    cursor.execute("SELECT username FROM users WHERE id=?", (user_id,))
-    result = cursor.fetchone()
-    return result[0] if result else "Guest"
+    return db.get_username_by_id(user_id) or "Guest"
 
 
 # --- Watchlist Functions ---
 def add_to_watchlist(user_id, movie_id, movie_title):
     try:
-        movie_id = int(movie_id)
-        cursor.execute("INSERT INTO user_watchlist (user_id, movie_id, movie_title) VALUES (?, ?, ?)",
-                       (user_id, movie_id, movie_title))
-        conn.commit()
-        st.toast(f"'{movie_title}' added to watchlist!")
-        return True
-    except sqlite3.IntegrityError:
+        if db.add_to_watchlist(user_id, movie_id, movie_title):
+            st.toast(f"'{movie_title}' added to watchlist!")
+            return True
         st.toast(f"'{movie_title}' is already in your watchlist.")
         return False
     except sqlite3.Error as e:
         st.error(f"Database error adding to watchlist: {e}")
-        conn.rollback()
         return False
 
 
 def remove_from_watchlist(user_id, movie_id):
     try:
-        movie_id = int(movie_id)
-        cursor.execute("DELETE FROM user_watchlist WHERE user_id=? AND movie_id=?", (user_id, movie_id))
-        conn.commit()
+        db.remove_from_watchlist(user_id, movie_id)
         st.toast("Removed from watchlist.")
     except sqlite3.Error as e:
         st.error(f"Database error removing from watchlist: {e}")
-        conn.rollback()
 
 
-def is_movie_in_watchlist(user_id, movie_id):
+def get_watchlist_flags(user_id, movie_ids):
+    """Set of the given movie ids that are on the user's watchlist."""
     try:
-        movie_id = int(movie_id)
-        cursor.execute("SELECT 1 FROM user_watchlist WHERE user_id=? AND movie_id=?", (user_id, movie_id))
-        return cursor.fetchone() is not None
+        return db.get_watchlist_flags(user_id, movie_ids)
     except sqlite3.Error as e:
         st.error(f"Database error checking watchlist: {e}")
-        return False
+        return set()
 
 
 def get_watchlist_movies(user_id):
     try:
-        cursor.execute("SELECT movie_id, movie_title FROM user_watchlist WHERE user_id=?", (user_id,))
-        return [(int(row[0]), row[1]) for row in cursor.fetchall()]
+        return db.get_watchlist_movies(user_id)
     except sqlite3.Error as e:
         st.error(f"Database error getting watchlist: {e}")
         return []
@@ -118,222 +71,145 @@ def get_watchlist_movies(user_id):
 # --- Rating Functions ---
 def add_movie_rating(user_id, movie_id, rating):
     try:
-        movie_id = int(movie_id)
-        cursor.execute("INSERT OR REPLACE INTO movie_ratings (user_id, movie_id, rating) VALUES (?, ?, ?)",
-                       (user_id, movie_id, rating))
-        conn.commit()
+        db.add_movie_rating(user_id, movie_id, rating)
         st.toast(f"Your rating ({rating} stars) saved!")
     except sqlite3.Error as e:
         st.error(f"Database error saving rating: {e}")
-        conn.rollback()
 
 def get_user_movie_rating(user_id, movie_id):
     try:
-        movie_id = int(movie_id)
-        cursor.execute("SELECT rating FROM movie_ratings WHERE user_id=? AND movie_id=?", (user_id, movie_id))
-        result = cursor.fetchone()
-        return result[0] if result else None
+        return db.get_user_movie_rating(user_id, movie_id)
     except sqlite3.Error as e:
         st.error(f"Database error getting user rating: {e}")
         return None
 
-def get_average_movie_rating(movie_id):
+def get_average_ratings(movie_ids):
+    """{movie_id: (avg_rating, num_ratings)} for a whole grid page in one query."""
+    movie_ids = [int(movie_id) for movie_id in movie_ids]
     try:
-        movie_id = int(movie_id)
-        cursor.execute("SELECT AVG(rating), COUNT(rating) FROM movie_ratings WHERE movie_id=?", (movie_id,))
-        result = cursor.fetchone()
-        avg_rating = round(result[0], 1) if result[0] else None
-        num_ratings = result[1] if result[1] else 0
-        return avg_rating, num_ratings
+        return db.get_average_ratings(movie_ids)
     except sqlite3.Error as e:
-        st.error(f"Database error calculating average rating: {e}")
-        return None, 0
+        st.error(f"Database error calculating average ratings: {e}")
+        return {movie_id: (None, 0) for movie_id in movie_ids}
 
 
 # --- Review Functions ---
 def add_movie_review(user_id, movie_id, review_text):
     try:
-        movie_id = int(movie_id)
-        cursor.execute("INSERT INTO movie_reviews (user_id, movie_id, review_text) VALUES (?, ?, ?)",
-                       (user_id, movie_id, review_text))
-        conn.commit()
+        db.add_movie_review(user_id, movie_id, review_text)
         st.toast("Your review has been submitted!")
     except sqlite3.Error as e:
         st.error(f"Database error submitting review: {e}")
-        conn.rollback()
 
-def get_movie_reviews(movie_id):
+def get_movie_reviews_page(movie_id, limit, after=None):
+    """Returns (reviews, next_cursor) for one page of reviews, newest first."""
     try:
-        movie_id = int(movie_id)
-        cursor.execute("""
-            SELECT mr.review_text, u.username, mr.timestamp
-            FROM movie_reviews mr
-            JOIN users u ON mr.user_id = u.id
-            WHERE mr.movie_id = ?
-            ORDER BY mr.timestamp DESC
-        """, (movie_id,))
-        return cursor.fetchall()
+        return db.get_movie_reviews_page(movie_id, limit=limit, after=after)
     except sqlite3.Error as e:
         st.error(f"Database error getting reviews: {e}")
-        return []
+        return [], None
 
+def get_review_count(movie_id):
+    try:
+        return db.get_review_count(movie_id)
+    except sqlite3.Error as e:
+        st.error(f"Database error counting reviews: {e}")
+        return 0
 
-# --- 2. API and Recommendation Logic ---
-TMDB_API_KEY = '5a0f912e8b0ae43f239e2346fda7634f' # Your TMDB API Key
-OMDB_API_KEY = 'caf997f4' # Replace with your OMDb API key
 
-@st.cache_data
+# --- 2. API and Recommendation Logic ---
+# TMDB/OMDb lookups are cached on disk by recommender.metadata (with expiry and
+# short-lived caching of failures), so they are not wrapped in st.cache_data.
+@instrument.timed('app.fetch_movie_details_from_tmdb')
 def fetch_movie_details_from_tmdb(movie_id):
     """Fetches comprehensive movie details from TMDB."""
-    details = {}
-    try:
-        movie_id = int(movie_id)
-        base_url = "https://api.themoviedb.org/3/movie/"
+    details = metadata.fetch_movie_details(movie_id)
+    if 'error' in details:
+        st.error(details['error'])
+    return details
 
-        # Fetch main details
-        response_main = requests.get(
-            f'{base_url}{movie_id}?api_key={TMDB_API_KEY}&language=en-us', timeout=5
-        )
-        response_main.raise_for_status()
-        main_data = response_main.json()
 
-        details['poster_path'] = "https://image.tmdb.org/t/p/w500" + main_data.get('poster_path', '') if main_data.get('poster_path') else "https://via.placeholder.com/150?text=No+Poster"
-        details['overview'] = main_data.get('overview', 'No overview available.')
-        details['release_date'] = main_data.get('release_date', 'N/A')
-        details['runtime'] = main_data.get('runtime', 'N/A')
-        details['imdb_id'] = main_data.get('imdb_id', None) # To fetch OMDb data
-        details['genres'] = [genre['name'] for genre in main_data.get('genres', [])]
+@instrument.timed('app.prefetch_movie_details')
+def prefetch_movie_details(movie_ids):
+    """Fetches TMDB details for a whole page of movies concurrently. Returns {movie_id: details}."""
+    all_details = metadata.fetch_movie_details_many(movie_ids)
+    for details in all_details.values():
+        if 'error' in details:
+            st.error(details['error'])
+    return all_details
 
 
-        # Fetch credits (cast and crew)
-        response_credits = requests.get(
-            f'{base_url}{movie_id}/credits?api_key={TMDB_API_KEY}', timeout=5
-        )
-        response_credits.raise_for_status()
-        credits_data = response_credits.json()
-        details['cast'] = [c['name'] for c in credits_data.get('cast', [])[:5]] # Top 5 cast
-        details['director'] = next((crew['name'] for crew in credits_data.get('crew', []) if crew['job'] == 'Director'), 'N/A')
-
-        # Fetch videos (trailers/teasers)
-        response_videos = requests.get(
-            f'{base_url}{movie_id}/videos?api_key={TMDB_API_KEY}', timeout=5
-        )
-        response_videos.raise_for_status()
-        videos_data = response_videos.json()
-        trailer_key = None
-        for video in videos_data.get('results', []):
-            if video.get('site') == 'YouTube' and 'Trailer' in video.get('type', ''):
-                trailer_key = video['key']
-                break
-            elif video.get('site') == 'YouTube' and 'Teaser' in video.get('type', ''):
-                trailer_key = video['key']
-        details['youtube_trailer_key'] = trailer_key
-
-    except RequestException as e:
-        st.error(f"Error fetching movie details from TMDB for ID {movie_id}: {e}")
-        details['poster_path'] = "https://via.placeholder.com/150?text=Error"
-    except ValueError:
-        st.error(f"Invalid movie ID: {movie_id}")
-        details['poster_path'] = "https://via.placeholder.com/150?text=Invalid+ID"
-    return details
+# Grid posters come from the local poster store (recommender.posters): each one is
+# downloaded from TMDB once, resized, and served to the browser by Streamlit.
+@instrument.timed('app.page_posters')
+def page_posters(page_details, variant='grid'):
+    """Local poster files for ``{movie_id: details}``, as ``{movie_id: path}``."""
+    try:
+        files = posters.get_store().paths_for((details['poster_path'] for details in page_details.values()), variant)
+    except OSError as e:
+        st.toast(f"Poster cache unavailable, loading posters from TMDB instead. ({e})")
+        return {movie_id: details['poster_path'] for movie_id, details in page_details.items()}
+    return {movie_id: files[details['poster_path']] for movie_id, details in page_details.items()}
 
 
-@st.cache_data
+@instrument.timed('app.fetch_omdb_data')
 def fetch_omdb_data(imdb_id):
     """Fetches IMDb and Rotten Tomatoes ratings from OMDb API."""
-    if not imdb_id or OMDB_API_KEY == 'YOUR_OMDB_API_KEY':
-        return None, None # Return None if no IMDb ID or API key not set
-    try:
-        response = requests.get(
-            f'http://www.omdbapi.com/?i={imdb_id}&apikey={OMDB_API_KEY}', timeout=5
-        )
-        response.raise_for_status()
-        data = response.json()
-        if data.get('Response') == 'True':
-            imdb_rating = data.get('imdbRating', 'N/A')
-            rotten_tomatoes_rating = 'N/A'
-            for rating_source in data.get('Ratings', []):
-                if rating_source.get('Source') == 'Rotten Tomatoes':
-                    rotten_tomatoes_rating = rating_source.get('Value', 'N/A')
-                    break
-            return imdb_rating, rotten_tomatoes_rating
-        return 'N/A', 'N/A'
-    except RequestException as e:
-        # st.warning(f"Could not fetch OMDb data for {imdb_id}: {e}. Ensure your OMDb API key is correct.")
-        return 'N/A', 'N/A'
-    except Exception as e:
-        # st.warning(f"An unexpected error occurred while fetching OMDb data for {imdb_id}: {e}")
-        return 'N/A', 'N/A'
+    return metadata.fetch_omdb_ratings(imdb_id)
 
 
-@st.cache_data
-def recommend(movie_title):
-    if movie_title not in movies['title'].values:
-        st.error(f"Error: Movie '{movie_title}' not found in the dataset for recommendation.")
-        return [], [], []
-
+# Ranked results (ids and scores only) are cached by recommender.results under
+# (title, k, model version); titles and posters are filled in separately.
+@instrument.timed('app.recommend')
+def recommend(movie_title, k=6):
+    """Movie ids and scores of the k movies most similar to the title, best first."""
     try:
-        movie_index = movies[movies['title'] == movie_title].index[0]
-        if movie_index >= similarity.shape[0] or movie_index >= similarity.shape[1]:
-            st.error(f"Error: Similarity data malformed for index {movie_index}. Cannot recommend.")
-            return [], [], []
-
-        distances = similarity[movie_index]
-        similar_movies = sorted(list(enumerate(distances)), reverse=True, key=lambda x: x[1])[1:7]
-
-        recommended_names = []
-        recommended_posters = []
-        recommended_ids = []
-
-        for idx, _ in similar_movies:
-            if idx < len(movies):
-                rec_movie = movies.iloc[idx]
-                recommended_names.append(rec_movie.title)
-                # Use fetch_movie_details_from_tmdb to get poster for recommendations
-                details = fetch_movie_details_from_tmdb(int(rec_movie.id))
-                recommended_posters.append(details['poster_path'])
-                recommended_ids.append(int(rec_movie.id))
-            else:
-                st.warning(f"Warning: Recommended movie index {idx} out of bounds.")
-
-        return recommended_names, recommended_posters, recommended_ids
+        return core.recommend(movie_title, k)
+    except KeyError:
+        st.error(f"Error: Movie '{movie_title}' not found in the dataset for recommendation.")
+        return (), ()
     except IndexError:
         st.error(f"Internal Error: Movie '{movie_title}' index not found. Data inconsistency.")
-        return [], [], []
+        return (), ()
     except Exception as e:
         st.error(f"An unexpected error occurred during recommendation: {str(e)}")
-        return [], [], []
+        return (), ()
+
+
+def movie_titles(movie_ids):
+    """Titles for movie ids, from the loaded model."""
+    return core.titles_for_ids(movie_ids)
+
+
+@instrument.timed('app.recommend_for_you')
+def recommend_for_you(user_id, k=10):
+    """Ids of personalized picks from the user's ratings and watchlist; empty until they have any."""
+    try:
+        movie_ids, _ = core.for_you(user_id, k=k)
+        return movie_ids
+    except sqlite3.Error as e:
+        st.error(f"Database error building your recommendations: {e}")
+        return []
+
+
+PICKER_SUGGESTIONS = 20 # Titles offered in the recommendation dropdown
 
 
 # --- 3. Data Loading ---
 try:
-    movies_data = pickle.load(open("movie_dick.pkl", 'rb'))
-    movies = pd.DataFrame(movies_data)
-    similarity = pickle.load(open("similarity.pkl", 'rb'))
-
-    if not isinstance(movies, pd.DataFrame) or 'title' not in movies.columns or 'id' not in movies.columns:
-        st.error("Error: 'movie_dick.pkl' is not a valid DataFrame or missing required columns.")
-        st.stop()
-    if not isinstance(similarity, (list, tuple, np.ndarray)):
-        st.error("Error: 'similarity.pkl' is not in an expected array/list/numpy array format.")
-        st.stop()
-
-    if 'genres' not in movies.columns:
-        movies['genres'] = [[] for _ in range(len(movies))]
-    else:
-        def parse_genres_string(genre_string):
-            if isinstance(genre_string, list): return genre_string
-            if isinstance(genre_string, str):
-                try: return eval(genre_string)
-                except (SyntaxError, TypeError):
-                    return [g.strip() for g in genre_string.split('|')] if '|' in genre_string else [genre_string.strip()]
-            return []
-
-        movies['genres'] = movies['genres'].apply(parse_genres_string)
-        movies['genres'] = movies['genres'].apply(lambda x: [str(g) for g in x] if isinstance(x, list) else [])
-
-except (FileNotFoundError, pickle.PickleError) as e:
-    st.error(f"Failed to load essential data files. Please ensure 'movie_dick.pkl' and 'similarity.pkl' are in the same directory. Error: {e}")
+    # The model and everything derived from it (lookups, search index, live search
+    # backend) are loaded once per process and shared by every session; a rerun
+    # only checks that the model on disk has not changed.
+    core = service.load_recommender("model", ann.DEFAULT_BACKEND)
+    movies = core.movies
+    movie_lookup = core.lookup
+    title_index = core.title_index
+    if core.engine_error:
+        st.warning(f"Live search backend '{ann.DEFAULT_BACKEND}' unavailable, using precomputed neighbors. ({core.engine_error})")
+
+except (FileNotFoundError, ArtifactError) as e:
+    st.error(f"Failed to load essential data files. Please ensure the 'model' directory is next to app.py "
+             f"(convert old pickles with `python -m recommender.artifacts convert movie_dick.pkl similarity.pkl`). Error: {e}")
     st.stop()
 except Exception as e:
     st.error(f"An unexpected error occurred during data loading: {e}")
@@ -382,7 +258,10 @@ div.st-emotion-cache-1r6dm7f > div > div > div > div:nth-child(2) > p.movie-titl
 .stButton > button[key^="view_reviews_"],
 .stButton > button[key^="expand_rec_details_"], /* Styling for the view/rate/review button */
 .stButton > button[key^="expand_browse_details_"],
-.stButton > button[key^="expand_watchlist_details_"] {
+.stButton > button[key^="expand_watchlist_details_"],
+.stButton > button[key^="for_you_watchlist_"],
+.stButton > button[key^="get_rec_from_for_you_"],
+.stButton > button[key^="expand_for_you_details_"] {
     font-size: 0.7em;
     padding: 0.2em 0.4em !important;
     margin-top: 5px;
@@ -421,7 +300,8 @@ if 'current_page' not in st.session_state: st.session_state.current_page = 1
 if 'search_query' not in st.session_state: st.session_state.search_query = ""
 if 'search_triggered' not in st.session_state: st.session_state.search_triggered = False
 if 'expanded_movie_id' not in st.session_state: st.session_state.expanded_movie_id = None
-# Initialize pagination states for reviews per movie details
+# Initialize pagination states for reviews per movie details: for each movie, the
+# stack of keyset cursors that start the pages visited so far (None = first page)
 if 'reviews_page_dict' not in st.session_state: st.session_state.reviews_page_dict = {}
 
 
@@ -438,7 +318,7 @@ def display_movie_details(movie_id, movie_title, user_id, key_suffix=""):
     """
     # Ensure pagination states are initialized for this specific movie
     if movie_id not in st.session_state.reviews_page_dict:
-        st.session_state.reviews_page_dict[movie_id] = 1
+        st.session_state.reviews_page_dict[movie_id] = [None]
 
     with st.expander(f"Details for {movie_title}", expanded=True):
         details = fetch_movie_details_from_tmdb(movie_id)
@@ -494,37 +374,36 @@ def display_movie_details(movie_id, movie_title, user_id, key_suffix=""):
 
         st.markdown("---")
         st.subheader("All Reviews:")
-        all_reviews = get_movie_reviews(movie_id)
         reviews_per_page = 5
-        current_reviews_page = st.session_state.reviews_page_dict[movie_id]
-        total_reviews_pages = (len(all_reviews) + reviews_per_page - 1) // reviews_per_page
+        page_cursors = st.session_state.reviews_page_dict[movie_id]
+        current_reviews_page = len(page_cursors)
+        total_reviews = get_review_count(movie_id)
+        total_reviews_pages = (total_reviews + reviews_per_page - 1) // reviews_per_page
         if total_reviews_pages == 0: total_reviews_pages = 1 # At least 1 page even if no reviews
 
-        st.markdown(f"<p style='text-align: center; font-size: 0.9em; color: #666;'>Showing {min(reviews_per_page, len(all_reviews))} of {len(all_reviews)} reviews</p>", unsafe_allow_html=True)
+        current_page_reviews, next_cursor = get_movie_reviews_page(movie_id, reviews_per_page, after=page_cursors[-1])
 
-        if all_reviews:
-            start_review_idx = (current_reviews_page - 1) * reviews_per_page
-            end_review_idx = start_review_idx + reviews_per_page
-            current_page_reviews = all_reviews[start_review_idx:end_review_idx]
+        st.markdown(f"<p style='text-align: center; font-size: 0.9em; color: #666;'>Showing {len(current_page_reviews)} of {total_reviews} reviews</p>", unsafe_allow_html=True)
 
+        if current_page_reviews:
             for review_text, reviewer_username, timestamp in current_page_reviews:
                 st.markdown(f"**{reviewer_username}** ({datetime.fromisoformat(timestamp).strftime('%Y-%m-%d %H:%M')}): *{review_text}*")
 
             # Review Pagination
-            if total_reviews_pages > 1:
+            if current_reviews_page > 1 or next_cursor is not None:
                 review_nav_cols = st.columns([1, 1, 1])
                 with review_nav_cols[0]:
                     if current_reviews_page > 1:
                         if st.button("⬅️ Prev Review Page", key=f"prev_review_page_{movie_id}_{key_suffix}"):
-                            st.session_state.reviews_page_dict[movie_id] -= 1
+                            page_cursors.pop()
                             st.session_state.expanded_movie_id = movie_id # Keep expanded
                             st.rerun()
                 with review_nav_cols[1]:
                     st.markdown(f"<p style='text-align: center; margin-top: 10px; font-size: 0.8em;'>Page {current_reviews_page} of {total_reviews_pages}</p>", unsafe_allow_html=True)
                 with review_nav_cols[2]:
-                    if current_reviews_page < total_reviews_pages:
+                    if next_cursor is not None:
                         if st.button("Next Review Page ➡️", key=f"next_review_page_{movie_id}_{key_suffix}"):
-                            st.session_state.reviews_page_dict[movie_id] += 1
+                            page_cursors.append(next_cursor)
                             st.session_state.expanded_movie_id = movie_id # Keep expanded
                             st.rerun()
         else: st.info("No reviews yet. Be the first!")
@@ -599,6 +478,15 @@ else:
             st.session_state.expanded_movie_id = None
             st.session_state.reviews_page_dict = {} # Reset pagination dicts on navigation
             st.rerun()
+        if st.button("For You", key="nav_for_you",
+                     type="primary" if st.session_state.current_view == 'for_you' else "secondary"):
+            st.session_state.current_view = 'for_you'
+            st.session_state.current_page = 1
+            st.session_state.search_query = ""
+            st.session_state.search_triggered = False
+            st.session_state.expanded_movie_id = None
+            st.session_state.reviews_page_dict = {} # Reset pagination dicts on navigation
+            st.rerun()
         if st.button("My Watchlist", key="nav_watchlist",
                      type="primary" if st.session_state.current_view == 'watchlist' else "secondary"):
             st.session_state.current_view = 'watchlist'
@@ -625,22 +513,35 @@ else:
     if st.session_state.current_view == 'recommendations':
         st.header("Find Your Next Movie")
         st.markdown("""
-            Select a movie from the dropdown to discover **6 similar movie recommendations**!
+            Search for a movie and pick it from the dropdown to discover **6 similar movie recommendations**!
         """)
         st.markdown("---")
 
+        # Type-ahead: only the best matches for what has been typed are sent to the dropdown.
+        picker_query = st.text_input(
+            'Search for a movie:',
+            key="picker_query",
+            placeholder="Start typing a title, e.g. Avatar",
+            help="Typos are fine; press Enter to refresh the suggestions below."
+        )
+        if picker_query.strip():
+            picker_rows = title_index.suggest(picker_query, limit=PICKER_SUGGESTIONS)
+        else:
+            picker_rows = range(min(PICKER_SUGGESTIONS, len(movies)))
+        picker_titles = list(dict.fromkeys(movies['title'].iloc[list(picker_rows)]))
+
         with st.form("recommendation_form"):
             selected_movie_name = st.selectbox(
-                'Choose a movie from our extensive list:',
-                movies['title'].values,
-                index=0,
+                'Choose a movie from the matches:',
+                picker_titles,
+                index=0 if picker_titles else None,
                 key="selected_movie_input",
-                help="Start typing or scroll to find your desired movie."
+                help="Narrow the list by typing in the search box above."
             )
 
             submitted = st.form_submit_button('Get Recommendations', type="primary")
 
-            if submitted:
+            if submitted and selected_movie_name:
                 st.session_state.last_recommended_movie = selected_movie_name
                 st.session_state.expanded_movie_id = None
                 st.session_state.reviews_page_dict = {} # Reset pagination dicts for new recommendations
@@ -648,32 +549,35 @@ else:
 
         if st.session_state.last_recommended_movie:
             with st.spinner(f'🚀 Finding awesome recommendations for "{st.session_state.last_recommended_movie}"...'):
-                names, posters, ids = recommend(st.session_state.last_recommended_movie)
+                ids, _ = recommend(st.session_state.last_recommended_movie)
 
-                if names and posters and ids:
+                if ids:
+                    names = movie_titles(ids)
                     st.subheader(f"Because you watched: **{st.session_state.last_recommended_movie}**")
                     st.markdown("Here are some movies you might enjoy:")
 
                     cols = st.columns(len(names))
+                    page_details = prefetch_movie_details(ids)
+                    page_poster_files = page_posters(page_details)
+                    page_ratings = get_average_ratings(ids)
+                    page_watchlist = get_watchlist_flags(st.session_state.user_id, ids)
 
                     for i in range(len(names)):
                         with cols[i]:
-                            # Use fetch_movie_details_from_tmdb to get a consistent poster
-                            movie_details_summary = fetch_movie_details_from_tmdb(ids[i])
-                            st.image(movie_details_summary['poster_path'], caption=names[i], use_container_width=True)
+                            st.image(page_poster_files[int(ids[i])], caption=names[i], use_container_width=True)
 
                             movie_id = ids[i]
                             movie_title = names[i]
                             user_id = st.session_state.user_id
 
-                            avg_rating, num_ratings = get_average_movie_rating(movie_id)
+                            avg_rating, num_ratings = page_ratings[int(movie_id)]
                             if avg_rating is not None:
                                 st.markdown(f"<p class='avg-rating-text'>Average: <span class='star-rating-display'>{'★' * int(round(avg_rating))}</span> ({avg_rating:.1f}/5 from {num_ratings} users)</p>", unsafe_allow_html=True)
                             else:
                                 st.markdown(f"<p class='avg-rating-text'>No ratings yet.</p>", unsafe_allow_html=True)
 
 
-                            on_watchlist = is_movie_in_watchlist(user_id, movie_id)
+                            on_watchlist = int(movie_id) in page_watchlist
                             watchlist_button_label = "Remove from Watchlist" if on_watchlist else "Add to Watchlist"
                             watchlist_button_type = "secondary" if on_watchlist else "secondary"
 
@@ -693,7 +597,7 @@ else:
                                 else:
                                     st.session_state.expanded_movie_id = movie_id
                                 # Reset review pagination for this specific movie when expanding
-                                st.session_state.reviews_page_dict[movie_id] = 1
+                                st.session_state.reviews_page_dict[movie_id] = [None]
                                 st.rerun()
 
                             if is_expanded:
@@ -736,17 +640,14 @@ else:
                 st.session_state.reviews_page_dict = {} # Reset pagination dicts on clear search
                 st.rerun()
 
-        movies_to_display_filtered = movies.copy()
-
+        # Matching rows, best match first; None lists the whole table in order without copying it.
+        matching_rows = None
         if st.session_state.search_triggered and st.session_state.search_query:
-            search_term_lower = st.session_state.search_query.lower()
-            movies_to_display_filtered = movies_to_display_filtered[
-                movies_to_display_filtered['title'].str.lower().str.contains(search_term_lower, na=False)
-            ].copy()
-            if movies_to_display_filtered.empty:
+            matching_rows = title_index.search(st.session_state.search_query)
+            if not matching_rows:
                 st.warning(f"No movies found matching '{st.session_state.search_query}'.")
 
-        total_movies = len(movies_to_display_filtered)
+        total_movies = len(movies) if matching_rows is None else len(matching_rows)
         movies_per_page = 15
         total_pages = (total_movies + movies_per_page - 1) // movies_per_page
         if total_pages == 0: total_pages = 1
@@ -754,10 +655,17 @@ else:
         start_idx = (st.session_state.current_page - 1) * movies_per_page
         end_idx = start_idx + movies_per_page
 
-        current_page_movies = movies_to_display_filtered.iloc[start_idx:end_idx]
+        if matching_rows is None:
+            current_page_movies = movies.iloc[start_idx:end_idx]
+        else:
+            current_page_movies = movies.iloc[matching_rows[start_idx:end_idx]]
 
         cols_per_row = 5
         rows = (len(current_page_movies) + cols_per_row - 1) // cols_per_row
+        page_details = prefetch_movie_details(current_page_movies['id'])
+        page_poster_files = page_posters(page_details)
+        page_ratings = get_average_ratings(current_page_movies['id'])
+        page_watchlist = get_watchlist_flags(st.session_state.user_id, current_page_movies['id'])
 
         for i in range(rows):
             current_row_cols = st.columns(cols_per_row)
@@ -769,12 +677,10 @@ else:
                     movie_title = movie_row.title
 
                     with current_row_cols[j]:
-                        # Use fetch_movie_details_from_tmdb to get the poster
-                        movie_details_summary = fetch_movie_details_from_tmdb(movie_id)
-                        st.image(movie_details_summary['poster_path'], use_container_width=True)
+                        st.image(page_poster_files[int(movie_id)], use_container_width=True)
                         st.markdown(f"<p class='movie-title-display'>{movie_title}</p>", unsafe_allow_html=True)
 
-                        avg_rating, num_ratings = get_average_movie_rating(movie_id)
+                        avg_rating, num_ratings = page_ratings[int(movie_id)]
                         if avg_rating is not None:
                             st.markdown(f"<p class='avg-rating-text'>Average: <span class='star-rating-display'>{'★' * int(round(avg_rating))}</span> ({avg_rating:.1f}/5 from {num_ratings} users)</p>", unsafe_allow_html=True)
                         else:
@@ -794,7 +700,7 @@ else:
                             st.session_state.reviews_page_dict = {} # Reset pagination dicts for new recommendation
                             st.rerun()
 
-                        on_watchlist = is_movie_in_watchlist(st.session_state.user_id, movie_id)
+                        on_watchlist = int(movie_id) in page_watchlist
                         watchlist_button_label = "Remove from Watchlist" if on_watchlist else "Add to Watchlist"
                         watchlist_button_type = "secondary" if on_watchlist else "secondary"
 
@@ -820,7 +726,7 @@ else:
                             else:
                                 st.session_state.expanded_movie_id = movie_id
                             # Reset review pagination for this specific movie when expanding
-                            st.session_state.reviews_page_dict[movie_id] = 1
+                            st.session_state.reviews_page_dict[movie_id] = [None]
                             st.rerun()
 
                         if is_expanded:
@@ -847,6 +753,80 @@ else:
                     st.session_state.reviews_page_dict = {} # Reset pagination dicts on page change
                     st.rerun()
 
+    elif st.session_state.current_view == 'for_you':
+        st.subheader("Recommended For You")
+        st.markdown("Picked from the movies you rated and added to your watchlist:")
+        st.markdown("---")
+
+        for_you_ids = recommend_for_you(st.session_state.user_id)
+        for_you_titles = movie_titles(for_you_ids)
+
+        if not for_you_ids:
+            st.info("Rate some movies or add them to your watchlist to get personalized recommendations!")
+        else:
+            cols_per_row = 5
+            num_movies = len(for_you_ids)
+            rows = (num_movies + cols_per_row - 1) // cols_per_row
+            page_details = prefetch_movie_details(for_you_ids)
+            page_poster_files = page_posters(page_details)
+            page_ratings = get_average_ratings(for_you_ids)
+            page_watchlist = get_watchlist_flags(st.session_state.user_id, for_you_ids)
+
+            for i in range(rows):
+                current_row_cols = st.columns(cols_per_row)
+                for j in range(cols_per_row):
+                    idx = i * cols_per_row + j
+                    if idx < num_movies:
+                        movie_id = for_you_ids[idx]
+                        movie_title = for_you_titles[idx]
+
+                        with current_row_cols[j]:
+                            st.image(page_poster_files[int(movie_id)], use_container_width=True)
+                            st.markdown(f"<p class='movie-title-display'>{movie_title}</p>", unsafe_allow_html=True)
+
+                            avg_rating, num_ratings = page_ratings[int(movie_id)]
+                            if avg_rating is not None:
+                                st.markdown(f"<p class='avg-rating-text'>Average: <span class='star-rating-display'>{'★' * int(round(avg_rating))}</span> ({avg_rating:.1f}/5 from {num_ratings} users)</p>", unsafe_allow_html=True)
+                            else:
+                                st.markdown("<p class='avg-rating-text'>No ratings yet.</p>", unsafe_allow_html=True)
+
+                            on_watchlist = int(movie_id) in page_watchlist
+                            watchlist_button_label = "Remove from Watchlist" if on_watchlist else "Add to Watchlist"
+
+                            if st.button(watchlist_button_label, key=f"for_you_watchlist_{movie_id}", type="secondary"):
+                                if on_watchlist: remove_from_watchlist(st.session_state.user_id, movie_id)
+                                else: add_to_watchlist(st.session_state.user_id, movie_id, movie_title)
+                                st.rerun()
+
+                            if st.button(
+                                    "Get Recs",
+                                    key=f"get_rec_from_for_you_{movie_id}",
+                                    type="primary"
+                            ):
+                                st.session_state.current_view = 'recommendations'
+                                st.session_state.last_recommended_movie = movie_title
+                                st.session_state.current_page = 1
+                                st.session_state.expanded_movie_id = None
+                                st.session_state.reviews_page_dict = {} # Reset pagination dicts for new recommendation
+                                st.rerun()
+
+                            expand_key = f"expand_for_you_details_{movie_id}"
+                            is_expanded = (st.session_state.expanded_movie_id == movie_id)
+                            button_label = "Hide Details" if is_expanded else "View/Rate/Review"
+                            button_type = "primary" if is_expanded else "secondary"
+
+                            if st.button(button_label, key=expand_key, type=button_type):
+                                if is_expanded:
+                                    st.session_state.expanded_movie_id = None
+                                else:
+                                    st.session_state.expanded_movie_id = movie_id
+                                # Reset review pagination for this specific movie when expanding
+                                st.session_state.reviews_page_dict[movie_id] = [None]
+                                st.rerun()
+
+                            if is_expanded:
+                                display_movie_details(movie_id, movie_title, st.session_state.user_id, key_suffix="for_you")
+
     elif st.session_state.current_view == 'watchlist':
         st.subheader("My Watchlist")
         st.markdown("Movies you've added to your watchlist:")
@@ -860,6 +840,9 @@ else:
             cols_per_row = 5
             num_movies = len(watchlist_movies)
             rows = (num_movies + cols_per_row - 1) // cols_per_row
+            page_details = prefetch_movie_details(movie_id for movie_id, _ in watchlist_movies)
+            page_poster_files = page_posters(page_details)
+            page_ratings = get_average_ratings(movie_id for movie_id, _ in watchlist_movies)
 
             for i in range(rows):
                 current_row_cols = st.columns(cols_per_row)
@@ -869,12 +852,10 @@ else:
                         movie_id, movie_title = watchlist_movies[idx]
 
                         with current_row_cols[j]:
-                            # Use fetch_movie_details_from_tmdb to get the poster
-                            movie_details_summary = fetch_movie_details_from_tmdb(movie_id)
-                            st.image(movie_details_summary['poster_path'], use_container_width=True)
+                            st.image(page_poster_files[int(movie_id)], use_container_width=True)
                             st.markdown(f"<p class='movie-title-display'>{movie_title}</p>", unsafe_allow_html=True)
 
-                            avg_rating, num_ratings = get_average_movie_rating(movie_id)
+                            avg_rating, num_ratings = page_ratings[int(movie_id)]
                             if avg_rating is not None:
                                 st.markdown(f"<p class='avg-rating-text'>Average: <span class='star-rating-display'>{'★' * int(round(avg_rating))}</span> ({avg_rating:.1f}/5 from {num_ratings} users)</p>", unsafe_allow_html=True)
                             else:
@@ -909,8 +890,27 @@ else:
                                 else:
                                     st.session_state.expanded_movie_id = movie_id
                                 # Reset review pagination for this specific movie when expanding
-                                st.session_state.reviews_page_dict[movie_id] = 1
+                                st.session_state.reviews_page_dict[movie_id] = [None]
                                 st.rerun()
 
                             if is_expanded:
-                                display_movie_details(movie_id, movie_title, st.session_state.user_id, key_suffix="watchlist")
\ No newline at end of file
+                                display_movie_details(movie_id, movie_title, st.session_state.user_id, key_suffix="watchlist")
+
+
+# --- 8. Debug Panel ---
+if instrument.enabled():
+    run = instrument.finish_run(st.session_state.instrument_run)
+    with st.sidebar.expander("Debug: performance"):
+        st.markdown(f"**This run:** {run.duration * 1000:.1f} ms, "
+                    f"{run.counter('http_requests')} HTTP requests, {run.counter('sql_statements')} SQL statements")
+        spans = [{'span': name, 'calls': calls, 'total ms': round(total * 1000, 2), 'max ms': round(longest * 1000, 2)}
+                 for name, (calls, total, longest) in run.span_summary().items()]
+        if spans:
+            st.dataframe(spans, hide_index=True)
+        run_ratios = instrument.cache_hit_ratios(run.counters)
+        for cache, entry in instrument.cache_hit_ratios().items():
+            this_run = run_ratios.get(cache)
+            this_run_text = f"{this_run['hits']}/{this_run['hits'] + this_run['misses']} this run, " if this_run else ""
+            st.markdown(f"Cache `{cache}`: {this_run_text}{entry['hit_ratio']:.0%} hit ratio overall")
+        st.download_button("Download metrics (Prometheus)", instrument.prometheus_text(),
+                           file_name="metrics.prom", mime="text/plain")
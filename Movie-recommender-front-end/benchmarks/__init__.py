@@ -0,0 +1 @@
+"""Benchmarks for the offline build and the app's hot paths. Run from ``Movie-recommender-front-end``."""
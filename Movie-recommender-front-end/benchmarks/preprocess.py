@@ -0,0 +1,103 @@
+"""Tag preprocessing: the notebook's per-row approach vs ``recommender.preprocess``.
+
+    python -m benchmarks.preprocess --movies ../data/tmdb_5000_movies.csv --credits ../data/tmdb_5000_credits.csv
+    python -m benchmarks.preprocess --synthetic 20000 --workers 4
+
+Both approaches must produce identical tags; the script checks that before
+reporting timings.
+"""
+import argparse
+import ast
+import json
+import os
+import random
+import time
+
+from nltk.stem.porter import PorterStemmer
+
+from recommender import preprocess
+from recommender.build import load_catalog
+
+
+# --- The notebook's version ---
+def notebook_tags(rows):
+    """``convert``/``convert3``/``fetch_director`` + ``stem`` as the notebook runs them."""
+    ps = PorterStemmer()
+
+    def convert(obj):
+        return [i['name'] for i in ast.literal_eval(obj)]
+
+    def convert3(obj):
+        return [i['name'] for i in ast.literal_eval(obj)][:3]
+
+    def fetch_director(obj):
+        return [i['name'] for i in ast.literal_eval(obj) if i['job'] == 'Director'][:1]
+
+    def stem(text):
+        return " ".join(ps.stem(i) for i in text.split())
+
+    tags = []
+    for overview, genres, keywords, cast, crew in rows:
+        words = overview.split()
+        for names in (convert(genres), convert(keywords), convert3(cast), fetch_director(crew)):
+            words.extend(name.replace(" ", "") for name in names)
+        tags.append(stem(" ".join(words).lower()))
+    return tags
+
+
+def synthetic_rows(n, seed=0):
+    """TMDB-shaped rows with a Zipf-like word distribution."""
+    rng = random.Random(seed)
+    words = [f"word{i}" for i in range(20000)]
+    weights = [1 / (i + 1) for i in range(len(words))]
+    people = [f"Person {i}" for i in range(50000)]
+    genres = ["Action", "Adventure", "Comedy", "Drama", "Science Fiction", "Horror", "Romance", "Thriller"]
+
+    def names(values):
+        return json.dumps([{'id': i, 'name': value} for i, value in enumerate(values)])
+
+    rows = []
+    for _ in range(n):
+        overview = " ".join(rng.choices(words, weights, k=rng.randint(20, 60)))
+        cast = names(rng.sample(people, 8))
+        crew = json.dumps([{'job': rng.choice(['Director', 'Producer', 'Writer']), 'name': name}
+                           for name in rng.sample(people, 6)])
+        rows.append((overview, names(rng.sample(genres, 3)), names(rng.choices(words, weights, k=8)), cast, crew))
+    return rows
+
+
+def timed(fn, *args, **kwargs):
+    started = time.perf_counter()
+    result = fn(*args, **kwargs)
+    return result, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark tag preprocessing.")
+    parser.add_argument('--movies', help="Path to tmdb_5000_movies.csv")
+    parser.add_argument('--credits', help="Path to tmdb_5000_credits.csv")
+    parser.add_argument('--synthetic', type=int, default=5000, help="Synthetic catalog size when no CSVs are given")
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help="Processes for the chunked run")
+    args = parser.parse_args()
+
+    if args.movies and args.credits:
+        catalog = load_catalog(args.movies, args.credits)
+        rows = list(catalog[['overview', 'genres', 'keywords', 'cast', 'crew']].itertuples(index=False, name=None))
+    else:
+        rows = synthetic_rows(args.synthetic)
+
+    baseline, baseline_time = timed(notebook_tags, rows)
+    preprocess.stem_word.cache_clear()
+    memoized, memoized_time = timed(preprocess.movie_tags, rows)
+    parallel, parallel_time = timed(preprocess.movie_tags, rows, workers=args.workers)
+    if not baseline == memoized == parallel:
+        raise SystemExit("Tags differ from the notebook's output")
+
+    print(f"{len(rows)} movies, {preprocess.stem_word.cache_info().currsize} distinct words")
+    for name, seconds in (("notebook (per row)", baseline_time), ("memoized, 1 process", memoized_time),
+                          (f"memoized, {args.workers} processes", parallel_time)):
+        print(f"{name:<24} {seconds:8.3f}s  {len(rows) / seconds:10.0f} movies/s  {baseline_time / seconds:5.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""Seeds a ``user_profiles.db`` with millions of synthetic rows for the page benchmarks.
+
+Ratings, reviews and watchlist entries are skewed towards a few popular
+movies (Zipf-like), as real activity is, so the per-movie queries see both
+hot and cold movies. The schema and aggregate tables are the app's own,
+created through ``recommender.db``.
+
+    python -m benchmarks.seed --db bench_cache/user_profiles.db --ratings 2000000
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+
+from recommender import db
+
+DEFAULT_USERS = 100_000
+DEFAULT_RATINGS = 2_000_000
+DEFAULT_REVIEWS = 200_000
+DEFAULT_WATCHLIST = 500_000
+BATCH_SIZE = 100_000 # Rows per executemany call
+
+
+def _popular_movies(rng, movie_ids, size):
+    """Movie ids drawn with probability ~ 1/rank."""
+    weights = 1 / np.arange(1, len(movie_ids) + 1)
+    return rng.choice(movie_ids, size=size, p=weights / weights.sum())
+
+
+def _unique_pairs(rng, users, movie_ids, size):
+    """Up to ``size`` distinct ``(user_id, movie_id)`` pairs; popular movies repeat, so draw extra and trim."""
+    draws = size * 3 // 2
+    user_ids = rng.integers(1, users + 1, size=draws, dtype=np.int64)
+    movies = _popular_movies(rng, movie_ids, draws).astype(np.int64)
+    _, first = np.unique(user_ids * (int(movie_ids.max()) + 1) + movies, return_index=True)
+    if len(first) > size:
+        first = rng.choice(first, size=size, replace=False)
+    first.sort()
+    return user_ids[first], movies[first]
+
+
+def _insert(conn, statement, rows):
+    for start in range(0, len(rows), BATCH_SIZE):
+        conn.executemany(statement, rows[start:start + BATCH_SIZE])
+
+
+def seed_database(path, movie_ids, users=DEFAULT_USERS, ratings=DEFAULT_RATINGS, reviews=DEFAULT_REVIEWS,
+                  watchlist=DEFAULT_WATCHLIST, seed=0):
+    """Creates a fresh database at path. Returns the number of rows per table."""
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    rng = np.random.default_rng(seed)
+    movie_ids = np.asarray(movie_ids, dtype=np.int64)
+    pool = db.ConnectionPool(path, size=1)
+    counts = {}
+    with pool.connection() as conn:
+        _insert(conn, "INSERT INTO users (id, username, password, created_at) VALUES (?, ?, ?, '2024-01-01')",
+                [(user_id, f"user{user_id}", "password") for user_id in range(1, users + 1)])
+        counts['users'] = users
+
+        user_ids, rated = _unique_pairs(rng, users, movie_ids, ratings)
+        stars = rng.integers(1, 6, size=len(user_ids))
+        _insert(conn, "INSERT INTO movie_ratings (user_id, movie_id, rating) VALUES (?, ?, ?)",
+                list(zip(user_ids.tolist(), rated.tolist(), stars.tolist())))
+        counts['movie_ratings'] = len(user_ids)
+
+        user_ids, listed = _unique_pairs(rng, users, movie_ids, watchlist)
+        _insert(conn, "INSERT INTO user_watchlist (user_id, movie_id, movie_title) VALUES (?, ?, ?)",
+                [(user_id, movie_id, f"Movie {movie_id}") for user_id, movie_id in zip(user_ids.tolist(), listed.tolist())])
+        counts['user_watchlist'] = len(user_ids)
+
+        reviewers = rng.integers(1, users + 1, size=reviews)
+        reviewed = _popular_movies(rng, movie_ids, reviews)
+        # Spread over a year so keyset pagination has distinct timestamps to seek on.
+        stamps = 1_700_000_000 + rng.integers(0, 365 * 24 * 3600, size=reviews)
+        _insert(conn, "INSERT INTO movie_reviews (user_id, movie_id, review_text, timestamp) "
+                      "VALUES (?, ?, ?, datetime(?, 'unixepoch'))",
+                [(int(user_id), int(movie_id), f"Review of movie {movie_id} by user {user_id}.", int(stamp))
+                 for user_id, movie_id, stamp in zip(reviewers, reviewed, stamps)])
+        counts['movie_reviews'] = reviews
+    counts.update(db.backfill_aggregates(pool))
+    with pool.connection() as conn:
+        conn.execute("ANALYZE")
+    pool.close()
+    return counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create a user database full of synthetic activity.")
+    parser.add_argument('--db', default='bench_cache/user_profiles.db', help="Database file to (re)create")
+    parser.add_argument('--movies', type=int, default=5000, help="Movie ids 1..N to spread activity over")
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS)
+    parser.add_argument('--ratings', type=int, default=DEFAULT_RATINGS)
+    parser.add_argument('--reviews', type=int, default=DEFAULT_REVIEWS)
+    parser.add_argument('--watchlist', type=int, default=DEFAULT_WATCHLIST)
+    args = parser.parse_args()
+
+    os.makedirs(os.path.dirname(args.db) or '.', exist_ok=True)
+    started = time.perf_counter()
+    counts = seed_database(args.db, np.arange(1, args.movies + 1), args.users, args.ratings, args.reviews, args.watchlist)
+    print(f"Seeded {args.db} in {time.perf_counter() - started:.1f}s: " + ", ".join(f"{table} {rows}" for table, rows in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,182 @@
+"""Local stand-in for the TMDB API so benchmarks run offline and repeatably.
+
+Answers ``/movie/{id}`` (with ``append_to_response=credits,videos``) with a
+small deterministic payload, and ``/t/p/w500/<file>.jpg`` with a 500x750
+poster image, after an optional fixed delay, and counts the requests it
+served.
+
+    with StubTMDB(delay=0.02) as stub:
+        metadata.fetch_movie_details_many(ids, base_url=stub.url, cache=cache)
+
+Faults can be injected to exercise ``recommender.http_client``: a share of
+requests failing at random (``error_rate``), 429s with ``Retry-After``
+above a request rate (``max_rate``), or the next few requests failing
+(``fail_next``, e.g. an outage that trips the circuit breaker).
+
+    with StubTMDB(error_rate=0.2, max_rate=50) as stub:
+        ...
+        print(stub.requests, stub.errors, stub.throttled)
+"""
+import io
+import json
+import math
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from PIL import Image
+
+MOVIE_PATH = re.compile(r'/movie/(\d+)$')
+IMAGE_PATH = re.compile(r'^/t/p/w500/[^/]+\.jpg$')
+
+
+def poster_image(width=500, height=750):
+    """JPEG bytes of a poster-sized gradient."""
+    image = Image.linear_gradient('L').resize((width, height)).convert('RGB')
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=90)
+    return buffer.getvalue()
+
+
+def movie_payload(movie_id, append=()):
+    """TMDB-shaped details for a movie id."""
+    payload = {
+        'id': movie_id,
+        'poster_path': f'/poster{movie_id}.jpg',
+        'overview': f"Overview of movie {movie_id}.",
+        'release_date': '2000-01-01',
+        'runtime': 90 + movie_id % 60,
+        'imdb_id': f'tt{movie_id:07d}',
+        'genres': [{'id': 18, 'name': 'Drama'}],
+    }
+    if 'credits' in append:
+        payload['credits'] = {
+            'cast': [{'name': f"Actor {movie_id}-{i}"} for i in range(8)],
+            'crew': [{'name': f"Director {movie_id}", 'job': 'Director'}],
+        }
+    if 'videos' in append:
+        payload['videos'] = {'results': [{'site': 'YouTube', 'type': 'Trailer', 'key': f'trailer{movie_id}'}]}
+    return payload
+
+
+class _Handler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, like the real API
+    disable_nagle_algorithm = True # Headers and body go out in separate writes
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        stub = self.server.stub
+        fault = stub._count()
+        if stub.delay:
+            time.sleep(stub.delay)
+        if fault == 429:
+            self._send(429, {'status_message': "Your request count is over the allowed limit."},
+                       {'Retry-After': str(stub.retry_after)})
+            return
+        if fault is not None:
+            self._send(fault, {'status_message': "Injected failure."})
+            return
+        url = urlparse(self.path)
+        if IMAGE_PATH.match(url.path):
+            self._send_bytes(200, 'image/jpeg', stub.poster)
+            return
+        match = MOVIE_PATH.search(url.path)
+        if match is None:
+            self._send(404, {'status_message': "The resource you requested could not be found."})
+            return
+        append = parse_qs(url.query).get('append_to_response', [''])[0].split(',')
+        self._send(200, movie_payload(int(match.group(1)), append))
+
+    def _send(self, status, body, headers=None):
+        self._send_bytes(status, 'application/json', json.dumps(body).encode('utf-8'), headers)
+
+    def _send_bytes(self, status, content_type, data, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class StubTMDB:
+    """Threaded stub server on a free localhost port.
+
+    ``url`` is the API base URL to pass as ``base_url``; ``image_url`` the
+    poster prefix to pass as ``source_url`` of ``recommender.posters.PosterStore``.
+    """
+
+    def __init__(self, delay=0.0, error_rate=0.0, error_status=503, max_rate=0, retry_after=1, seed=0):
+        self.delay = delay
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.max_rate = max_rate # Requests per second before answering 429 (0 = never)
+        self.retry_after = retry_after
+        self.poster = poster_image()
+        self.requests = 0
+        self.errors = 0 # Injected error answers, 429s excluded
+        self.throttled = 0
+        self._fail_next = []
+        self._window = (0, 0) # (second, requests in it) for max_rate
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    def fail_next(self, count, status=None):
+        """Answers the next count requests with status (default ``error_status``)."""
+        with self._lock:
+            self._fail_next += [status or self.error_status] * count
+
+    def _count(self):
+        """Counts a request; returns the status of the fault to inject, or None to answer normally."""
+        with self._lock:
+            self.requests += 1
+            if self.max_rate:
+                second = math.floor(time.monotonic())
+                window = self._window[1] + 1 if self._window[0] == second else 1
+                self._window = (second, window)
+                if window > self.max_rate:
+                    self.throttled += 1
+                    return 429
+            if self._fail_next:
+                self.errors += 1
+                return self._fail_next.pop(0)
+            if self.error_rate and self._random.random() < self.error_rate:
+                self.errors += 1
+                return self.error_status
+        return None
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/3"
+
+    @property
+    def image_url(self):
+        return f"http://127.0.0.1:{self._server.server_address[1]}/t/p/w500"
+
+    def start(self):
+        self._server = ThreadingHTTPServer(('127.0.0.1', 0), _Handler)
+        self._server.daemon_threads = True
+        self._server.stub = self
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
@@ -0,0 +1,359 @@
+"""Reproducible benchmark suite for the serving hot paths and the model build.
+
+Groups (``--groups``, all by default):
+
+* ``serve``: ``Recommender.recommend`` per backend (uncached, cached, and
+  batched through ``recommend_batch``), title lookup and browse search;
+* ``page``: the database work of one browse page (average ratings and
+  watchlist flags) and of an expanded movie (user rating, review count,
+  review pages) against a seeded ``user_profiles.db``, plus the page's
+  metadata fetch and local poster files against a stub TMDB;
+* ``build``: the notebook's stages (parse, stem, vectorize, similarity) on
+  synthetic catalogs of ``--sizes`` movies.
+
+Everything runs offline: the serving model, the catalogs and the user
+database are synthetic and generated once into ``--cache``. Results are
+written as JSON. With ``--baseline`` every median is compared against a
+saved run and the command exits with status 1 if any got slower by more
+than ``--tolerance``.
+
+    python -m benchmarks.suite --save-baseline benchmarks/baseline.json
+    python -m benchmarks.suite --baseline benchmarks/baseline.json
+    python -m benchmarks.suite --groups build --sizes 5000 50000 200000 --workers 4
+"""
+import argparse
+import json
+import os
+import platform
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+import numpy as np
+
+from benchmarks.preprocess import synthetic_rows
+from benchmarks.seed import DEFAULT_RATINGS, DEFAULT_REVIEWS, DEFAULT_USERS, DEFAULT_WATCHLIST, seed_database
+from benchmarks.stub_tmdb import StubTMDB
+from recommender import db, metadata, preprocess
+from recommender.ann import VECTORS_FILE, write_vectors
+from recommender.artifacts import HEADER_FILE, write_artifact
+from recommender.build import vectorize
+from recommender.http_client import HttpClient
+from recommender.metadata_cache import MetadataCache
+from recommender.posters import PosterStore
+from recommender.neighbors import DEFAULT_K, neighbors_from_vectors, normalize_rows
+from recommender.results import ResultCache
+from recommender.service import Recommender
+
+GROUPS = ('serve', 'page', 'build')
+BACKENDS = ('neighbors', 'exact', 'ivf')
+DEFAULT_SIZES = (5000, 50000, 200000)
+SERVE_SIZE = 5000 # Synthetic catalog for the serving model, about the size of the TMDB 5000 set
+QUERIES = 500 # Calls per latency measurement
+BATCH_SIZE = 64
+PAGE_SIZE = 15 # Movies per browse page, as in the app
+REVIEWS_PER_PAGE = 5
+TOLERANCE = 0.2 # Allowed slowdown of a median before it counts as a regression
+NOISE_FLOOR_MS = 0.01 # Differences below this are timer noise, whatever the ratio
+
+_ADJECTIVES = ("Dark", "Silent", "Last", "Lost", "Golden", "Broken", "Hidden", "Wild", "Final", "Crimson",
+               "Eternal", "Frozen", "Secret", "Burning", "Savage", "Little", "Iron", "Blue", "Midnight", "Fallen")
+_NOUNS = ("Knight", "Empire", "River", "Planet", "Heart", "Storm", "Kingdom", "Shadow", "Island", "Mission",
+          "Legacy", "Garden", "Horizon", "Machine", "Promise", "Frontier", "Station", "Voyage", "Hunter", "Dream")
+
+
+# --- Measuring ---
+def summarize(samples_ns):
+    """Latency statistics in milliseconds from per-call timings in nanoseconds."""
+    samples = np.asarray(samples_ns, dtype=np.float64) / 1e6
+    return {
+        'runs': len(samples),
+        'median_ms': float(np.median(samples)),
+        'p95_ms': float(np.percentile(samples, 95)),
+        'mean_ms': float(samples.mean()),
+        'min_ms': float(samples.min()),
+    }
+
+
+def measure(fn, inputs, warmup=10):
+    """Calls ``fn(value)`` for every input, after ``warmup`` untimed calls, and summarizes the latencies."""
+    inputs = list(inputs)
+    for value in inputs[:warmup]:
+        fn(value)
+    samples = []
+    for value in inputs:
+        started = time.perf_counter_ns()
+        fn(value)
+        samples.append(time.perf_counter_ns() - started)
+    return summarize(samples)
+
+
+def measure_once(fn, repeat=1):
+    """Times ``fn()`` ``repeat`` times; returns the summary and the last result."""
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        result = fn()
+        samples.append(time.perf_counter_ns() - started)
+    return summarize(samples), result
+
+
+# --- Synthetic data ---
+def synthetic_titles(n, seed=0):
+    """Distinct, searchable titles like "The Silent River 3"."""
+    rng = random.Random(seed)
+    seen = {}
+    titles = []
+    for _ in range(n):
+        base = f"{rng.choice(('The ', '', ''))}{rng.choice(_ADJECTIVES)} {rng.choice(_NOUNS)}"
+        seen[base] = seen.get(base, 0) + 1
+        titles.append(base if seen[base] == 1 else f"{base} {seen[base]}")
+    return titles
+
+
+def synthetic_model(path, n, seed=0):
+    """Builds (once) a model directory for n synthetic movies; returns its path."""
+    if os.path.exists(os.path.join(path, HEADER_FILE)):
+        return path
+    tags = preprocess.movie_tags(synthetic_rows(n, seed))
+    vectors, vocabulary, _, _ = vectorize(tags, None, None)
+    neighbors = neighbors_from_vectors(normalize_rows(vectors), DEFAULT_K, normalized=True)
+    write_artifact(path, {
+        'id': np.arange(1, n + 1, dtype='<i8'),
+        'title': np.array(synthetic_titles(n, seed), dtype=object),
+    }, neighbors)
+    write_vectors(os.path.join(path, VECTORS_FILE), vectors, vocabulary)
+    return path
+
+
+def seeded_database(cache_dir, movie_ids, users, ratings, reviews, watchlist):
+    """Path of a seeded user database for these sizes, created on first use."""
+    path = os.path.join(cache_dir, f"user_profiles-{len(movie_ids)}-{users}-{ratings}-{reviews}-{watchlist}.db")
+    if not os.path.exists(path):
+        print(f"Seeding {path} ...", flush=True)
+        seed_database(path, movie_ids, users, ratings, reviews, watchlist)
+    return path
+
+
+def _typo(text, rng):
+    """Text with two adjacent letters swapped."""
+    if len(text) < 4:
+        return text
+    i = rng.randrange(1, len(text) - 2)
+    return text[:i] + text[i + 1] + text[i] + text[i + 2:]
+
+
+# --- Groups ---
+def bench_serve(model_path, backends, queries=QUERIES, seed=0):
+    rng = random.Random(seed)
+    results = {}
+    for backend in backends:
+        load, recommender = measure_once(lambda: Recommender(model_path, backend, result_cache=ResultCache(max_entries=0)))
+        if recommender.engine_error:
+            print(f"Skipping backend '{backend}': {recommender.engine_error}")
+            continue
+        results[f'serve.load.{backend}'] = load
+        titles = rng.choices(recommender.titles, k=queries)
+
+        # A zero-sized result cache stores nothing, so every call ranks.
+        results[f'serve.recommend.{backend}.uncached'] = measure(recommender.recommend, titles)
+        recommender.result_cache = ResultCache()
+        for title in titles:
+            recommender.recommend(title)
+        results[f'serve.recommend.{backend}.cached'] = measure(recommender.recommend, titles)
+
+        recommender.result_cache = ResultCache(max_entries=0)
+        batches = [rng.choices(recommender.titles, k=BATCH_SIZE) for _ in range(max(1, queries // BATCH_SIZE))]
+        results[f'serve.recommend.{backend}.batch{BATCH_SIZE}'] = measure(recommender.recommend_batch, batches, warmup=1)
+
+    recommender = Recommender(model_path, 'neighbors')
+    titles = rng.choices(recommender.titles, k=queries)
+    results['serve.lookup.title'] = measure(recommender.lookup.row_for_title, titles)
+    results['serve.search.prefix'] = measure(recommender.title_index.search, [title[:4] for title in titles])
+    results['serve.search.title'] = measure(recommender.title_index.search, titles)
+    results['serve.search.typo'] = measure(recommender.title_index.search, [_typo(title, rng) for title in titles])
+    results['serve.search.suggest'] = measure(recommender.title_index.suggest, [title[:2] for title in titles])
+    return results
+
+
+def bench_page(db_path, movie_ids, users, tmdb_delay, queries=QUERIES, seed=0):
+    rng = random.Random(seed)
+    pool = db.ConnectionPool(db_path)
+    movie_ids = [int(movie_id) for movie_id in movie_ids]
+    pages = [movie_ids[start:start + PAGE_SIZE] for start in range(0, len(movie_ids) - PAGE_SIZE + 1, PAGE_SIZE)]
+    page_inputs = [(rng.randint(1, users), rng.choice(pages)) for _ in range(queries)]
+    # Movies are seeded with activity skewed towards the front of the list; sample both ends.
+    detail_inputs = [(rng.randint(1, users), movie_ids[min(int(rng.paretovariate(1.0)) - 1, len(movie_ids) - 1)])
+                     for _ in range(queries)]
+
+    def browse_page(value):
+        user_id, page = value
+        db.get_average_ratings(page, pool=pool)
+        db.get_watchlist_flags(user_id, page, pool=pool)
+
+    def movie_details(value):
+        user_id, movie_id = value
+        db.get_user_movie_rating(user_id, movie_id, pool=pool)
+        db.get_review_count(movie_id, pool=pool)
+        reviews, cursor = db.get_movie_reviews_page(movie_id, limit=REVIEWS_PER_PAGE, pool=pool)
+        if cursor is not None:
+            db.get_movie_reviews_page(movie_id, limit=REVIEWS_PER_PAGE, after=cursor, pool=pool)
+
+    results = {
+        'page.db.browse': measure(browse_page, page_inputs),
+        'page.db.details': measure(movie_details, detail_inputs),
+        'page.db.for_you_signals': measure(lambda user_id: db.get_user_signals(user_id, pool=pool),
+                                           [user_id for user_id, _ in page_inputs]),
+    }
+    pool.close()
+
+    # Metadata for one page: cold (every id fetched from the stub) and warm (one cache query).
+    with tempfile.TemporaryDirectory() as tmp, StubTMDB(delay=tmdb_delay) as stub:
+        cache = MetadataCache(os.path.join(tmp, 'metadata_cache.db'))
+        client = HttpClient(rates={}) # Unlimited: measure the fetch, not the rate limit
+        runs = min(len(pages), 50)
+
+        def fetch(page):
+            metadata.fetch_movie_details_many(page, client=client, base_url=stub.url, cache=cache)
+
+        results['page.metadata.cold'] = measure(fetch, pages[:runs], warmup=0)
+        results['page.metadata.warm'] = measure(fetch, pages[:runs], warmup=0)
+        results['page.metadata.cold']['requests'] = stub.requests
+
+        # Grid posters for the same pages: cold downloads and resizes, warm only checks the files.
+        store = PosterStore(os.path.join(tmp, 'posters'), source_url=stub.image_url, client=client)
+        page_posters = [[details['poster_path'] for details in metadata.fetch_movie_details_many(
+            page, client=client, base_url=stub.url, cache=cache).values()] for page in pages[:runs]]
+        results['page.posters.cold'] = measure(store.paths_for, page_posters, warmup=0)
+        results['page.posters.warm'] = measure(store.paths_for, page_posters, warmup=0)
+    return results
+
+
+def bench_build(sizes, workers=1, repeat=1, seed=0):
+    results = {}
+    for n in sizes:
+        rows = synthetic_rows(n, seed)
+
+        def parse():
+            texts = []
+            for overview, genres, keywords, cast, crew in rows:
+                words = overview.split()
+                for names in (preprocess.parse_names(genres), preprocess.parse_names(keywords),
+                              preprocess.parse_names(cast, limit=3), preprocess.parse_director(crew)):
+                    words.extend(name.replace(" ", "") for name in names)
+                texts.append(" ".join(words).lower())
+            return texts
+
+        def stem():
+            preprocess.stem_word.cache_clear()
+            return [preprocess.stem(text) for text in texts]
+
+        results[f'build.{n}.parse'], texts = measure_once(parse, repeat)
+        results[f'build.{n}.stem'], tags = measure_once(stem, repeat)
+        results[f'build.{n}.vectorize'], (vectors, *_) = measure_once(lambda: vectorize(tags, None, None), repeat)
+        normalized = normalize_rows(vectors)
+        results[f'build.{n}.similarity'], _ = measure_once(
+            lambda: neighbors_from_vectors(normalized, DEFAULT_K, normalized=True, workers=workers), repeat)
+        print(f"build {n}: " + ", ".join(f"{stage} {results[f'build.{n}.{stage}']['median_ms'] / 1000:.2f}s"
+                                         for stage in ('parse', 'stem', 'vectorize', 'similarity')), flush=True)
+    return results
+
+
+# --- Reporting ---
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def compare(results, baseline, tolerance=TOLERANCE):
+    """``[(name, baseline_ms, current_ms)]`` of medians that got slower than the baseline allows."""
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            continue
+        before, after = previous['median_ms'], current['median_ms']
+        if after > before * (1 + tolerance) and after - before > NOISE_FLOOR_MS:
+            regressions.append((name, before, after))
+    return regressions
+
+
+def print_report(results, baseline=None):
+    print(f"{'benchmark':<40} {'median':>12} {'p95':>12} {'baseline':>12} {'change':>8}")
+    for name, stats in results.items():
+        line = f"{name:<40} {stats['median_ms']:>10.3f}ms {stats['p95_ms']:>10.3f}ms"
+        previous = (baseline or {}).get(name)
+        if previous is not None:
+            change = (stats['median_ms'] / previous['median_ms'] - 1) * 100 if previous['median_ms'] else 0.0
+            line += f" {previous['median_ms']:>10.3f}ms {change:>+7.1f}%"
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite and compare with a baseline.")
+    parser.add_argument('--groups', nargs='+', choices=GROUPS, default=list(GROUPS))
+    parser.add_argument('--model', help="Model directory for the serve group (default: a synthetic model)")
+    parser.add_argument('--backends', nargs='+', choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument('--sizes', nargs='+', type=int, default=list(DEFAULT_SIZES), help="Catalog sizes for the build group")
+    parser.add_argument('--workers', type=int, default=1, help="Processes for the similarity stage")
+    parser.add_argument('--repeat', type=int, default=1, help="Runs per build stage")
+    parser.add_argument('--queries', type=int, default=QUERIES, help="Calls per latency measurement")
+    parser.add_argument('--users', type=int, default=DEFAULT_USERS)
+    parser.add_argument('--ratings', type=int, default=DEFAULT_RATINGS)
+    parser.add_argument('--reviews', type=int, default=DEFAULT_REVIEWS)
+    parser.add_argument('--watchlist', type=int, default=DEFAULT_WATCHLIST)
+    parser.add_argument('--tmdb-delay', type=float, default=0.02, help="Seconds the stub TMDB waits per request")
+    parser.add_argument('--cache', default='bench_cache', help="Directory for the generated model and database")
+    parser.add_argument('--output', default='bench_results.json', help="Where to write this run's results")
+    parser.add_argument('--baseline', help="Results file to compare against")
+    parser.add_argument('--save-baseline', metavar='PATH', help="Also store this run as the baseline at PATH")
+    parser.add_argument('--tolerance', type=float, default=TOLERANCE, help="Allowed slowdown of a median, e.g. 0.2 for 20%%")
+    args = parser.parse_args()
+
+    os.makedirs(args.cache, exist_ok=True)
+    model_path = args.model or synthetic_model(os.path.join(args.cache, f'model-{SERVE_SIZE}'), SERVE_SIZE)
+    results = {}
+    if 'serve' in args.groups:
+        results.update(bench_serve(model_path, args.backends, args.queries))
+    if 'page' in args.groups:
+        movie_ids = Recommender(model_path, 'neighbors').movie_ids
+        db_path = seeded_database(args.cache, movie_ids, args.users, args.ratings, args.reviews, args.watchlist)
+        results.update(bench_page(db_path, movie_ids, args.users, args.tmdb_delay, args.queries))
+    if 'build' in args.groups:
+        results.update(bench_build(args.sizes, args.workers, args.repeat))
+
+    run = {'environment': environment(), 'arguments': vars(args), 'results': results}
+    with open(args.output, 'w') as f:
+        json.dump(run, f, indent=2)
+    if args.save_baseline:
+        shutil.copyfile(args.output, args.save_baseline)
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+    print_report(results, baseline)
+    print(f"Results written to {args.output}")
+    if baseline is not None:
+        regressions = compare(results, baseline, args.tolerance)
+        for name, before, after in regressions:
+            print(f"REGRESSION {name}: {before:.3f}ms -> {after:.3f}ms ({(after / before - 1) * 100:+.0f}%)")
+        if regressions:
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1 @@
+"""Lets pytest import ``recommender`` and ``benchmarks`` from this directory: ``python -m pytest tests``."""
@@ -0,0 +1 @@
+"""Recommendation engine used by the Streamlit front-end."""
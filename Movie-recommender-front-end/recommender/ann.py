@@ -0,0 +1,237 @@
+"""Live nearest-neighbor search over the normalized tag vectors.
+
+The precomputed neighbor index only covers movies that were in the
+catalog at build time. These engines search the tag vectors themselves,
+so they also answer queries for newly added movies or for a free-text
+description, and accept new items without a rebuild.
+
+* ``ExactIndex`` scores the query against every movie (blocked sparse
+  dot products); results match the offline build.
+* ``IVFIndex`` partitions the movies into ``nlist`` clusters with
+  spherical k-means and only scores the ``nprobe`` clusters closest to
+  the query. ``nprobe`` is the recall/latency knob: ``nprobe == nlist``
+  is exact, smaller values trade recall for speed.
+
+Both read ``vectors.npz`` from the model directory, written by
+``recommender.build`` (or the notebook) next to the neighbor index.
+
+    python -m recommender.ann --model model --nprobe 1 2 4 8 16
+"""
+import argparse
+import os
+import time
+
+import numpy as np
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from recommender.neighbors import block_size_for, normalize_rows
+from recommender.ranking import top_k
+
+VECTORS_FILE = 'vectors.npz'
+DEFAULT_BACKEND = os.environ.get('RECOMMENDER_BACKEND', 'neighbors') # 'neighbors', 'exact' or 'ivf'
+DEFAULT_NPROBE = 8
+KMEANS_ITERATIONS = 10
+KMEANS_SAMPLE = 64 # Training rows per cluster
+
+
+def write_vectors(path, vectors, vocabulary):
+    """Stores the raw count vectors and their vocabulary for the search engines."""
+    vectors = sparse.csr_matrix(vectors)
+    np.savez(path, data=vectors.data, indices=vectors.indices, indptr=vectors.indptr,
+             shape=np.array(vectors.shape), vocabulary=np.array(list(vocabulary)))
+
+
+def read_vectors(path):
+    """Returns ``(vectors, vocabulary)`` as written by ``write_vectors``."""
+    with np.load(path, allow_pickle=False) as stored:
+        vectors = sparse.csr_matrix((stored['data'], stored['indices'], stored['indptr']), shape=tuple(stored['shape']))
+        return vectors, stored['vocabulary'].tolist()
+
+
+class ExactIndex:
+    """Brute-force cosine search: every query is scored against every item."""
+
+    def __init__(self, vectors, vocabulary=None, normalized=False):
+        self.vectors = vectors if normalized else normalize_rows(vectors)
+        self.vocabulary = vocabulary
+        self._encoder = None
+
+    def __len__(self):
+        return self.vectors.shape[0]
+
+    def encode(self, texts):
+        """Tag vectors for free-text descriptions (or tags built with ``preprocess.movie_tag``)."""
+        if self.vocabulary is None:
+            raise ValueError("This index was built without a vocabulary and cannot encode text.")
+        # nltk is only needed to encode text, not to serve the app's neighbor lists.
+        from recommender.preprocess import stem
+
+        if self._encoder is None:
+            self._encoder = CountVectorizer(vocabulary=self.vocabulary)
+        return self._encoder.transform([stem(text.lower()) for text in texts])
+
+    def add(self, vectors, normalized=False):
+        """Appends items; returns their new row ids."""
+        vectors = vectors if normalized else normalize_rows(vectors)
+        start = len(self)
+        self.vectors = sparse.vstack([self.vectors, vectors], format='csr')
+        return np.arange(start, len(self))
+
+    def _search_block(self, queries, k, exclude, **options):
+        scores = (queries @ self.vectors.T).toarray().astype(np.float32, copy=False)
+        if exclude is not None:
+            mask = exclude >= 0
+            scores[np.flatnonzero(mask), exclude[mask]] = -np.inf
+        return top_k(scores, k)
+
+    def search(self, queries, k=10, exclude=None, **options):
+        """Top-k item ids and cosine scores for each query vector, best first.
+
+        ``exclude`` optionally gives one row id per query to leave out (the
+        query movie itself). Returns arrays of shape ``(len(queries), k)``;
+        rows with fewer than k items of positive similarity are padded with
+        id -1 and score ``-inf``.
+        """
+        queries = normalize_rows(queries)
+        exclude = None if exclude is None else np.asarray(exclude, dtype=np.intp).reshape(-1)
+        k = max(0, min(k, len(self)))
+        ids = np.full((queries.shape[0], k), -1, dtype=np.intp)
+        scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+
+        block_size = block_size_for(len(self))
+        for start in range(0, queries.shape[0], block_size):
+            stop = min(start + block_size, queries.shape[0])
+            block_exclude = None if exclude is None else exclude[start:stop]
+            block_ids, block_scores = self._search_block(queries[start:stop], k, block_exclude, **options)
+            width = block_ids.shape[1]
+            ids[start:stop, :width], scores[start:stop, :width] = block_ids, block_scores
+        # Zero similarity means no shared words; those are not matches.
+        unmatched = ~(scores > 0)
+        ids[unmatched], scores[unmatched] = -1, -np.inf
+        return ids, scores
+
+    def similar(self, row, k=6, **options):
+        """Like ``ranking.similar_movies`` for one movie row: 1-D ids and scores, the movie itself excluded."""
+        ids, scores = self.search(self.vectors[row], k, exclude=[row], **options)
+        keep = ids[0] >= 0
+        return ids[0][keep], scores[0][keep]
+
+
+class IVFIndex(ExactIndex):
+    """Inverted-file index: items are bucketed by nearest centroid and only ``nprobe`` buckets are searched."""
+
+    def __init__(self, vectors, vocabulary=None, normalized=False, nlist=None, nprobe=DEFAULT_NPROBE,
+                 iterations=KMEANS_ITERATIONS, seed=0):
+        super().__init__(vectors, vocabulary, normalized)
+        self.nlist = max(1, min(nlist or int(np.sqrt(len(self))), len(self)))
+        self.nprobe = nprobe
+        self.centroids = self._train(iterations, np.random.default_rng(seed))
+        self.assignments = self._assign(self.vectors)
+        self._build_lists()
+
+    def _train(self, iterations, rng):
+        """Spherical k-means on a sample of the items; returns unit-length dense centroids."""
+        sample_size = min(len(self), self.nlist * KMEANS_SAMPLE)
+        sample = self.vectors[rng.choice(len(self), sample_size, replace=False)]
+        centroids = sample[rng.choice(sample_size, self.nlist, replace=False)].toarray()
+        for _ in range(iterations):
+            labels = self._assign(sample, centroids)
+            sums = sparse.csr_matrix(
+                (np.ones(sample_size, dtype=np.float32), (labels, np.arange(sample_size))),
+                shape=(self.nlist, sample_size),
+            ) @ sample
+            sums = np.asarray(sums.todense())
+            norms = np.linalg.norm(sums, axis=1)
+            # Empty clusters restart from a random sample row.
+            empty = norms == 0
+            if empty.any():
+                sums[empty] = sample[rng.choice(sample_size, int(empty.sum()), replace=False)].toarray()
+                norms[empty] = np.linalg.norm(sums[empty], axis=1)
+            centroids = sums / np.maximum(norms, 1e-12)[:, None]
+        return centroids.astype(np.float32)
+
+    def _assign(self, vectors, centroids=None):
+        centroids = self.centroids if centroids is None else centroids
+        labels = np.empty(vectors.shape[0], dtype=np.intp)
+        block_size = block_size_for(len(centroids))
+        for start in range(0, vectors.shape[0], block_size):
+            labels[start:start + block_size] = np.asarray(vectors[start:start + block_size] @ centroids.T).argmax(axis=1)
+        return labels
+
+    def _build_lists(self):
+        self._order = np.argsort(self.assignments, kind='stable')
+        self._offsets = np.searchsorted(self.assignments[self._order], np.arange(self.nlist + 1))
+
+    def add(self, vectors, normalized=False):
+        vectors = vectors if normalized else normalize_rows(vectors)
+        new_rows = super().add(vectors, normalized=True)
+        self.assignments = np.concatenate([self.assignments, self._assign(vectors)])
+        self._build_lists()
+        return new_rows
+
+    def _search_block(self, queries, k, exclude, nprobe=None):
+        nprobe = max(1, min(nprobe or self.nprobe, self.nlist))
+        probes, _ = top_k(np.asarray(queries @ self.centroids.T), nprobe)
+        ids = np.full((queries.shape[0], k), -1, dtype=np.intp)
+        scores = np.full((queries.shape[0], k), -np.inf, dtype=np.float32)
+        for i, lists in enumerate(probes):
+            candidates = np.concatenate([self._order[self._offsets[c]:self._offsets[c + 1]] for c in lists])
+            if exclude is not None and exclude[i] >= 0:
+                candidates = candidates[candidates != exclude[i]]
+            candidate_scores = (self.vectors[candidates] @ queries[i].T).toarray().ravel().astype(np.float32)
+            positions, best = top_k(candidate_scores, k)
+            ids[i, :len(best)], scores[i, :len(best)] = candidates[positions], best
+        return ids, scores
+
+
+BACKENDS = {'exact': ExactIndex, 'ivf': IVFIndex}
+
+
+def load_index(model_path, backend='exact', **options):
+    """Search engine over the model's tag vectors; raises FileNotFoundError if the model has none."""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown backend {backend!r}, expected one of {sorted(BACKENDS)}")
+    vectors, vocabulary = read_vectors(os.path.join(model_path, VECTORS_FILE))
+    return BACKENDS[backend](vectors, vocabulary, **options)
+
+
+def recall_at_k(index, reference, rows, k=10, **options):
+    """Share of the reference (exact) top-k found by ``index`` for the given movie rows."""
+    rows = np.asarray(rows)
+    found, _ = index.search(index.vectors[rows], k, exclude=rows, **options)
+    expected, _ = reference.search(reference.vectors[rows], k, exclude=rows)
+    hits = sum(len(np.intersect1d(a[a >= 0], b[b >= 0])) for a, b in zip(found, expected))
+    return hits / max(1, int((expected >= 0).sum()))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure IVF recall and latency against exact search.")
+    parser.add_argument('--model', default='model', help="Model directory with vectors.npz")
+    parser.add_argument('--nlist', type=int, default=None, help="Number of clusters (default: sqrt of the catalog size)")
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 2, 4, 8, 16], help="Clusters searched per query")
+    parser.add_argument('--queries', type=int, default=200, help="Sampled query movies")
+    parser.add_argument('-k', type=int, default=10)
+    args = parser.parse_args()
+
+    vectors, vocabulary = read_vectors(os.path.join(args.model, VECTORS_FILE))
+    exact = ExactIndex(vectors, vocabulary)
+    started = time.perf_counter()
+    ivf = IVFIndex(exact.vectors, vocabulary, normalized=True, nlist=args.nlist)
+    print(f"{len(exact)} movies, {ivf.nlist} clusters trained in {time.perf_counter() - started:.2f}s")
+
+    rows = np.random.default_rng(0).choice(len(exact), min(args.queries, len(exact)), replace=False)
+    started = time.perf_counter()
+    for row in rows:
+        exact.similar(row, args.k)
+    print(f"exact        {1000 * (time.perf_counter() - started) / len(rows):7.2f} ms/query  recall 1.000")
+    for nprobe in args.nprobe:
+        started = time.perf_counter()
+        for row in rows:
+            ivf.similar(row, args.k, nprobe=nprobe)
+        latency = 1000 * (time.perf_counter() - started) / len(rows)
+        print(f"ivf nprobe={nprobe:<3} {latency:7.2f} ms/query  recall {recall_at_k(ivf, exact, rows, args.k, nprobe=nprobe):.3f}")
+
+
+if __name__ == '__main__':
+    main()
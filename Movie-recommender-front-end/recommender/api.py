@@ -0,0 +1,200 @@
+"""Headless HTTP API over ``recommender.service``, served by uvicorn.
+
+Every worker process loads the model once at startup and answers:
+
+* ``GET /recommend?title=...&k=6``
+* ``POST /recommend/batch`` with ``{"titles": [...], "k": 6}``
+* ``GET /movies/search?q=...&limit=10``
+* ``GET /users/{id}/for-you?k=10``
+* ``GET /movies/{id}/poster?variant=grid`` (``grid`` or ``detail``, from the local poster store)
+* ``GET /health``
+* ``GET /metrics`` (Prometheus text; populated with ``RECOMMENDER_INSTRUMENT=1``)
+
+Ranking is NumPy work and SQLite calls block, so handlers run them in the
+thread pool and keep the event loop free.
+
+    python -m recommender.api --model model --workers 4 --port 8000
+
+Requires ``starlette`` and ``uvicorn``.
+"""
+import argparse
+import contextlib
+import os
+
+import uvicorn
+from starlette.applications import Starlette
+from starlette.concurrency import run_in_threadpool
+from starlette.middleware import Middleware
+from starlette.responses import FileResponse, JSONResponse, PlainTextResponse
+from starlette.routing import Route
+
+from recommender import ann, instrument, metadata, posters
+from recommender.http_client import get_client
+from recommender.registry import get_registry
+from recommender.service import DEFAULT_K, load_recommender
+
+MODEL_PATH = os.environ.get('MODEL_PATH', 'model')
+MAX_K = 100 # The 'neighbors' backend is further limited to the K neighbors stored per movie
+MAX_BATCH = 256
+POSTER_MAX_AGE = 24 * 3600 # Seconds browsers may reuse a poster
+
+
+def _movies(recommender, movie_ids, scores):
+    return [{'id': int(movie_id), 'title': recommender.title_for_id(movie_id), 'score': round(float(score), 6)}
+            for movie_id, score in zip(movie_ids, scores)]
+
+
+def _int_param(request, name, default, maximum):
+    value = request.query_params.get(name)
+    if value is None:
+        return default
+    try:
+        value = int(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an integer") from None
+    if not 1 <= value <= maximum:
+        raise ValueError(f"'{name}' must be between 1 and {maximum}")
+    return value
+
+
+def _error(status, message):
+    return JSONResponse({'error': message}, status_code=status)
+
+
+async def recommend(request):
+    recommender = request.app.state.recommender
+    title = request.query_params.get('title')
+    if not title:
+        return _error(400, "Missing 'title' query parameter")
+    try:
+        k = _int_param(request, 'k', DEFAULT_K, min(MAX_K, recommender.max_k))
+        movie_ids, scores = await run_in_threadpool(recommender.recommend, title, k)
+    except ValueError as e:
+        return _error(400, str(e))
+    except KeyError:
+        return _error(404, f"Movie '{title}' not found")
+    return JSONResponse({'title': title, 'model_version': recommender.version,
+                         'results': _movies(recommender, movie_ids, scores)})
+
+
+async def recommend_batch(request):
+    recommender = request.app.state.recommender
+    try:
+        body = await request.json()
+        titles = body['titles']
+        k = int(body.get('k', DEFAULT_K))
+    except (ValueError, KeyError, TypeError, AttributeError):
+        return _error(400, "Expected a JSON body like {\"titles\": [...], \"k\": 6}")
+    if not isinstance(titles, list) or not all(isinstance(title, str) for title in titles):
+        return _error(400, "'titles' must be a list of strings")
+    max_k = min(MAX_K, recommender.max_k)
+    if len(titles) > MAX_BATCH or not 1 <= k <= max_k:
+        return _error(400, f"At most {MAX_BATCH} titles and 1 <= k <= {max_k}")
+
+    batch = await run_in_threadpool(recommender.recommend_batch, titles, k)
+    return JSONResponse({'model_version': recommender.version, 'results': [
+        {'title': title, 'error': 'not found'} if result is None
+        else {'title': title, 'results': _movies(recommender, *result)}
+        for title, result in zip(titles, batch)
+    ]})
+
+
+async def search_movies(request):
+    recommender = request.app.state.recommender
+    query = request.query_params.get('q', '')
+    try:
+        limit = _int_param(request, 'limit', 10, MAX_K)
+    except ValueError as e:
+        return _error(400, str(e))
+    matches = await run_in_threadpool(recommender.search, query, limit)
+    return JSONResponse({'query': query, 'results': [{'id': movie_id, 'title': title} for movie_id, title in matches]})
+
+
+async def for_you(request):
+    recommender = request.app.state.recommender
+    try:
+        user_id = int(request.path_params['user_id'])
+        k = _int_param(request, 'k', 10, MAX_K)
+    except ValueError as e:
+        return _error(400, str(e))
+    movie_ids, scores = await run_in_threadpool(recommender.for_you, user_id, k)
+    return JSONResponse({'user_id': user_id, 'results': _movies(recommender, movie_ids, scores)})
+
+
+async def poster(request):
+    recommender = request.app.state.recommender
+    movie_id = int(request.path_params['movie_id'])
+    variant = request.query_params.get('variant', 'grid')
+    if variant not in posters.VARIANTS:
+        return _error(400, f"'variant' must be one of {list(posters.VARIANTS)}")
+    if recommender.title_for_id(movie_id) is None:
+        return _error(404, f"Movie {movie_id} not found")
+    details = await run_in_threadpool(metadata.fetch_movie_details, movie_id)
+    path = await run_in_threadpool(posters.get_store().path_for, details['poster_path'], variant)
+    return FileResponse(path, headers={'Cache-Control': f'public, max-age={POSTER_MAX_AGE}'})
+
+
+async def health(request):
+    recommender = request.app.state.recommender
+    resources = await run_in_threadpool(get_registry().stats)
+    return JSONResponse({'status': 'ok', 'movies': len(recommender), 'model_version': recommender.version,
+                         'pid': os.getpid(), 'resources': resources, 'upstreams': get_client().stats()})
+
+
+async def metrics(request):
+    return PlainTextResponse(instrument.prometheus_text(), media_type='text/plain; version=0.0.4')
+
+
+class InstrumentMiddleware:
+    """Records each HTTP request as one instrumentation run."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] != 'http' or not instrument.enabled():
+            await self.app(scope, receive, send)
+            return
+        # run_in_threadpool copies the context, so spans from handler threads land in this run.
+        run = instrument.start_run(scope['method'])
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            # Label by route template, not by path, so user ids do not each get their own series.
+            route = scope.get('route')
+            run.label = f"{scope['method']} {route.path if route is not None else scope['path']}"
+            instrument.finish_run(run)
+
+
+@contextlib.asynccontextmanager
+async def lifespan(app):
+    # Once per worker process; requests only ever read the loaded model.
+    app.state.recommender = await run_in_threadpool(load_recommender, MODEL_PATH, ann.DEFAULT_BACKEND)
+    yield
+
+
+app = Starlette(routes=[
+    Route('/recommend', recommend),
+    Route('/recommend/batch', recommend_batch, methods=['POST']),
+    Route('/movies/search', search_movies),
+    Route('/users/{user_id:int}/for-you', for_you),
+    Route('/movies/{movie_id:int}/poster', poster),
+    Route('/health', health),
+    Route('/metrics', metrics),
+], middleware=[Middleware(InstrumentMiddleware)], lifespan=lifespan)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve recommendations over HTTP.")
+    parser.add_argument('--model', default=MODEL_PATH, help="Model directory")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help="Worker processes, each with its own copy of the model")
+    args = parser.parse_args()
+    # Workers import this module afresh, so the model path travels through the environment.
+    os.environ['MODEL_PATH'] = args.model
+    uvicorn.run('recommender.api:app', host=args.host, port=args.port, workers=args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,249 @@
+"""Versioned, memory-mapped on-disk format for the recommender model.
+
+A model is a directory holding one ``header.json`` plus one raw binary
+file per array. The header records the format version, a build hash and
+the dtype/shape of every array, so the arrays can be opened with
+``np.memmap`` without unpickling anything. Pages are shared by every
+process that maps the same files.
+
+Layout::
+
+    model/
+        header.json
+        id.bin                 movie ids (int64)
+        title.offsets.bin      string column: N + 1 byte offsets
+        title.data.bin         string column: UTF-8 bytes
+        neighbors.bin          (N, K) top-K neighbor index
+"""
+import argparse
+import hashlib
+import json
+import os
+import pickle
+import shutil
+
+import numpy as np
+
+from recommender.neighbors import DEFAULT_K, NEIGHBOR_DTYPE, build_neighbor_index
+
+FORMAT_NAME = 'movie-recommender-model'
+FORMAT_VERSION = 1
+HEADER_FILE = 'header.json'
+
+
+class ArtifactError(ValueError):
+    """Raised when a model directory is missing, incomplete or from another format version."""
+
+
+class StringColumn:
+    """Read-only view over a string column stored as offsets + UTF-8 bytes."""
+
+    def __init__(self, offsets, data):
+        self._offsets = offsets
+        self._data = data
+
+    def __len__(self):
+        return len(self._offsets) - 1
+
+    def __getitem__(self, i):
+        return bytes(self._data[self._offsets[i]:self._offsets[i + 1]]).decode('utf-8')
+
+    def __iter__(self):
+        return iter(self.to_list())
+
+    def to_list(self):
+        blob = bytes(self._data)
+        offsets = self._offsets.tolist()
+        return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(len(self))]
+
+
+class ModelArtifact:
+    """An opened model directory. Arrays are memory-mapped, not loaded."""
+
+    def __init__(self, path, header, arrays):
+        self.path = path
+        self.header = header
+        self._arrays = arrays
+
+    @property
+    def build_hash(self):
+        return self.header['build_hash']
+
+    @property
+    def num_movies(self):
+        return self.header['num_movies']
+
+    @property
+    def columns(self):
+        return list(self.header['columns'])
+
+    @property
+    def neighbors(self):
+        return self._arrays['neighbors']
+
+    def column(self, name):
+        kind = self.header['columns'].get(name)
+        if kind is None:
+            raise KeyError(name)
+        if kind == 'str':
+            return StringColumn(self._arrays[f'{name}.offsets'], self._arrays[f'{name}.data'])
+        return self._arrays[name]
+
+    def to_dict(self):
+        """Columns as a dict suitable for ``pd.DataFrame``; string columns are decoded to lists."""
+        return {
+            name: self.column(name).to_list() if kind == 'str' else self.column(name)
+            for name, kind in self.header['columns'].items()
+        }
+
+
+def _encode_strings(values):
+    encoded = [str(v).encode('utf-8') for v in values]
+    offsets = np.zeros(len(encoded) + 1, dtype='<i8')
+    np.cumsum([len(b) for b in encoded], out=offsets[1:])
+    data = np.frombuffer(b''.join(encoded), dtype='u1')
+    return offsets, data
+
+
+def _hash_arrays(arrays):
+    digest = hashlib.sha256()
+    for name in sorted(arrays):
+        digest.update(name.encode('utf-8'))
+        digest.update(np.ascontiguousarray(arrays[name]).tobytes())
+    return digest.hexdigest()
+
+
+def write_artifact(path, columns, neighbors):
+    """Writes a model directory atomically and returns its build hash.
+
+    ``columns`` maps column names to sequences; numeric columns are stored
+    as-is and anything with an object/str dtype as a string column.
+    """
+    arrays = {}
+    kinds = {}
+    num_movies = len(neighbors)
+    for name, values in columns.items():
+        values = np.asarray(values)
+        if len(values) != num_movies:
+            raise ArtifactError(f"Column '{name}' has {len(values)} rows, expected {num_movies}")
+        if values.dtype.kind in 'OUS':
+            arrays[f'{name}.offsets'], arrays[f'{name}.data'] = _encode_strings(values)
+            kinds[name] = 'str'
+        else:
+            arrays[name] = values.astype(values.dtype.newbyteorder('<'))
+            kinds[name] = 'num'
+    arrays['neighbors'] = np.ascontiguousarray(neighbors, dtype=NEIGHBOR_DTYPE)
+
+    header = {
+        'format': FORMAT_NAME,
+        'version': FORMAT_VERSION,
+        'build_hash': _hash_arrays(arrays),
+        'num_movies': num_movies,
+        'columns': kinds,
+        'arrays': {
+            name: {
+                'file': f'{name}.bin',
+                'dtype': np.lib.format.dtype_to_descr(array.dtype),
+                'shape': list(array.shape),
+            }
+            for name, array in arrays.items()
+        },
+    }
+
+    tmp_path = f'{path}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for name, array in arrays.items():
+        np.ascontiguousarray(array).tofile(os.path.join(tmp_path, header['arrays'][name]['file']))
+    with open(os.path.join(tmp_path, HEADER_FILE), 'w', encoding='utf-8') as f:
+        json.dump(header, f, indent=2)
+
+    # Move the old model aside instead of deleting it first, so the directory is only missing
+    # between two renames rather than for a whole rmtree; open memmaps keep working either way.
+    old_path = f'{path}.old'
+    shutil.rmtree(old_path, ignore_errors=True)
+    if os.path.exists(path):
+        os.replace(path, old_path)
+    os.replace(tmp_path, path)
+    shutil.rmtree(old_path, ignore_errors=True)
+    return header['build_hash']
+
+
+def load_artifact(path):
+    """Opens a model directory, checking the header and file sizes once."""
+    header_path = os.path.join(path, HEADER_FILE)
+    if not os.path.exists(header_path):
+        raise FileNotFoundError(f"No model found at '{path}' (missing {HEADER_FILE})")
+    try:
+        with open(header_path, encoding='utf-8') as f:
+            header = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ArtifactError(f"Unreadable model header '{header_path}': {e}") from e
+
+    if header.get('format') != FORMAT_NAME:
+        raise ArtifactError(f"'{path}' is not a {FORMAT_NAME} directory")
+    if header.get('version') != FORMAT_VERSION:
+        raise ArtifactError(f"'{path}' has format version {header.get('version')}, expected {FORMAT_VERSION}. Please rebuild the model.")
+
+    arrays = {}
+    for name, spec in header['arrays'].items():
+        dtype = np.lib.format.descr_to_dtype(spec['dtype'])
+        shape = tuple(spec['shape'])
+        file_path = os.path.join(path, spec['file'])
+        expected = int(np.prod(shape)) * dtype.itemsize
+        actual = os.path.getsize(file_path)
+        if actual != expected:
+            raise ArtifactError(f"'{file_path}' is {actual} bytes, header says {expected}")
+        if expected == 0:
+            arrays[name] = np.empty(shape, dtype=dtype)
+        else:
+            arrays[name] = np.memmap(file_path, dtype=dtype, mode='r', shape=shape)
+
+    neighbors = arrays.get('neighbors')
+    if neighbors is None or neighbors.dtype != NEIGHBOR_DTYPE or neighbors.shape[0] != header['num_movies']:
+        raise ArtifactError(f"'{path}' has no valid neighbor index")
+    return ModelArtifact(path, header, arrays)
+
+
+def verify_artifact(path):
+    """Recomputes the build hash of a model directory; returns True if it matches the header."""
+    artifact = load_artifact(path)
+    return _hash_arrays(artifact._arrays) == artifact.build_hash
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create or check model directories.")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    convert = subparsers.add_parser('convert', help="Convert movie_dick.pkl + similarity.pkl into a model directory")
+    convert.add_argument('movies', help="Path to movie_dick.pkl")
+    convert.add_argument('similarity', help="Path to similarity.pkl")
+    convert.add_argument('output', nargs='?', default='model', help="Model directory to write")
+    convert.add_argument('-k', type=int, default=DEFAULT_K, help="Neighbors kept per movie")
+
+    verify = subparsers.add_parser('verify', help="Recompute and check the build hash")
+    verify.add_argument('path', nargs='?', default='model')
+
+    args = parser.parse_args()
+    if args.command == 'convert':
+        # Legacy pickles are only ever read here, offline, from files we produced ourselves.
+        with open(args.movies, 'rb') as f:
+            movies = pickle.load(f)
+        with open(args.similarity, 'rb') as f:
+            similarity = np.asarray(pickle.load(f))
+        # Rows of the similarity matrix follow the insertion order of the pickled dict.
+        order = list(movies['title'])
+        columns = {
+            'id': np.array([movies['id'][i] for i in order], dtype='<i8'),
+            'title': np.array([movies['title'][i] for i in order], dtype=object),
+        }
+        build_hash = write_artifact(args.output, columns, build_neighbor_index(similarity, k=args.k))
+        print(f"Wrote {len(order)} movies to {args.output} (build {build_hash[:12]})")
+    else:
+        ok = verify_artifact(args.path)
+        print(f"{args.path}: {'OK' if ok else 'HASH MISMATCH'}")
+        raise SystemExit(0 if ok else 1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,280 @@
+"""Scriptable, incremental version of the notebook's model build.
+
+Stages: load + merge the TMDB CSVs -> per-movie stemmed tags -> count
+vectors -> top-K neighbors -> model directory. Every movie is keyed by a
+hash of its raw CSV fields, and each stage reuses what it can:
+
+* tags are cached per content hash in ``<cache>/tags.db``;
+* count vectors of the last build are kept in ``<cache>/vectors.npz`` and
+  reused row by row as long as the vocabulary is not refit;
+* neighbor lists of the previous model are patched: only new or changed
+  movies, and movies whose top-K they may affect, are recomputed.
+
+    python -m recommender.build --movies data/tmdb_5000_movies.csv \\
+        --credits data/tmdb_5000_credits.csv --output model
+"""
+import argparse
+import hashlib
+import json
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import CountVectorizer
+
+from recommender.ann import VECTORS_FILE, write_vectors
+from recommender.artifacts import load_artifact, write_artifact
+from recommender.neighbors import DEFAULT_K, NEIGHBOR_DTYPE, block_size_for, neighbors_from_vectors, normalize_rows
+from recommender.preprocess import PREPROCESS_VERSION, movie_tags
+from recommender.ranking import top_k
+
+DEFAULT_CACHE_DIR = 'build_cache'
+MAX_FEATURES = 5000
+RAW_COLUMNS = ['id', 'title', 'overview', 'genres', 'keywords', 'cast', 'crew']
+# Above this share of changed movies, patching neighbor lists costs more than rebuilding them.
+INCREMENTAL_LIMIT = 0.25
+
+
+# --- Stage 1: catalog ---
+def load_catalog(movies_csv, credits_csv):
+    """The notebook's merged, de-NaN'd movie table with the raw JSON columns."""
+    movies = pd.read_csv(movies_csv)
+    credits = pd.read_csv(credits_csv)
+    catalog = movies.merge(credits, on='title')[RAW_COLUMNS].dropna()
+    return catalog.reset_index(drop=True)
+
+
+def content_hashes(catalog):
+    """Stable hash of each movie's raw fields (and the tag recipe version)."""
+    hashes = []
+    for row in catalog.itertuples(index=False):
+        payload = json.dumps([PREPROCESS_VERSION, int(row.id), *[str(v) for v in row[1:]]], ensure_ascii=False)
+        hashes.append(hashlib.sha1(payload.encode('utf-8')).hexdigest())
+    return hashes
+
+
+# --- Stage 2: tags ---
+class TagCache:
+    """content hash -> stemmed tag, persisted in SQLite between builds."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS tags (hash TEXT PRIMARY KEY, tag TEXT NOT NULL)")
+
+    def get_many(self, hashes):
+        found = {}
+        hashes = list(hashes)
+        for start in range(0, len(hashes), 500):
+            chunk = hashes[start:start + 500]
+            found.update(self.conn.execute(
+                f"SELECT hash, tag FROM tags WHERE hash IN ({','.join('?' * len(chunk))})", chunk
+            ).fetchall())
+        return found
+
+    def set_many(self, items):
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO tags (hash, tag) VALUES (?, ?)", items.items())
+
+
+def compute_tags(catalog, hashes, cache, workers=1):
+    """Tags for every movie; only rows missing from the cache are parsed and stemmed."""
+    cached = cache.get_many(set(hashes))
+    todo = {}
+    for row, content_hash in zip(catalog.itertuples(index=False), hashes):
+        if content_hash not in cached and content_hash not in todo:
+            todo[content_hash] = (row.overview, row.genres, row.keywords, row.cast, row.crew)
+    computed = dict(zip(todo, movie_tags(todo.values(), workers=workers)))
+    cache.set_many(computed)
+    cached.update(computed)
+    return [cached[content_hash] for content_hash in hashes], len(computed)
+
+
+# --- Stage 3: vectors ---
+def load_vectors(path):
+    if not os.path.exists(path):
+        return None
+    with np.load(path, allow_pickle=False) as stored:
+        matrix = sparse.csr_matrix((stored['data'], stored['indices'], stored['indptr']), shape=tuple(stored['shape']))
+        return matrix, stored['hashes'].tolist(), stored['vocabulary'].tolist()
+
+
+def save_vectors(path, matrix, hashes, vocabulary):
+    matrix = matrix.tocsr()
+    np.savez(path, data=matrix.data, indices=matrix.indices, indptr=matrix.indptr, shape=np.array(matrix.shape),
+             hashes=np.array(hashes), vocabulary=np.array(vocabulary))
+
+
+def vectorize(tags, hashes, previous, refit=False):
+    """Count vectors for all movies. Returns (matrix, vocabulary, reused_rows, refit).
+
+    With a previous build and ``refit=False`` the old vocabulary is kept,
+    so rows of unchanged movies are copied instead of recomputed.
+    """
+    if previous is None or refit:
+        vectorizer = CountVectorizer(max_features=MAX_FEATURES, stop_words='english')
+        matrix = vectorizer.fit_transform(tags).tocsr()
+        return matrix, vectorizer.get_feature_names_out().tolist(), 0, True
+
+    old_matrix, old_hashes, vocabulary = previous
+    old_rows = {content_hash: row for row, content_hash in enumerate(old_hashes)}
+    missing = [i for i, content_hash in enumerate(hashes) if content_hash not in old_rows]
+
+    vectorizer = CountVectorizer(vocabulary=vocabulary)
+    new_vectors = vectorizer.transform([tags[i] for i in missing]) if missing else None
+
+    # Assemble rows in catalog order from the old matrix and the freshly computed ones.
+    source = sparse.vstack([old_matrix, new_vectors]).tocsr() if new_vectors is not None else old_matrix
+    order = np.empty(len(hashes), dtype=np.intp)
+    missing_position = {i: old_matrix.shape[0] + j for j, i in enumerate(missing)}
+    for i, content_hash in enumerate(hashes):
+        order[i] = missing_position[i] if i in missing_position else old_rows[content_hash]
+    return source[order], vocabulary, len(hashes) - len(missing), False
+
+
+# --- Stage 4: neighbors ---
+def update_neighbors(vectors, k, previous_neighbors, previous_rows, workers=1):
+    """Patches the previous neighbor index for a catalog where some movies changed.
+
+    ``vectors`` must be L2-normalized. ``previous_rows[i]`` is the row movie i
+    had in the previous build, or -1 if it is new or its content changed.
+    Returns (neighbors, recomputed_rows).
+    """
+    n = vectors.shape[0]
+    previous_rows = np.asarray(previous_rows, dtype=np.intp)
+    changed = np.flatnonzero(previous_rows < 0)
+    unchanged = np.flatnonzero(previous_rows >= 0)
+
+    old_to_new = np.full(len(previous_neighbors), -1, dtype=np.intp)
+    old_to_new[previous_rows[unchanged]] = unchanged
+
+    neighbors = np.empty((n, k), dtype=NEIGHBOR_DTYPE)
+    neighbors[changed] = neighbors_from_vectors(vectors, k, rows=changed, normalized=True, workers=workers)
+    changed_vectors_t = vectors[changed].T.tocsc()
+
+    stale = []
+    block_size = block_size_for(len(changed) + k)
+    for start in range(0, len(unchanged), block_size):
+        block = unchanged[start:start + block_size]
+        # Old lists stay exact among unchanged movies; entries pointing at changed
+        # or removed movies are dropped and changed movies are re-scored.
+        old = np.asarray(previous_neighbors[previous_rows[block]])
+        old_ids = old_to_new[old['id']]
+        old_scores = np.where(old_ids >= 0, old['score'], -np.inf).astype(np.float32)
+
+        candidate_scores = (vectors[block] @ changed_vectors_t).toarray().astype(np.float32)
+        all_ids = np.concatenate([old_ids, np.broadcast_to(changed, candidate_scores.shape)], axis=1)
+        all_scores = np.concatenate([old_scores, candidate_scores], axis=1)
+
+        positions, merged_scores = top_k(all_scores, k)
+        neighbors['id'][block] = np.take_along_axis(all_ids, positions, axis=1)
+        neighbors['score'][block] = merged_scores
+        # A movie outside the old top-K scores at most the old K-th score, so the
+        # patched list is only trustworthy if its K-th entry still beats that.
+        stale.append(block[~(merged_scores[:, -1] >= old['score'][:, -1])])
+
+    stale = np.concatenate(stale) if stale else np.empty(0, dtype=np.intp)
+    if len(stale):
+        neighbors[stale] = neighbors_from_vectors(vectors, k, rows=stale, normalized=True, workers=workers)
+    return neighbors, len(changed) + len(stale)
+
+
+def match_previous_rows(hashes, previous_hashes):
+    """Row of each movie in the previous build (matched by content hash), or -1."""
+    available = {}
+    for row, content_hash in enumerate(previous_hashes):
+        available.setdefault(content_hash, []).append(row)
+    matched = []
+    for content_hash in hashes:
+        rows = available.get(content_hash)
+        matched.append(rows.pop(0) if rows else -1)
+    return np.array(matched, dtype=np.intp)
+
+
+# --- Pipeline ---
+def build(movies_csv, credits_csv, output='model', cache_dir=DEFAULT_CACHE_DIR, k=DEFAULT_K, refit=False,
+          workers=1, log=print):
+    """Runs every stage, reusing cached work, and writes the model directory."""
+    os.makedirs(cache_dir, exist_ok=True)
+    timings = {}
+
+    started = time.perf_counter()
+    catalog = load_catalog(movies_csv, credits_csv)
+    hashes = content_hashes(catalog)
+    timings['load'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    tags, tags_computed = compute_tags(catalog, hashes, TagCache(os.path.join(cache_dir, 'tags.db')), workers)
+    timings['tags'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectors_path = os.path.join(cache_dir, 'vectors.npz')
+    vectors, vocabulary, vectors_reused, refitted = vectorize(tags, hashes, load_vectors(vectors_path), refit)
+    save_vectors(vectors_path, vectors, hashes, vocabulary)
+    timings['vectors'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    k = max(0, min(k, len(hashes) - 1))
+    previous = None
+    if not refitted and os.path.exists(output):
+        try:
+            previous = load_artifact(output)
+        except (OSError, ValueError):
+            previous = None
+    if previous is not None and 'content_hash' in previous.columns and previous.neighbors.shape[1] == k:
+        previous_rows = match_previous_rows(hashes, previous.column('content_hash').to_list())
+        changed_share = np.mean(previous_rows < 0) if len(previous_rows) else 1.0
+    else:
+        previous_rows, changed_share = None, 1.0
+
+    # Counts are cached as-is; similarity works on unit-length rows.
+    normalized = normalize_rows(vectors)
+    if previous_rows is not None and changed_share <= INCREMENTAL_LIMIT:
+        neighbors, neighbors_recomputed = update_neighbors(normalized, k, previous.neighbors, previous_rows, workers)
+    else:
+        neighbors = neighbors_from_vectors(normalized, k, normalized=True, workers=workers)
+        neighbors_recomputed = len(hashes)
+    timings['neighbors'] = time.perf_counter() - started
+
+    started = time.perf_counter()
+    build_hash = write_artifact(output, {
+        'id': catalog['id'].to_numpy(dtype='<i8'),
+        'title': catalog['title'].to_numpy(dtype=object),
+        'content_hash': np.array(hashes, dtype=object),
+    }, neighbors)
+    write_vectors(os.path.join(output, VECTORS_FILE), vectors, vocabulary)
+    timings['write'] = time.perf_counter() - started
+
+    summary = {
+        'movies': len(hashes),
+        'tags_computed': tags_computed,
+        'vectors_reused': vectors_reused,
+        'vocabulary_refit': refitted,
+        'neighbors_recomputed': neighbors_recomputed,
+        'build_hash': build_hash,
+        'timings': timings,
+    }
+    log(f"Built {summary['movies']} movies into {output} (build {build_hash[:12]}): "
+        f"{tags_computed} tags computed, {vectors_reused} vectors reused"
+        f"{' (vocabulary refit)' if refitted else ''}, {neighbors_recomputed} neighbor lists recomputed")
+    log("Stage timings: " + ", ".join(f"{stage} {seconds:.2f}s" for stage, seconds in timings.items()))
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build the recommender model directory from the TMDB CSV files.")
+    parser.add_argument('--movies', default='data/tmdb_5000_movies.csv', help="Path to tmdb_5000_movies.csv")
+    parser.add_argument('--credits', default='data/tmdb_5000_credits.csv', help="Path to tmdb_5000_credits.csv")
+    parser.add_argument('--output', default='model', help="Model directory to write")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_DIR, help="Directory for cached build stages")
+    parser.add_argument('-k', type=int, default=DEFAULT_K, help="Neighbors kept per movie")
+    parser.add_argument('--workers', type=int, default=1, help="Processes used for tagging and neighbor scoring")
+    parser.add_argument('--refit', action='store_true', help="Refit the vocabulary and rebuild every neighbor list")
+    args = parser.parse_args()
+    build(args.movies, args.credits, args.output, args.cache, args.k, args.refit, args.workers)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,474 @@
+"""SQLite data access for users, watchlists, ratings and reviews.
+
+Connections come from a small thread-safe pool instead of one module-level
+cursor shared by every Streamlit session. Each pooled connection runs in
+WAL mode (readers never block the writer) with a busy timeout, and keeps
+its own prepared-statement cache across calls. The schema is created once
+per process when the pool is first opened.
+
+The helpers here never touch Streamlit: they return plain values and let
+``sqlite3.Error`` propagate, leaving user-facing messages to the caller.
+With ``recommender.instrument`` enabled, every helper call is timed and
+every SQL statement counted.
+"""
+import argparse
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+from recommender import instrument
+
+DEFAULT_DB_PATH = os.environ.get('USER_DB_PATH', 'user_profiles.db')
+POOL_SIZE = 8
+BUSY_TIMEOUT = 5.0 # Seconds to wait for a lock before raising "database is locked"
+STATEMENT_CACHE_SIZE = 256
+
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL", # Safe with WAL, avoids an fsync per commit
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000", # 16 MB page cache per connection
+)
+
+SCHEMA = (
+    '''CREATE TABLE IF NOT EXISTS users
+       (id INTEGER PRIMARY KEY AUTOINCREMENT,
+        username TEXT UNIQUE,
+        password TEXT,
+        created_at TIMESTAMP)''',
+    '''CREATE TABLE IF NOT EXISTS user_watchlist
+       (user_id INTEGER,
+        movie_id INTEGER,
+        movie_title TEXT,
+        PRIMARY KEY (user_id, movie_id),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE)''',
+    '''CREATE TABLE IF NOT EXISTS movie_ratings
+       (user_id INTEGER,
+        movie_id INTEGER,
+        rating INTEGER, -- 1 to 5 stars
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        PRIMARY KEY (user_id, movie_id),
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE)''',
+    '''CREATE TABLE IF NOT EXISTS movie_reviews
+       (review_id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id INTEGER,
+        movie_id INTEGER,
+        review_text TEXT,
+        timestamp DATETIME DEFAULT CURRENT_TIMESTAMP,
+        FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE)''',
+    # Per-movie rating aggregates, kept in sync by add_movie_rating so that
+    # averages never have to scan movie_ratings.
+    '''CREATE TABLE IF NOT EXISTS movie_rating_stats
+       (movie_id INTEGER PRIMARY KEY,
+        rating_sum INTEGER NOT NULL DEFAULT 0,
+        rating_count INTEGER NOT NULL DEFAULT 0,
+        stars_1 INTEGER NOT NULL DEFAULT 0,
+        stars_2 INTEGER NOT NULL DEFAULT 0,
+        stars_3 INTEGER NOT NULL DEFAULT 0,
+        stars_4 INTEGER NOT NULL DEFAULT 0,
+        stars_5 INTEGER NOT NULL DEFAULT 0)''',
+    '''CREATE TABLE IF NOT EXISTS movie_review_counts
+       (movie_id INTEGER PRIMARY KEY,
+        review_count INTEGER NOT NULL DEFAULT 0)''',
+    # Bumped on every rating or watchlist change, so per-user caches can tell
+    # whether their entry is still current with a single primary-key read.
+    '''CREATE TABLE IF NOT EXISTS user_activity
+       (user_id INTEGER PRIMARY KEY,
+        version INTEGER NOT NULL DEFAULT 0)''',
+    "CREATE INDEX IF NOT EXISTS idx_movie_ratings_movie ON movie_ratings (movie_id, rating)",
+    # Serves the keyset seek and ordering of get_movie_reviews_page. Not covering on purpose:
+    # copying review_text into the index would double the table's size and write cost to save
+    # one row lookup per displayed review.
+    "CREATE INDEX IF NOT EXISTS idx_movie_reviews_page ON movie_reviews (movie_id, timestamp DESC, review_id DESC)",
+    # Covers get_watchlist_movies without touching the table
+    "CREATE INDEX IF NOT EXISTS idx_user_watchlist_user ON user_watchlist (user_id, movie_id, movie_title)",
+)
+
+BACKFILL_RATING_STATS = (
+    "DELETE FROM movie_rating_stats",
+    '''INSERT INTO movie_rating_stats
+       (movie_id, rating_sum, rating_count, stars_1, stars_2, stars_3, stars_4, stars_5)
+       SELECT movie_id, SUM(rating), COUNT(rating),
+              SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+       FROM movie_ratings
+       WHERE rating IS NOT NULL
+       GROUP BY movie_id''',
+)
+
+BACKFILL_REVIEW_COUNTS = (
+    "DELETE FROM movie_review_counts",
+    '''INSERT INTO movie_review_counts (movie_id, review_count)
+       SELECT movie_id, COUNT(*) FROM movie_reviews GROUP BY movie_id''',
+)
+
+# Aggregate tables and how to rebuild them from the base tables
+AGGREGATES = {
+    'movie_rating_stats': BACKFILL_RATING_STATS,
+    'movie_review_counts': BACKFILL_REVIEW_COUNTS,
+}
+
+
+def _count_statement(statement):
+    instrument.count('sql_statements', database='users')
+
+
+class ConnectionPool:
+    """Fixed-size pool of tuned SQLite connections, safe to share between threads."""
+
+    def __init__(self, path=DEFAULT_DB_PATH, size=POOL_SIZE):
+        self.path = path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        with self.connection() as conn:
+            existing = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+            for statement in SCHEMA:
+                conn.execute(statement)
+            # Databases created before an aggregate table existed get it filled once.
+            for table, backfill in AGGREGATES.items():
+                if table not in existing:
+                    for statement in backfill:
+                        conn.execute(statement)
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, check_same_thread=False,
+                               cached_statements=STATEMENT_CACHE_SIZE)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1 # Give the slot back so a later call can retry
+                raise
+        try:
+            return self._idle.get(timeout=BUSY_TIMEOUT)
+        except queue.Empty:
+            # Callers handle sqlite3.Error; a pool busy this long is the same failure as a locked database.
+            raise sqlite3.OperationalError("connection pool exhausted") from None
+
+    @contextmanager
+    def connection(self):
+        """Borrows a connection; commits on success and rolls back on error."""
+        conn = self._acquire()
+        # A trace callback fires for every statement, so it is only installed while instrumentation
+        # is on; set on every checkout so toggling it also reaches connections already in the pool.
+        conn.set_trace_callback(_count_statement if instrument.enabled() else None)
+        try:
+            yield conn
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+
+def _in_clause_chunks(values, size=500):
+    """Splits values for ``IN (...)`` queries, staying below SQLite's bound-parameter limit."""
+    values = list(dict.fromkeys(int(value) for value in values))
+    for start in range(0, len(values), size):
+        chunk = values[start:start + size]
+        yield chunk, ','.join('?' * len(chunk))
+
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(path=DEFAULT_DB_PATH):
+    """Process-wide pool for a database file; the first call creates the schema."""
+    with _pools_lock:
+        pool = _pools.get(path)
+        if pool is None:
+            pool = _pools[path] = ConnectionPool(path)
+        return pool
+
+
+def _bump_activity(conn, user_id):
+    conn.execute("""
+        INSERT INTO user_activity (user_id, version) VALUES (?, 1)
+        ON CONFLICT (user_id) DO UPDATE SET version = version + 1
+    """, (user_id,))
+
+
+# --- Users ---
+@instrument.timed()
+def create_user(username, password, pool=None):
+    """Returns False if the username is already taken."""
+    try:
+        with (pool or get_pool()).connection() as conn:
+            conn.execute("INSERT INTO users (username, password, created_at) VALUES (?, ?, ?)",
+                         (username, password, datetime.now()))
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+@instrument.timed()
+def verify_user(username, password, pool=None):
+    with (pool or get_pool()).connection() as conn:
+        return conn.execute("SELECT id FROM users WHERE username=? AND password=?", (username, password)).fetchone()
+
+
+@instrument.timed()
+def get_username_by_id(user_id, pool=None):
+    with (pool or get_pool()).connection() as conn:
+        result = conn.execute("SELECT username FROM users WHERE id=?", (user_id,)).fetchone()
+    return result[0] if result else None
+
+
+# --- Watchlist ---
+@instrument.timed()
+def add_to_watchlist(user_id, movie_id, movie_title, pool=None):
+    """Returns False if the movie is already on the watchlist."""
+    try:
+        with (pool or get_pool()).connection() as conn:
+            conn.execute("INSERT INTO user_watchlist (user_id, movie_id, movie_title) VALUES (?, ?, ?)",
+                         (user_id, int(movie_id), movie_title))
+            _bump_activity(conn, user_id)
+        return True
+    except sqlite3.IntegrityError:
+        return False
+
+
+@instrument.timed()
+def remove_from_watchlist(user_id, movie_id, pool=None):
+    with (pool or get_pool()).connection() as conn:
+        removed = conn.execute("DELETE FROM user_watchlist WHERE user_id=? AND movie_id=?", (user_id, int(movie_id))).rowcount
+        if removed:
+            _bump_activity(conn, user_id)
+
+
+@instrument.timed()
+def is_movie_in_watchlist(user_id, movie_id, pool=None):
+    with (pool or get_pool()).connection() as conn:
+        return conn.execute("SELECT 1 FROM user_watchlist WHERE user_id=? AND movie_id=?",
+                            (user_id, int(movie_id))).fetchone() is not None
+
+
+@instrument.timed()
+def get_watchlist_flags(user_id, movie_ids, pool=None):
+    """The subset of movie_ids on the user's watchlist, in one query."""
+    on_watchlist = set()
+    with (pool or get_pool()).connection() as conn:
+        for chunk, placeholders in _in_clause_chunks(movie_ids):
+            rows = conn.execute(f"SELECT movie_id FROM user_watchlist WHERE user_id=? AND movie_id IN ({placeholders})",
+                                (user_id, *chunk)).fetchall()
+            on_watchlist.update(int(row[0]) for row in rows)
+    return on_watchlist
+
+
+@instrument.timed()
+def get_watchlist_movies(user_id, pool=None):
+    with (pool or get_pool()).connection() as conn:
+        rows = conn.execute("SELECT movie_id, movie_title FROM user_watchlist WHERE user_id=?", (user_id,)).fetchall()
+    return [(int(row[0]), row[1]) for row in rows]
+
+
+# --- Ratings ---
+@instrument.timed()
+def add_movie_rating(user_id, movie_id, rating, pool=None):
+    """Inserts or replaces a 1-5 star rating and updates movie_rating_stats in the same transaction."""
+    movie_id, rating = int(movie_id), int(rating)
+    if not 1 <= rating <= 5:
+        raise ValueError(f"Rating must be between 1 and 5, got {rating}")
+    with (pool or get_pool()).connection() as conn:
+        # Take the write lock up front so the read of the old rating cannot go stale.
+        conn.execute("BEGIN IMMEDIATE")
+        previous = conn.execute("SELECT rating FROM movie_ratings WHERE user_id=? AND movie_id=?",
+                                (user_id, movie_id)).fetchone()
+        conn.execute("INSERT OR REPLACE INTO movie_ratings (user_id, movie_id, rating) VALUES (?, ?, ?)",
+                     (user_id, movie_id, rating))
+        conn.execute("INSERT OR IGNORE INTO movie_rating_stats (movie_id) VALUES (?)", (movie_id,))
+        if previous is None or previous[0] is None:
+            conn.execute(f"""
+                UPDATE movie_rating_stats
+                SET rating_sum = rating_sum + ?, rating_count = rating_count + 1, stars_{rating} = stars_{rating} + 1
+                WHERE movie_id = ?
+            """, (rating, movie_id))
+        elif previous[0] != rating:
+            old_rating = int(previous[0])
+            # Legacy ratings outside 1-5 count towards the sum but have no histogram column to decrement.
+            unstar = f", stars_{old_rating} = stars_{old_rating} - 1" if 1 <= old_rating <= 5 else ""
+            conn.execute(f"""
+                UPDATE movie_rating_stats
+                SET rating_sum = rating_sum + ?{unstar}, stars_{rating} = stars_{rating} + 1
+                WHERE movie_id = ?
+            """, (rating - old_rating, movie_id))
+        if previous is None or previous[0] != rating:
+            _bump_activity(conn, user_id)
+
+
+@instrument.timed()
+def get_user_movie_rating(user_id, movie_id, pool=None):
+    with (pool or get_pool()).connection() as conn:
+        result = conn.execute("SELECT rating FROM movie_ratings WHERE user_id=? AND movie_id=?",
+                              (user_id, int(movie_id))).fetchone()
+    return result[0] if result else None
+
+
+def _average(rating_sum, rating_count):
+    return round(rating_sum / rating_count, 1) if rating_count else None
+
+
+@instrument.timed()
+def get_average_movie_rating(movie_id, pool=None):
+    """Returns (average rounded to one decimal or None, number of ratings)."""
+    with (pool or get_pool()).connection() as conn:
+        result = conn.execute("SELECT rating_sum, rating_count FROM movie_rating_stats WHERE movie_id=?",
+                              (int(movie_id),)).fetchone()
+    if not result:
+        return None, 0
+    return _average(*result), result[1]
+
+
+@instrument.timed()
+def get_average_ratings(movie_ids, pool=None):
+    """Batch version of get_average_movie_rating: ``{movie_id: (average or None, count)}`` for every id."""
+    ratings = {}
+    with (pool or get_pool()).connection() as conn:
+        for chunk, placeholders in _in_clause_chunks(movie_ids):
+            ratings.update({movie_id: (None, 0) for movie_id in chunk})
+            rows = conn.execute(
+                f"SELECT movie_id, rating_sum, rating_count FROM movie_rating_stats WHERE movie_id IN ({placeholders})",
+                chunk,
+            ).fetchall()
+            for movie_id, rating_sum, rating_count in rows:
+                ratings[int(movie_id)] = (_average(rating_sum, rating_count), rating_count)
+    return ratings
+
+
+@instrument.timed()
+def get_rating_histogram(movie_id, pool=None):
+    """Number of 1..5 star ratings of a movie, as a list of five counts."""
+    with (pool or get_pool()).connection() as conn:
+        result = conn.execute("SELECT stars_1, stars_2, stars_3, stars_4, stars_5 FROM movie_rating_stats WHERE movie_id=?",
+                              (int(movie_id),)).fetchone()
+    return list(result) if result else [0] * 5
+
+
+# --- User activity ---
+@instrument.timed()
+def get_user_activity_version(user_id, pool=None):
+    """Counter that changes whenever the user's ratings or watchlist change (0 if they never did)."""
+    with (pool or get_pool()).connection() as conn:
+        result = conn.execute("SELECT version FROM user_activity WHERE user_id=?", (user_id,)).fetchone()
+    return result[0] if result else 0
+
+
+@instrument.timed()
+def get_user_signals(user_id, pool=None):
+    """Returns ``(version, {movie_id: rating}, [watchlisted movie_id])`` for personalized recommendations.
+
+    The version is read first, so a change that lands while the rest is read
+    leaves an older version behind and the caller recomputes next time.
+    """
+    with (pool or get_pool()).connection() as conn:
+        version = conn.execute("SELECT version FROM user_activity WHERE user_id=?", (user_id,)).fetchone()
+        ratings = conn.execute("SELECT movie_id, rating FROM movie_ratings WHERE user_id=? AND rating IS NOT NULL",
+                               (user_id,)).fetchall()
+        watchlist = conn.execute("SELECT movie_id FROM user_watchlist WHERE user_id=?", (user_id,)).fetchall()
+    return (version[0] if version else 0,
+            {int(movie_id): int(rating) for movie_id, rating in ratings},
+            [int(row[0]) for row in watchlist])
+
+
+@instrument.timed()
+def backfill_aggregates(pool=None):
+    """Rebuilds every aggregate table from its base table. Returns ``{table: rows}``."""
+    counts = {}
+    with (pool or get_pool()).connection() as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        for table, backfill in AGGREGATES.items():
+            for statement in backfill:
+                conn.execute(statement)
+            counts[table] = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    return counts
+
+
+# --- Reviews ---
+@instrument.timed()
+def add_movie_review(user_id, movie_id, review_text, pool=None):
+    """Inserts a review and bumps movie_review_counts in the same transaction."""
+    movie_id = int(movie_id)
+    with (pool or get_pool()).connection() as conn:
+        conn.execute("INSERT INTO movie_reviews (user_id, movie_id, review_text) VALUES (?, ?, ?)",
+                     (user_id, movie_id, review_text))
+        conn.execute("""
+            INSERT INTO movie_review_counts (movie_id, review_count) VALUES (?, 1)
+            ON CONFLICT (movie_id) DO UPDATE SET review_count = review_count + 1
+        """, (movie_id,))
+
+
+@instrument.timed()
+def get_review_count(movie_id, pool=None):
+    with (pool or get_pool()).connection() as conn:
+        result = conn.execute("SELECT review_count FROM movie_review_counts WHERE movie_id=?", (int(movie_id),)).fetchone()
+    return result[0] if result else 0
+
+
+@instrument.timed()
+def get_movie_reviews_page(movie_id, limit=5, after=None, pool=None):
+    """One page of reviews as (review_text, username, timestamp), newest first.
+
+    Uses keyset pagination on (timestamp, review_id): ``after`` is the cursor
+    returned for the previous page, or None for the first page. Returns
+    ``(reviews, next_cursor)``; next_cursor is None on the last page.
+    """
+    query = """
+        SELECT mr.review_text, COALESCE(u.username, 'Unknown user'), mr.timestamp, mr.review_id
+        FROM movie_reviews mr
+        LEFT JOIN users u ON mr.user_id = u.id
+        WHERE mr.movie_id = ? {seek}
+        ORDER BY mr.timestamp DESC, mr.review_id DESC
+        LIMIT ?
+    """
+    with (pool or get_pool()).connection() as conn:
+        if after is None:
+            rows = conn.execute(query.format(seek=""), (int(movie_id), limit + 1)).fetchall()
+        else:
+            rows = conn.execute(query.format(seek="AND (mr.timestamp, mr.review_id) < (?, ?)"),
+                                (int(movie_id), after[0], int(after[1]), limit + 1)).fetchall()
+
+    page = rows[:limit]
+    next_cursor = (page[-1][2], page[-1][3]) if len(rows) > limit else None
+    return [row[:3] for row in page], next_cursor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Maintenance commands for the user database.")
+    parser.add_argument('command', choices=['backfill-stats'], help="backfill-stats: rebuild the rating and review aggregate tables")
+    parser.add_argument('--db', default=DEFAULT_DB_PATH, help="Path to user_profiles.db")
+    args = parser.parse_args()
+
+    if args.command == 'backfill-stats':
+        counts = backfill_aggregates(get_pool(args.db))
+        print(f"Rebuilt aggregates in {args.db}: " + ", ".join(f"{table} ({rows} movies)" for table, rows in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+"""Shared outbound HTTP client for TMDB, OMDb and the TMDB image server.
+
+Every upstream call goes through one ``HttpClient`` per process
+(``get_client``), which adds:
+
+* a token bucket per API (``RATE_LIMITS``), so all sessions and worker
+  threads together stay under the upstream's limit; a 429 pauses the bucket
+  for its ``Retry-After``;
+* retries with jittered exponential backoff for connection errors,
+  timeouts, 429 and 5xx answers;
+* a circuit breaker per API: after ``BREAKER_THRESHOLD`` consecutive failed
+  calls, calls fail at once with ``CircuitOpenError`` for ``BREAKER_RESET``
+  seconds instead of each waiting for a timeout, and callers serve cached
+  or placeholder data;
+* single-flight coalescing: identical GETs already in flight share one
+  response.
+
+``benchmarks.stub_tmdb.StubTMDB`` can inject errors, throttling and delays
+to exercise all of it offline.
+"""
+import os
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+from requests.exceptions import (ChunkedEncodingError, ConnectionError, ContentDecodingError, HTTPError,
+                                 RequestException, Timeout)
+
+from recommender import instrument
+
+REQUEST_TIMEOUT = 5
+POOL_SIZE = 8 # Keep-alive connections per host, one per parallel worker
+MAX_RETRIES = int(os.environ.get('HTTP_MAX_RETRIES', 2)) # Retries after the first attempt
+BACKOFF_BASE = 0.25 # Seconds; the retry delay is drawn from [0, base * 2**attempt]
+BACKOFF_CAP = 4.0 # Longest wait before a retry; a longer Retry-After gives up instead
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# Transport errors worth another attempt; other request errors (bad URL, redirect loop) fail at once.
+RETRY_ERRORS = (ConnectionError, Timeout, ChunkedEncodingError, ContentDecodingError)
+BREAKER_THRESHOLD = 5 # Consecutive failed calls that open the circuit
+BREAKER_RESET = 30 # Seconds the circuit stays open before one trial call
+# Requests per second per API (0 = unlimited); bursts of up to one second's worth pass at once.
+RATE_LIMITS = {
+    'tmdb': float(os.environ.get('TMDB_RATE_LIMIT', 30)), # TMDB allows roughly 40
+    'omdb': float(os.environ.get('OMDB_RATE_LIMIT', 10)),
+}
+
+
+class CircuitOpenError(RequestException):
+    """The upstream has been failing; the call was not attempted."""
+
+
+def new_session(pool_size=POOL_SIZE):
+    """Keep-alive session sized for ``pool_size`` parallel requests per host."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return session
+
+
+class TokenBucket:
+    """Allows ``rate`` calls per second on average and bursts of up to ``burst``, across all threads."""
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = max(1.0, burst if burst is not None else rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        """Takes a token, sleeping until it is due. Returns the seconds waited."""
+        if self.rate <= 0:
+            return 0.0
+        with self._lock:
+            self._refill(time.monotonic())
+            # Going negative reserves a future token, so waiting threads are served in order.
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+    def pause(self, seconds):
+        """Hands out no tokens for the next ``seconds`` (after a 429)."""
+        if self.rate <= 0:
+            return
+        with self._lock:
+            self._refill(time.monotonic())
+            self._tokens = min(self._tokens, -seconds * self.rate)
+
+
+class CircuitBreaker:
+    """Fails fast after ``threshold`` consecutive failures.
+
+    Once ``reset_timeout`` seconds have passed, one trial call is let
+    through: success closes the circuit, failure opens it again.
+    """
+
+    def __init__(self, threshold=BREAKER_THRESHOLD, reset_timeout=BREAKER_RESET):
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.opened = 0 # Times the circuit has opened
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            if self._trial or time.monotonic() - self.opened_at >= self.reset_timeout:
+                return 'half-open'
+            return 'open'
+
+    def allow(self):
+        """Whether a call may go out now."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._trial or time.monotonic() - self.opened_at < self.reset_timeout:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        """Returns True if this failure opened the circuit."""
+        with self._lock:
+            self.failures += 1
+            if not self._trial and (self.opened_at is not None or self.failures < self.threshold):
+                return False
+            self.opened_at = time.monotonic()
+            self._trial = False
+            self.opened += 1
+            return True
+
+
+class _Upstream:
+    __slots__ = ('bucket', 'breaker')
+
+    def __init__(self, rate, threshold, reset_timeout):
+        self.bucket = TokenBucket(rate)
+        self.breaker = CircuitBreaker(threshold, reset_timeout)
+
+
+class _Call:
+    __slots__ = ('done', 'response', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.response = None
+        self.error = None
+
+
+def _retry_after(response):
+    """Seconds from a ``Retry-After`` header, or None if absent or not a number."""
+    try:
+        return max(0.0, float(response.headers['Retry-After']))
+    except (KeyError, ValueError):
+        return None
+
+
+class HttpClient:
+    """Rate-limited, retrying, circuit-breaking GETs with single-flight coalescing.
+
+    ``api`` names the upstream of each call (``'tmdb'``, ``'omdb'``,
+    ``'tmdb_image'``); rate limits and circuit breakers are kept per API.
+    ``rates`` replaces ``RATE_LIMITS``; APIs missing from it are unlimited.
+    """
+
+    def __init__(self, session=None, rates=None, retries=MAX_RETRIES, backoff_base=BACKOFF_BASE,
+                 backoff_cap=BACKOFF_CAP, breaker_threshold=BREAKER_THRESHOLD, breaker_reset=BREAKER_RESET,
+                 timeout=REQUEST_TIMEOUT):
+        self.session = session or new_session()
+        self.rates = dict(RATE_LIMITS if rates is None else rates)
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.breaker_threshold = breaker_threshold
+        self.breaker_reset = breaker_reset
+        self.timeout = timeout
+        self._upstreams = {}
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+    def _upstream(self, api):
+        with self._lock:
+            upstream = self._upstreams.get(api)
+            if upstream is None:
+                upstream = self._upstreams[api] = _Upstream(self.rates.get(api, 0), self.breaker_threshold,
+                                                            self.breaker_reset)
+            return upstream
+
+    def backoff(self, attempt):
+        """Delay before retry number ``attempt + 1``: full jitter over an exponentially growing window."""
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+
+    def get(self, url, params=None, api='http'):
+        """GETs url and returns the response.
+
+        Identical calls already in flight wait for that response instead of
+        sending their own. Raises ``HTTPError`` for error answers, and
+        ``CircuitOpenError`` without calling out while the API is failing.
+        """
+        key = (url, tuple(sorted((params or {}).items())))
+        with self._lock:
+            call = self._inflight.get(key)
+            leader = call is None
+            if leader:
+                call = self._inflight[key] = _Call()
+        if leader:
+            try:
+                call.response = self._get(url, params, api)
+            except Exception as e:
+                call.error = e
+            finally:
+                with self._lock:
+                    del self._inflight[key]
+                call.done.set()
+        else:
+            instrument.count('http_coalesced', api=api)
+            call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.response
+
+    def get_json(self, url, params=None, api='http'):
+        return self.get(url, params, api).json()
+
+    def _get(self, url, params, api):
+        upstream = self._upstream(api)
+        if not upstream.breaker.allow():
+            instrument.count('http_requests', api=api, outcome='rejected')
+            raise CircuitOpenError(f"{api} is failing; calls are paused for up to {self.breaker_reset:g}s")
+
+        # Every call that got past allow() must record an outcome: a half-open breaker
+        # waits for its trial call's result and would otherwise stay half-open for good.
+        succeeded = False
+        try:
+            for attempt in range(self.retries + 1):
+                upstream.bucket.acquire()
+                retry_after = None
+                try:
+                    with instrument.span(f'http.{api}'):
+                        response = self.session.get(url, params=params, timeout=self.timeout)
+                except RequestException as e:
+                    error = e
+                    if not isinstance(e, RETRY_ERRORS):
+                        break
+                else:
+                    if response.status_code not in RETRY_STATUSES:
+                        # The upstream answered; a 404 is about the request, not its health.
+                        upstream.breaker.record_success()
+                        succeeded = True
+                        instrument.count('http_requests', api=api, outcome='ok' if response.ok else 'error')
+                        response.raise_for_status()
+                        return response
+                    error = HTTPError(f"{response.status_code} Server Error for url: {response.url}", response=response)
+                    retry_after = _retry_after(response)
+                    if response.status_code == 429:
+                        upstream.bucket.pause(retry_after if retry_after is not None else self.backoff_base)
+
+                delay = retry_after if retry_after is not None else self.backoff(attempt)
+                if attempt == self.retries or delay > self.backoff_cap:
+                    break
+                instrument.count('http_requests', api=api, outcome='retry')
+                time.sleep(delay)
+
+            instrument.count('http_requests', api=api, outcome='error')
+            raise error
+        finally:
+            if not succeeded and upstream.breaker.record_failure():
+                instrument.count('http_circuit_opened', api=api)
+
+    def stats(self):
+        """``{api: {'state', 'failures', 'opened', 'rate'}}`` for every API called so far."""
+        with self._lock:
+            upstreams = dict(self._upstreams)
+        return {api: {'state': upstream.breaker.state, 'failures': upstream.breaker.failures,
+                      'opened': upstream.breaker.opened, 'rate': upstream.bucket.rate}
+                for api, upstream in upstreams.items()}
+
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+
+def get_client():
+    """Process-wide client, so rate limits and circuit state cover every caller."""
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = HttpClient()
+        return _default_client
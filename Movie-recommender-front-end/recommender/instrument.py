@@ -0,0 +1,320 @@
+"""Lightweight timing spans and call counters for the hot paths.
+
+Off unless ``RECOMMENDER_INSTRUMENT=1`` (or ``enable()``); every hook then
+returns after a single flag check. When on:
+
+* ``span(name)`` and the ``@timed()`` decorator record how long a block or
+  function took;
+* ``count(name, **labels)`` bumps a counter: HTTP requests, SQL statements,
+  cache hits and misses;
+* both are recorded into the current *run* (one Streamlit script run or
+  one API request, see ``start_run``) and into process-wide totals.
+
+Finished runs are kept in a short history and, with
+``RECOMMENDER_INSTRUMENT_LOG`` set, appended to that file as JSON lines.
+``prometheus_text()`` renders the totals in the Prometheus text format.
+"""
+import contextvars
+import functools
+import json
+import os
+import threading
+import time
+from collections import deque
+
+ENABLED = os.environ.get('RECOMMENDER_INSTRUMENT', '').lower() in ('1', 'true', 'yes')
+LOG_PATH = os.environ.get('RECOMMENDER_INSTRUMENT_LOG')
+HISTORY = 50 # Finished runs kept in memory
+MAX_SPANS = 5000 # Spans listed per run; later ones still count towards the totals
+
+_enabled = ENABLED
+_current = contextvars.ContextVar('instrument_run', default=None)
+_depth = contextvars.ContextVar('instrument_depth', default=0)
+
+_lock = threading.Lock()
+_span_totals = {} # name -> [calls, seconds, max seconds]
+_run_totals = {} # label -> [runs, seconds]
+_counters = {} # (name, labels) -> value
+_history = deque(maxlen=HISTORY)
+
+
+def enabled():
+    return _enabled
+
+
+def enable():
+    global _enabled
+    _enabled = True
+
+
+def disable():
+    global _enabled
+    _enabled = False
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+class Run:
+    """Spans and counters recorded during one script run or request."""
+
+    def __init__(self, label):
+        self.label = label
+        self.started_at = time.time()
+        self.started = time.perf_counter()
+        self.duration = None
+        self.interrupted = False
+        self.spans = [] # (name, start offset, seconds, depth)
+        self.counters = {}
+        self._lock = threading.Lock()
+
+    def _add_span(self, name, started, seconds, depth):
+        with self._lock:
+            if len(self.spans) < MAX_SPANS:
+                self.spans.append((name, started - self.started, seconds, depth))
+
+    def _count(self, key, value):
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def span_summary(self):
+        """``{name: (calls, seconds, max seconds)}``, slowest first."""
+        summary = {}
+        for name, _, seconds, _ in self.spans:
+            calls, total, longest = summary.get(name, (0, 0.0, 0.0))
+            summary[name] = (calls + 1, total + seconds, max(longest, seconds))
+        return dict(sorted(summary.items(), key=lambda item: -item[1][1]))
+
+    def counter(self, name, **labels):
+        """Sum of a counter over every label combination matching ``labels``."""
+        wanted = set(labels.items())
+        return sum(value for (key, key_labels), value in self.counters.items()
+                   if key == name and wanted <= set(key_labels))
+
+    def to_dict(self):
+        return {
+            'label': self.label,
+            'started_at': self.started_at,
+            'seconds': self.duration,
+            'interrupted': self.interrupted,
+            'spans': [{'name': name, 'calls': calls, 'seconds': total, 'max_seconds': longest}
+                      for name, (calls, total, longest) in self.span_summary().items()],
+            'counters': [{'name': name, 'labels': dict(labels), 'value': value}
+                         for (name, labels), value in self.counters.items()],
+            'cache_hit_ratios': cache_hit_ratios(self.counters),
+        }
+
+
+class _Span:
+    __slots__ = ('name', 'started', '_token')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self._token = _depth.set(_depth.get() + 1)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        seconds = time.perf_counter() - self.started
+        _depth.reset(self._token)
+        with _lock:
+            totals = _span_totals.get(self.name)
+            if totals is None:
+                _span_totals[self.name] = [1, seconds, seconds]
+            else:
+                totals[0] += 1
+                totals[1] += seconds
+                totals[2] = max(totals[2], seconds)
+        run = _current.get()
+        if run is not None:
+            run._add_span(self.name, self.started, seconds, _depth.get())
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def span(name):
+    """Context manager timing the enclosed block under ``name``."""
+    return _Span(name) if _enabled else _NULL_SPAN
+
+
+def timed(name=None):
+    """Decorator timing every call; the span defaults to ``<module>.<function>``."""
+    def decorate(fn):
+        span_name = name or f"{fn.__module__.rsplit('.', 1)[-1]}.{fn.__qualname__}"
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _enabled:
+                return fn(*args, **kwargs)
+            with _Span(span_name):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def count(name, value=1, **labels):
+    """Adds value to a counter, e.g. ``count('http_requests', api='tmdb', outcome='ok')``."""
+    if not _enabled:
+        return
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+    run = _current.get()
+    if run is not None:
+        run._count(key, value)
+
+
+def cache_lookups(cache, hits, misses):
+    """Counts cache hits and misses under ``cache_requests``."""
+    if not _enabled:
+        return
+    if hits:
+        count('cache_requests', hits, cache=cache, result='hit')
+    if misses:
+        count('cache_requests', misses, cache=cache, result='miss')
+
+
+def cache_hit_ratios(counters=None):
+    """``{cache: {'hits', 'misses', 'hit_ratio'}}`` from counters (default: process totals)."""
+    if counters is None:
+        with _lock:
+            counters = dict(_counters)
+    ratios = {}
+    for (name, labels), value in counters.items():
+        if name != 'cache_requests':
+            continue
+        labels = dict(labels)
+        entry = ratios.setdefault(labels['cache'], {'hits': 0, 'misses': 0, 'hit_ratio': 0.0})
+        entry['hits' if labels['result'] == 'hit' else 'misses'] += value
+    for entry in ratios.values():
+        lookups = entry['hits'] + entry['misses']
+        entry['hit_ratio'] = entry['hits'] / lookups if lookups else 0.0
+    return ratios
+
+
+# --- Runs ---
+def start_run(label='run'):
+    """Starts recording a run in the current context. Returns it, or None while disabled."""
+    if not _enabled:
+        return None
+    run = Run(label)
+    _current.set(run)
+    _depth.set(0)
+    return run
+
+
+def finish_run(run=None, interrupted=False):
+    """Closes a run (default: the current one), adds it to the history and the log file."""
+    run = run if run is not None else _current.get()
+    if run is None or run.duration is not None:
+        return run
+    run.duration = time.perf_counter() - run.started
+    run.interrupted = interrupted
+    with _lock:
+        totals = _run_totals.setdefault(run.label, [0, 0.0])
+        totals[0] += 1
+        totals[1] += run.duration
+        _history.append(run)
+    if _current.get() is run:
+        _current.set(None)
+    if LOG_PATH:
+        with open(LOG_PATH, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(run.to_dict()) + '\n')
+    return run
+
+
+def current_run():
+    return _current.get()
+
+
+def recent_runs():
+    with _lock:
+        return list(_history)
+
+
+def bind(fn):
+    """fn set up to record into the caller's run when it is called on another thread (e.g. a pool worker)."""
+    run = _current.get()
+    if run is None:
+        return fn
+    depth = _depth.get()
+
+    @functools.wraps(fn)
+    def bound(*args, **kwargs):
+        run_token, depth_token = _current.set(run), _depth.set(depth)
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _depth.reset(depth_token)
+            _current.reset(run_token)
+    return bound
+
+
+def reset():
+    """Forgets all totals and history."""
+    with _lock:
+        _span_totals.clear()
+        _run_totals.clear()
+        _counters.clear()
+        _history.clear()
+
+
+# --- Export ---
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels):
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels) + '}' if labels else ''
+
+
+def prometheus_text(prefix='recommender'):
+    """Process-wide totals in the Prometheus text exposition format."""
+    with _lock:
+        span_totals = {name: list(totals) for name, totals in _span_totals.items()}
+        run_totals = {label: list(totals) for label, totals in _run_totals.items()}
+        counters = dict(_counters)
+
+    lines = [f"# HELP {prefix}_span_seconds Time spent in instrumented functions and blocks.",
+             f"# TYPE {prefix}_span_seconds summary"]
+    for name, (calls, seconds, _) in sorted(span_totals.items()):
+        labels = _format_labels((('span', name),))
+        lines.append(f"{prefix}_span_seconds_count{labels} {calls}")
+        lines.append(f"{prefix}_span_seconds_sum{labels} {seconds:.6f}")
+    lines += [f"# HELP {prefix}_span_max_seconds Slowest single call of each span.",
+              f"# TYPE {prefix}_span_max_seconds gauge"]
+    lines += [f"{prefix}_span_max_seconds{_format_labels((('span', name),))} {longest:.6f}"
+              for name, (_, _, longest) in sorted(span_totals.items())]
+
+    lines += [f"# HELP {prefix}_run_seconds Duration of script runs and requests.",
+              f"# TYPE {prefix}_run_seconds summary"]
+    for label, (runs, seconds) in sorted(run_totals.items()):
+        labels = _format_labels((('run', label),))
+        lines.append(f"{prefix}_run_seconds_count{labels} {runs}")
+        lines.append(f"{prefix}_run_seconds_sum{labels} {seconds:.6f}")
+
+    for name in sorted({name for name, _ in counters}):
+        lines += [f"# TYPE {prefix}_{name}_total counter"]
+        lines += [f"{prefix}_{name}_total{_format_labels(labels)} {value}"
+                  for (key, labels), value in sorted(counters.items()) if key == name]
+
+    lines += [f"# HELP {prefix}_cache_hit_ratio Share of cache lookups answered from the cache.",
+              f"# TYPE {prefix}_cache_hit_ratio gauge"]
+    lines += [f"{prefix}_cache_hit_ratio{_format_labels((('cache', cache),))} {entry['hit_ratio']:.4f}"
+              for cache, entry in sorted(cache_hit_ratios(counters).items())]
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,53 @@
+"""Constant-time title -> row and TMDB id -> row lookups, built once per model load."""
+
+
+class MovieLookup:
+    """Maps titles and TMDB ids to row indices of the movie table.
+
+    Some titles appear more than once in the TMDB catalog (remakes, same-name
+    films). A title always resolves to its first row, which is what the old
+    ``movies[movies['title'] == title].index[0]`` scan returned; every row
+    sharing a title is still available through ``rows_for_title``.
+    Duplicate ids are resolved the same way.
+    """
+
+    def __init__(self, titles, ids):
+        self._by_title = {}
+        self._duplicate_titles = {}
+        for row, title in enumerate(titles):
+            if title in self._by_title:
+                self._duplicate_titles.setdefault(title, [self._by_title[title]]).append(row)
+            else:
+                self._by_title[title] = row
+
+        self._by_id = {}
+        for row, movie_id in enumerate(ids):
+            self._by_id.setdefault(int(movie_id), row)
+
+    def __len__(self):
+        return len(self._by_title)
+
+    def __contains__(self, title):
+        return title in self._by_title
+
+    def row_for_title(self, title):
+        """Row of the first movie with this exact title, or None."""
+        return self._by_title.get(title)
+
+    def rows_for_title(self, title):
+        """All rows with this exact title, in table order."""
+        if title in self._duplicate_titles:
+            return list(self._duplicate_titles[title])
+        row = self._by_title.get(title)
+        return [] if row is None else [row]
+
+    def row_for_id(self, movie_id):
+        """Row of the movie with this TMDB id, or None."""
+        try:
+            return self._by_id.get(int(movie_id))
+        except (TypeError, ValueError):
+            return None
+
+    @property
+    def duplicate_titles(self):
+        return dict(self._duplicate_titles)
@@ -0,0 +1,193 @@
+"""TMDB / OMDb metadata fetching through the shared HTTP client.
+
+``fetch_movie_details_many`` fetches a whole grid page concurrently with
+bounded parallelism. Every lookup reads through the disk-backed
+``MetadataCache``; while TMDB is failing, expired entries are served
+instead of placeholders. Base URLs, client and cache can be overridden, so
+the functions can be pointed at a local stub server.
+"""
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+
+from requests.exceptions import RequestException
+
+from recommender import instrument
+from recommender.http_client import CircuitOpenError, get_client
+from recommender.metadata_cache import get_cache
+
+TMDB_API_KEY = os.environ.get('TMDB_API_KEY', '5a0f912e8b0ae43f239e2346fda7634f')
+OMDB_API_KEY = os.environ.get('OMDB_API_KEY', 'caf997f4')
+TMDB_BASE_URL = os.environ.get('TMDB_BASE_URL', 'https://api.themoviedb.org/3')
+OMDB_BASE_URL = os.environ.get('OMDB_BASE_URL', 'http://www.omdbapi.com/')
+
+POSTER_BASE_URL = "https://image.tmdb.org/t/p/w500"
+NO_POSTER_URL = "https://via.placeholder.com/150?text=No+Poster"
+ERROR_POSTER_URL = "https://via.placeholder.com/150?text=Error"
+INVALID_ID_POSTER_URL = "https://via.placeholder.com/150?text=Invalid+ID"
+
+MAX_WORKERS = 8
+QUERY_STRING = re.compile(r'\?[^\s\'"]*') # Request URLs in error messages carry the API keys
+
+
+def _error_message(error):
+    """``str(error)`` with the query strings of any URLs in it removed."""
+    return QUERY_STRING.sub('', str(error))
+
+
+def parse_movie_details(data):
+    """Turns a TMDB ``/movie/{id}?append_to_response=credits,videos`` payload into a details dict.
+
+    Missing or malformed ``credits``/``videos`` parts fall back to empty values
+    instead of failing the whole movie.
+    """
+    details = {}
+    details['poster_path'] = POSTER_BASE_URL + data['poster_path'] if data.get('poster_path') else NO_POSTER_URL
+    details['overview'] = data.get('overview', 'No overview available.')
+    details['release_date'] = data.get('release_date', 'N/A')
+    details['runtime'] = data.get('runtime', 'N/A')
+    details['imdb_id'] = data.get('imdb_id', None) # To fetch OMDb data
+    details['genres'] = [genre['name'] for genre in data.get('genres') or [] if genre.get('name')]
+
+    # Credits (cast and crew)
+    credits_data = data.get('credits') if isinstance(data.get('credits'), dict) else {}
+    details['cast'] = [c['name'] for c in (credits_data.get('cast') or [])[:5] if c.get('name')] # Top 5 cast
+    details['director'] = next((crew.get('name', 'N/A') for crew in credits_data.get('crew') or [] if crew.get('job') == 'Director'), 'N/A')
+
+    # Videos (trailers/teasers)
+    videos_data = data.get('videos') if isinstance(data.get('videos'), dict) else {}
+    trailer_key = None
+    for video in videos_data.get('results') or []:
+        if video.get('site') == 'YouTube' and 'Trailer' in video.get('type', ''):
+            trailer_key = video.get('key')
+            break
+        elif video.get('site') == 'YouTube' and 'Teaser' in video.get('type', ''):
+            trailer_key = video.get('key')
+    details['youtube_trailer_key'] = trailer_key
+    return details
+
+
+def download_movie_details(movie_id, client, base_url=TMDB_BASE_URL):
+    """Fetches one movie straight from TMDB, bypassing the cache.
+
+    A call skipped by the open circuit breaker is marked ``circuit_open`` so it is not cached.
+    """
+    try:
+        data = client.get_json(f'{base_url}/movie/{movie_id}', {
+            'api_key': TMDB_API_KEY,
+            'language': 'en-us',
+            'append_to_response': 'credits,videos',
+        }, 'tmdb')
+    except CircuitOpenError as e:
+        return {'poster_path': ERROR_POSTER_URL, 'error': f"TMDB unavailable for ID {movie_id}: {_error_message(e)}", 'circuit_open': True}
+    except RequestException as e:
+        return {'poster_path': ERROR_POSTER_URL, 'error': f"Error fetching movie details from TMDB for ID {movie_id}: {_error_message(e)}"}
+    if not isinstance(data, dict):
+        return {'poster_path': ERROR_POSTER_URL, 'error': f"Unexpected TMDB response for ID {movie_id}"}
+    return parse_movie_details(data)
+
+
+def store_movie_details(cache, results, ttl=None):
+    """Caches ``{movie_id: details}`` and returns the details to show for each id.
+
+    Failed lookups get the short negative TTL, unless the cache still holds
+    expired details for the id: those are kept and returned instead of a
+    placeholder. Calls skipped by the circuit breaker are not cached.
+    """
+    failed = [movie_id for movie_id, d in results.items() if 'error' in d]
+    stale = cache.get_stale_many(f'tmdb:{movie_id}' for movie_id in failed) if failed else {}
+    cache.set_many({f'tmdb:{movie_id}': d for movie_id, d in results.items() if 'error' not in d}, ttl=ttl)
+    cache.set_many({f'tmdb:{movie_id}': d for movie_id, d in results.items()
+                    if 'error' in d and not d.get('circuit_open') and f'tmdb:{movie_id}' not in stale}, negative=True)
+    return {movie_id: stale.get(f'tmdb:{movie_id}', d) for movie_id, d in results.items()}
+
+
+def fetch_movie_details(movie_id, client=None, base_url=TMDB_BASE_URL, cache=None):
+    """Fetches comprehensive movie details from TMDB in a single request.
+
+    Credits and videos come back in the same response via
+    ``append_to_response``. Results are read through the disk metadata cache.
+    Never raises for network or id problems: the returned dict then carries
+    a placeholder ``poster_path`` and an ``error`` message instead.
+    """
+    try:
+        movie_id = int(movie_id)
+    except (TypeError, ValueError):
+        return {'poster_path': INVALID_ID_POSTER_URL, 'error': f"Invalid movie ID: {movie_id}"}
+
+    cache = cache or get_cache()
+    details = cache.get(f'tmdb:{movie_id}')
+    if details is None:
+        details = download_movie_details(movie_id, client or get_client(), base_url)
+        details = store_movie_details(cache, {movie_id: details})[movie_id]
+    return details
+
+
+def fetch_movie_details_many(movie_ids, max_workers=MAX_WORKERS, client=None, base_url=TMDB_BASE_URL, cache=None):
+    """Fetches details for many movies concurrently; returns ``{movie_id: details}``.
+
+    Cached ids are answered with one cache query. The rest are fetched with at
+    most ``max_workers`` requests in flight, all going through one client.
+    Duplicate ids are fetched once.
+    """
+    unique_ids = list(dict.fromkeys(int(movie_id) for movie_id in movie_ids))
+    if not unique_ids:
+        return {}
+    cache = cache or get_cache()
+    client = client or get_client()
+
+    cached = cache.get_many(f'tmdb:{movie_id}' for movie_id in unique_ids)
+    results = {movie_id: cached[f'tmdb:{movie_id}'] for movie_id in unique_ids if f'tmdb:{movie_id}' in cached}
+    missing = [movie_id for movie_id in unique_ids if movie_id not in results]
+
+    if len(missing) == 1 or max_workers <= 1:
+        fetched = {movie_id: download_movie_details(movie_id, client, base_url) for movie_id in missing}
+    elif missing:
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(missing))) as executor:
+            # bind() lets the worker threads record into the caller's instrumentation run.
+            download = instrument.bind(lambda movie_id: download_movie_details(movie_id, client, base_url))
+            fetched = dict(zip(missing, executor.map(download, missing)))
+    else:
+        fetched = {}
+    results.update(store_movie_details(cache, fetched))
+    return {movie_id: results[movie_id] for movie_id in unique_ids}
+
+
+def _download_omdb_ratings(imdb_id, client, base_url):
+    """``(imdb, rotten tomatoes)`` ratings, ``'N/A'`` where unknown; lets ``CircuitOpenError`` through."""
+    try:
+        data = client.get_json(base_url, {'i': imdb_id, 'apikey': OMDB_API_KEY}, 'omdb')
+        if data.get('Response') == 'True':
+            imdb_rating = data.get('imdbRating', 'N/A')
+            rotten_tomatoes_rating = 'N/A'
+            for rating_source in data.get('Ratings', []):
+                if rating_source.get('Source') == 'Rotten Tomatoes':
+                    rotten_tomatoes_rating = rating_source.get('Value', 'N/A')
+                    break
+            return imdb_rating, rotten_tomatoes_rating
+        return 'N/A', 'N/A'
+    except CircuitOpenError:
+        raise
+    except (RequestException, ValueError, AttributeError):
+        return 'N/A', 'N/A'
+
+
+def fetch_omdb_ratings(imdb_id, client=None, base_url=OMDB_BASE_URL, cache=None):
+    """Fetches IMDb and Rotten Tomatoes ratings from OMDb API, read through the metadata cache.
+
+    While OMDb is failing, expired cached ratings are served, or ``'N/A'`` without caching it.
+    """
+    if not imdb_id or OMDB_API_KEY == 'YOUR_OMDB_API_KEY':
+        return None, None # Return None if no IMDb ID or API key not set
+    cache = cache or get_cache()
+    key = f'omdb:{imdb_id}'
+    cached = cache.get(key)
+    if cached is not None:
+        return tuple(cached)
+    try:
+        ratings = _download_omdb_ratings(imdb_id, client or get_client(), base_url)
+    except CircuitOpenError:
+        stale = cache.get_stale_many([key]).get(key)
+        return tuple(stale) if stale is not None else ('N/A', 'N/A')
+    cache.set(key, list(ratings), negative=ratings == ('N/A', 'N/A'))
+    return ratings
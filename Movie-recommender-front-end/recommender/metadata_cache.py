@@ -0,0 +1,240 @@
+"""Disk-backed metadata cache shared across processes and restarts.
+
+Entries live in a small SQLite file as JSON with a per-entry expiry time.
+Failed lookups are cached too ("negative" entries) but with a much shorter
+TTL, so a TMDB hiccup does not pin a placeholder poster forever. Once the
+cache grows past ``max_entries`` the least recently used entries are
+evicted.
+"""
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from recommender import instrument
+
+DEFAULT_CACHE_PATH = os.environ.get('METADATA_CACHE_PATH', 'metadata_cache.db')
+DEFAULT_TTL = 7 * 24 * 3600 # Seconds a successful lookup stays fresh
+NEGATIVE_TTL = 10 * 60 # Seconds a failed lookup is remembered
+MAX_ENTRIES = int(os.environ.get('METADATA_CACHE_MAX_ENTRIES', 50_000))
+POOL_SIZE = 8 # Connections per cache, one per parallel fetch worker
+BUSY_TIMEOUT = 10.0 # Seconds to wait for a lock or a free connection
+PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+)
+
+# Recording every read would turn each hit into a write; access times only
+# need to be good enough for LRU eviction.
+ACCESS_RESOLUTION = 60
+EVICT_EVERY = 500 # Writes between eviction checks
+
+
+class MetadataCache:
+    """JSON key/value cache with TTL, negative caching and LRU eviction.
+
+    Connections come from a small pool, like ``db.ConnectionPool``: Streamlit
+    runs every rerun on a new thread, so per-thread connections would be
+    reopened (and their pragmas re-run) on every page view.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_PATH, ttl=DEFAULT_TTL, negative_ttl=NEGATIVE_TTL, max_entries=MAX_ENTRIES,
+                 pool_size=POOL_SIZE):
+        self.path = path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self.pool_size = pool_size
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+        self._writes = 0
+        self.hits = 0
+        self.misses = 0
+        self._ensure_schema()
+
+    def _connect(self):
+        # Autocommit: every statement is its own short transaction.
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT, isolation_level=None, check_same_thread=False)
+        for pragma in PRAGMAS:
+            conn.execute(pragma)
+        return conn
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            create = self._created < self.pool_size
+            if create:
+                self._created += 1
+        if create:
+            try:
+                return self._connect()
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        try:
+            return self._idle.get(timeout=BUSY_TIMEOUT)
+        except queue.Empty:
+            raise sqlite3.OperationalError("connection pool exhausted") from None
+
+    @contextmanager
+    def connection(self):
+        """Borrows a pooled connection."""
+        conn = self._acquire()
+        try:
+            yield conn
+        finally:
+            self._idle.put(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                break
+
+    def _ensure_schema(self):
+        with self.connection() as conn:
+            conn.execute('''CREATE TABLE IF NOT EXISTS entries
+                            (key TEXT PRIMARY KEY,
+                             value TEXT NOT NULL,
+                             negative INTEGER NOT NULL DEFAULT 0,
+                             expires_at REAL NOT NULL,
+                             last_access REAL NOT NULL)''')
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_last_access ON entries (last_access)")
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        instrument.cache_lookups('metadata', hits, misses)
+
+    def get(self, key):
+        """Cached value for key, or None if missing or expired."""
+        return self.get_many([key]).get(key)
+
+    def get_many(self, keys):
+        """Fresh cached values for the given keys, as ``{key: value}``; misses are left out."""
+        keys = list(dict.fromkeys(keys))
+        if not keys:
+            return {}
+        now = time.time()
+        found = {}
+        stale_access = []
+        with self.connection() as conn:
+            # Stay well below SQLite's bound-parameter limit.
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(
+                    f"SELECT key, value, last_access FROM entries WHERE key IN ({placeholders}) AND expires_at > ?",
+                    (*chunk, now),
+                ).fetchall()
+                for key, value, last_access in rows:
+                    found[key] = json.loads(value)
+                    if now - last_access > ACCESS_RESOLUTION:
+                        stale_access.append((now, key))
+            if stale_access:
+                conn.executemany("UPDATE entries SET last_access=? WHERE key=?", stale_access)
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def get_stale_many(self, keys):
+        """Successful lookups for the given keys even if expired, as ``{key: value}``.
+
+        A fallback while the upstream is failing; not counted as cache hits.
+        Expired entries only last until the next eviction pass.
+        """
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        with self.connection() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                rows = conn.execute(f"SELECT key, value FROM entries WHERE key IN ({placeholders}) AND negative = 0", chunk)
+                found.update((key, json.loads(value)) for key, value in rows)
+        return found
+
+    def set(self, key, value, negative=False, ttl=None):
+        self.set_many({key: value}, negative=negative, ttl=ttl)
+
+    def set_many(self, items, negative=False, ttl=None):
+        """Stores ``{key: value}``; negative entries default to the short TTL."""
+        if not items:
+            return
+        now = time.time()
+        ttl = ttl if ttl is not None else (self.negative_ttl if negative else self.ttl)
+        rows = [(key, json.dumps(value), int(negative), now + ttl, now) for key, value in items.items()]
+        with self.connection() as conn:
+            conn.executemany("INSERT OR REPLACE INTO entries (key, value, negative, expires_at, last_access) VALUES (?, ?, ?, ?, ?)", rows)
+
+        with self._lock:
+            self._writes += len(rows)
+            due = self._writes >= EVICT_EVERY
+            if due:
+                self._writes = 0
+        if due:
+            self.evict()
+
+    def expiry_times(self, keys):
+        """Expiry timestamps of stored successful lookups, expired or not, as ``{key: expires_at}``."""
+        keys = list(keys)
+        result = {}
+        with self.connection() as conn:
+            for start in range(0, len(keys), 500):
+                chunk = keys[start:start + 500]
+                placeholders = ','.join('?' * len(chunk))
+                result.update(conn.execute(f"SELECT key, expires_at FROM entries WHERE key IN ({placeholders}) AND negative = 0", chunk).fetchall())
+        return result
+
+    def evict(self):
+        """Drops expired entries, then the least recently used ones above ``max_entries``."""
+        with self.connection() as conn:
+            conn.execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+            count = conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            if count > self.max_entries:
+                conn.execute(
+                    "DELETE FROM entries WHERE key IN (SELECT key FROM entries ORDER BY last_access LIMIT ?)",
+                    (count - self.max_entries,),
+                )
+
+    def clear(self):
+        with self.connection() as conn:
+            conn.execute("DELETE FROM entries")
+
+    def stats(self):
+        """Entry counts and in-process hit/miss counters."""
+        with self.connection() as conn:
+            entries, negative = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(negative), 0) FROM entries"
+            ).fetchone()
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'entries': entries,
+            'negative_entries': negative,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide cache at ``METADATA_CACHE_PATH``."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = MetadataCache()
+        return _default_cache
@@ -0,0 +1,104 @@
+"""Top-K neighbor index built offline from the movie similarity scores.
+
+Instead of shipping the full N x N similarity matrix, only the K best
+neighbors of every movie are kept. The index is a fixed-width structured
+array of shape (N, K) with an ``id`` (row index of the neighbor) and a
+``score`` field, sorted by descending score, so a lookup is one row read.
+It is stored as part of the model directory, see ``recommender.artifacts``.
+
+``neighbors_from_vectors`` builds the index straight from the sparse count
+vectors: rows are L2-normalized once, so cosine similarity is a plain
+sparse dot product, and scores are only ever materialized one row block
+at a time. Blocks can be spread over a process pool.
+"""
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+from scipy import sparse
+from sklearn.preprocessing import normalize
+
+from recommender.ranking import top_k
+
+NEIGHBOR_DTYPE = np.dtype([('id', '<i4'), ('score', '<f4')])
+DEFAULT_K = 20
+BLOCK_SIZE = 1024
+BLOCK_MEMORY = 256 * 2**20 # Bytes of scores held per block (and per worker)
+
+
+def build_neighbor_index(similarity, k=DEFAULT_K, block_size=BLOCK_SIZE):
+    """Keeps the k most similar other movies for every row of a similarity matrix."""
+    n = similarity.shape[0]
+    k = max(0, min(k, n - 1))
+    index = np.empty((n, k), dtype=NEIGHBOR_DTYPE)
+    if k == 0:
+        return index
+
+    for start in range(0, n, block_size):
+        stop = min(start + block_size, n)
+        rows = np.array(similarity[start:stop], dtype=np.float32)
+        # A movie is never its own recommendation.
+        rows[np.arange(stop - start), np.arange(start, stop)] = -np.inf
+
+        index['id'][start:stop], index['score'][start:stop] = top_k(rows, k)
+    return index
+
+
+def normalize_rows(vectors):
+    """CSR float32 copy of the vectors with unit-length rows; empty rows stay zero."""
+    return normalize(sparse.csr_matrix(vectors, dtype=np.float32), norm='l2')
+
+
+def block_size_for(n, memory=BLOCK_MEMORY):
+    """Rows per block so one block of scores against n movies fits in ``memory`` bytes."""
+    # Sparse product (value + column index) plus its dense float32 copy.
+    return int(max(1, min(BLOCK_SIZE * 16, memory // (12 * max(n, 1)))))
+
+
+def _neighbor_block(vectors, rows, k):
+    scores = (vectors[rows] @ vectors.T).toarray().astype(np.float32, copy=False)
+    # A movie is never its own recommendation.
+    scores[np.arange(len(rows)), rows] = -np.inf
+    return top_k(scores, k)
+
+
+_worker_vectors = None
+
+
+def _init_worker(vectors):
+    global _worker_vectors
+    _worker_vectors = vectors
+
+
+def _worker_block(rows, k):
+    return _neighbor_block(_worker_vectors, rows, k)
+
+
+def neighbors_from_vectors(vectors, k=DEFAULT_K, rows=None, normalized=False, block_size=None, workers=1):
+    """Top-k cosine neighbors of ``rows`` (default: all) against every row of a sparse feature matrix.
+
+    Pass ``normalized=True`` if the rows already went through ``normalize_rows``.
+    With ``workers > 1`` the blocks are scored in separate processes.
+    """
+    vectors = vectors if normalized else normalize_rows(vectors)
+    n = vectors.shape[0]
+    rows = np.arange(n) if rows is None else np.asarray(rows, dtype=np.intp)
+    k = max(0, min(k, n - 1))
+    index = np.empty((len(rows), k), dtype=NEIGHBOR_DTYPE)
+    if k == 0 or not len(rows):
+        return index
+
+    block_size = block_size or block_size_for(n)
+    blocks = [rows[start:start + block_size] for start in range(0, len(rows), block_size)]
+
+    def fill(results):
+        start = 0
+        for ids, scores in results:
+            index['id'][start:start + len(ids)], index['score'][start:start + len(ids)] = ids, scores
+            start += len(ids)
+
+    if workers > 1 and len(blocks) > 1:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(vectors,)) as executor:
+            fill(executor.map(_worker_block, blocks, [k] * len(blocks)))
+    else:
+        fill(_neighbor_block(vectors, block, k) for block in blocks)
+    return index
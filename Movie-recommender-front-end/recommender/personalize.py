@@ -0,0 +1,116 @@
+"""Personalized "For You" recommendations from a user's ratings and watchlist.
+
+Every movie the user rated or watchlisted contributes its neighbor row,
+weighted by how much they liked it (low ratings pull their neighbors
+down), and all rows are merged in one ``ranking.similar_to_many`` pass.
+Movies the user already rated or watchlisted are never returned.
+
+Results are cached per user and tagged with the user's activity version
+from ``recommender.db``, which changes with every new rating or watchlist
+edit, so a cached list is reused only while it is still current.
+"""
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from recommender import db, instrument
+from recommender.ranking import similar_to_many
+
+RATING_WEIGHTS = {1: -1.0, 2: -0.5, 3: 0.25, 4: 0.75, 5: 1.0}
+WATCHLIST_WEIGHT = 0.5 # Interest without a rating yet
+DEFAULT_K = 10
+CACHE_SIZE = 1024 # Users kept in the in-process cache
+
+
+def profile_weights(ratings, watchlist):
+    """``{movie_id: weight}``; a rating overrides the watchlist weight of the same movie.
+
+    Legacy ratings outside 1-5 are clamped into that range; missing ones are skipped.
+    """
+    weights = {int(movie_id): WATCHLIST_WEIGHT for movie_id in watchlist}
+    weights.update({int(movie_id): RATING_WEIGHTS[min(max(int(rating), 1), 5)]
+                    for movie_id, rating in ratings.items() if rating is not None})
+    return weights
+
+
+@instrument.timed()
+def for_you(neighbors, movie_ids, lookup, ratings, watchlist, k=DEFAULT_K):
+    """Top-k ``(movie_ids, scores)`` for a user profile; only movies with a positive total score are returned."""
+    rows, weights = [], []
+    for movie_id, weight in profile_weights(ratings, watchlist).items():
+        row = lookup.row_for_id(movie_id)
+        if row is not None:
+            rows.append(row)
+            weights.append(weight)
+    if not rows:
+        return [], []
+
+    top_rows, scores = similar_to_many(neighbors, rows, k=k, weights=weights)
+    keep = scores > 0
+    return [int(movie_id) for movie_id in np.asarray(movie_ids)[top_rows[keep]]], scores[keep].tolist()
+
+
+class ForYouCache:
+    """LRU of per-user results, each tagged with the activity version and model it was computed for."""
+
+    def __init__(self, max_users=CACHE_SIZE):
+        self.max_users = max_users
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user_id, version, model_version, k):
+        with self._lock:
+            entry = self._entries.get(user_id)
+            hit = entry is not None and entry[0] == (version, model_version, k)
+            if hit:
+                self._entries.move_to_end(user_id)
+                self.hits += 1
+            else:
+                self.misses += 1
+        instrument.cache_lookups('for_you', hit, not hit)
+        return entry[1] if hit else None
+
+    def set(self, user_id, version, model_version, k, result):
+        with self._lock:
+            self._entries[user_id] = ((version, model_version, k), result)
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_users:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, user_id=None):
+        """Drops one user's entry, or everything."""
+        with self._lock:
+            if user_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(user_id, None)
+
+
+def recommend_for_user(user_id, neighbors, movie_ids, lookup, k=DEFAULT_K, model_version=None, cache=None, pool=None):
+    """Cached ``for_you`` for a stored user; costs one primary-key read while the cache is current."""
+    cache = cache or get_cache()
+    version = db.get_user_activity_version(user_id, pool=pool)
+    result = cache.get(user_id, version, model_version, k)
+    if result is not None:
+        return result
+
+    version, ratings, watchlist = db.get_user_signals(user_id, pool=pool)
+    result = for_you(neighbors, movie_ids, lookup, ratings, watchlist, k=k)
+    cache.set(user_id, version, model_version, k, result)
+    return result
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide per-user cache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ForYouCache()
+        return _default_cache
@@ -0,0 +1,340 @@
+"""Local poster store: every TMDB poster is downloaded once and kept on disk in display sizes.
+
+Grid tiles read a small local file instead of making each browser pull
+the full 500px poster from TMDB:
+
+* ``path_for`` maps a ``poster_path`` value from the metadata cache to a
+  local file, downloading it on first use; all ``VARIANTS`` are resized
+  from that one download;
+* the "No Poster"/"Error" placeholders are drawn locally instead of being
+  loaded from an external site;
+* the store is bounded by ``max_bytes``, evicting the least recently used
+  files first;
+* a whole catalog can be fetched up front:
+
+    python -m recommender.posters --model model --workers 8 --rate 30
+"""
+import argparse
+import hashlib
+import io
+import os
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image, ImageDraw, ImageFont
+from requests.exceptions import RequestException
+
+from recommender import instrument
+from recommender.artifacts import load_artifact
+from recommender.http_client import CircuitOpenError, HttpClient, get_client
+from recommender.metadata import ERROR_POSTER_URL, INVALID_ID_POSTER_URL, MAX_WORKERS, NO_POSTER_URL, POSTER_BASE_URL
+from recommender.metadata_cache import DEFAULT_CACHE_PATH, MetadataCache
+
+DEFAULT_POSTER_DIR = os.environ.get('POSTER_CACHE_DIR', 'poster_cache')
+MAX_BYTES = int(float(os.environ.get('POSTER_CACHE_MAX_MB', 500)) * 2**20)
+SOURCE_URL = os.environ.get('TMDB_IMAGE_BASE_URL', POSTER_BASE_URL) # Prefix poster files are downloaded from
+VARIANTS = {'grid': 240, 'detail': 500} # Width in pixels; the height keeps the poster's aspect ratio
+JPEG_QUALITY = 85
+PLACEHOLDERS = {NO_POSTER_URL: "No Poster", ERROR_POSTER_URL: "Unavailable", INVALID_ID_POSTER_URL: "Unavailable"}
+FAILURE_TTL = 10 * 60 # Seconds before a failed download is tried again
+ACCESS_RESOLUTION = 60 # Seconds; access times only need to be good enough for LRU eviction
+EVICT_TO = 0.9 # Eviction frees space down to this share of max_bytes
+
+
+def tmdb_path(poster_url):
+    """The TMDB file path (``/abc.jpg``) in a ``poster_path`` value, or None for placeholders."""
+    if isinstance(poster_url, str) and poster_url.startswith(POSTER_BASE_URL):
+        return poster_url[len(POSTER_BASE_URL):] or None
+    return None
+
+
+def _file_name(source):
+    stem = re.sub(r'[^A-Za-z0-9_-]', '', os.path.splitext(source)[0])
+    return (stem or hashlib.sha1(source.encode('utf-8')).hexdigest()) + '.jpg'
+
+
+def resize(data, width):
+    """JPEG bytes of an image scaled down to width (never up); a JPEG that needs no scaling is returned as-is.
+
+    Raises OSError if data is not an image.
+    """
+    image = Image.open(io.BytesIO(data))
+    if image.format == 'JPEG' and image.width <= width:
+        return data
+    # JPEGs can be decoded straight at 1/2, 1/4 or 1/8 scale, far cheaper than decoding and then shrinking.
+    image.draft('RGB', (width, image.height * width // image.width))
+    image = image.convert('RGB')
+    if image.width > width:
+        image = image.resize((width, round(image.height * width / image.width)), Image.LANCZOS)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def draw_placeholder(text, width):
+    """PNG bytes of a grey 2:3 poster with the text in the middle."""
+    height = width * 3 // 2
+    image = Image.new('RGB', (width, height), (221, 221, 221))
+    draw = ImageDraw.Draw(image)
+    try:
+        font = ImageFont.load_default(size=max(12, width // 10))
+    except TypeError: # Pillow < 10.1 has a single fixed-size default font
+        font = ImageFont.load_default()
+    left, top, right, bottom = draw.textbbox((0, 0), text, font=font)
+    draw.text(((width - right + left) / 2, (height - bottom + top) / 2), text, fill=(102, 102, 102), font=font)
+    buffer = io.BytesIO()
+    image.save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def _write_atomic(path, data):
+    tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+class PosterStore:
+    """Poster variants on disk, shared by every session and process using the same directory."""
+
+    def __init__(self, root=DEFAULT_POSTER_DIR, max_bytes=MAX_BYTES, source_url=SOURCE_URL, client=None):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.source_url = source_url
+        self.client = client
+        self._lock = threading.Lock()
+        self._downloads = {} # source -> lock held while it downloads
+        self._failed = {} # source -> time of the last failed download
+        self._files = {} # path -> [size, last access]
+        self._bytes = 0
+        self.hits = 0
+        self.misses = 0
+        for directory in (*VARIANTS, 'placeholders'):
+            os.makedirs(os.path.join(root, directory), exist_ok=True)
+        self._scan()
+
+    def _scan(self):
+        for variant in VARIANTS:
+            for entry in os.scandir(os.path.join(self.root, variant)):
+                if entry.is_file() and entry.name.endswith('.jpg'):
+                    stat = entry.stat()
+                    self._files[entry.path] = [stat.st_size, stat.st_mtime]
+        self._bytes = sum(size for size, _ in self._files.values())
+
+    def _variant_path(self, source, variant):
+        return os.path.join(self.root, variant, _file_name(source))
+
+    def _register(self, path, size):
+        with self._lock:
+            previous = self._files.get(path)
+            self._bytes += size - (previous[0] if previous else 0)
+            self._files[path] = [size, time.time()]
+
+    def _forget(self, path):
+        with self._lock:
+            entry = self._files.pop(path, None)
+            if entry is not None:
+                self._bytes -= entry[0]
+
+    def _touch(self, path):
+        """True if the file is on disk; refreshes its access time for eviction.
+
+        The file's mtime is the access time, so processes sharing the
+        directory see each other's use (and downloads).
+        """
+        try:
+            stat = os.stat(path)
+        except OSError: # Not downloaded yet, or evicted by another process
+            self._forget(path)
+            return False
+        now = time.time()
+        last_access = stat.st_mtime
+        if now - last_access > ACCESS_RESOLUTION:
+            try:
+                os.utime(path, (now, now))
+                last_access = now
+            except OSError:
+                pass
+        with self._lock:
+            entry = self._files.get(path)
+            if entry is None:
+                self._files[path] = [stat.st_size, last_access]
+                self._bytes += stat.st_size
+            else:
+                entry[1] = last_access
+        return True
+
+    def _download(self, source, client=None):
+        """Downloads one poster and writes every variant. Returns False if it could not be fetched."""
+        with self._lock:
+            failed_at = self._failed.get(source)
+            if failed_at is not None and time.time() - failed_at < FAILURE_TTL:
+                return False
+            download_lock = self._downloads.setdefault(source, threading.Lock())
+        paths = {variant: self._variant_path(source, variant) for variant in VARIANTS}
+        # Concurrent requests for the same poster wait for one download.
+        with download_lock:
+            try:
+                # Another thread or process may have stored it meanwhile.
+                if all(self._touch(path) for path in paths.values()):
+                    return True
+                try:
+                    response = (client or self.client or get_client()).get(self.source_url + source, api='tmdb_image')
+                    variants = {path: resize(response.content, VARIANTS[variant]) for variant, path in paths.items()}
+                except CircuitOpenError:
+                    return False # Nothing was tried, so nothing to remember
+                except (RequestException, OSError): # Pillow raises OSError subclasses for broken images
+                    with self._lock:
+                        self._failed[source] = time.time()
+                    return False
+
+                for path, data in variants.items():
+                    _write_atomic(path, data)
+                    self._register(path, len(data))
+                with self._lock:
+                    self._failed.pop(source, None)
+            finally:
+                with self._lock:
+                    self._downloads.pop(source, None)
+        self.evict(keep=paths.values())
+        return True
+
+    def _count(self, hits, misses):
+        with self._lock:
+            self.hits += hits
+            self.misses += misses
+        instrument.cache_lookups('posters', hits, misses)
+
+    def placeholder(self, text, variant='grid'):
+        """Local placeholder image, drawn once per text and variant."""
+        slug = re.sub(r'[^a-z0-9]+', '-', text.lower()).strip('-')
+        path = os.path.join(self.root, 'placeholders', f"{slug}-{variant}.png")
+        if not os.path.exists(path):
+            _write_atomic(path, draw_placeholder(text, VARIANTS[variant]))
+        return path
+
+    def path_for(self, poster_url, variant='grid'):
+        """Local file for a ``poster_path`` value: the poster, or a local placeholder if there is none."""
+        return self.paths_for([poster_url], variant)[poster_url]
+
+    def paths_for(self, poster_urls, variant='grid', workers=MAX_WORKERS):
+        """``{poster_url: local file}``; posters not on disk yet are downloaded concurrently."""
+        if variant not in VARIANTS:
+            raise ValueError(f"Unknown poster variant '{variant}', expected one of {list(VARIANTS)}")
+        poster_urls = list(dict.fromkeys(poster_urls))
+        sources = {url: tmdb_path(url) for url in poster_urls}
+        missing = [source for source in dict.fromkeys(sources.values())
+                   if source is not None and not self._touch(self._variant_path(source, variant))]
+        self._count(sum(source is not None for source in sources.values()) - len(missing), len(missing))
+        if len(missing) > 1 and workers > 1:
+            with ThreadPoolExecutor(max_workers=min(workers, len(missing))) as executor:
+                downloaded = dict(zip(missing, executor.map(instrument.bind(self._download), missing)))
+        else:
+            downloaded = {source: self._download(source) for source in missing}
+
+        paths = {}
+        for url, source in sources.items():
+            if source is None:
+                paths[url] = self.placeholder(PLACEHOLDERS.get(url, "No Poster"), variant)
+            elif downloaded.get(source, True):
+                paths[url] = self._variant_path(source, variant)
+            else:
+                paths[url] = self.placeholder("Unavailable", variant)
+        return paths
+
+    def evict(self, keep=()):
+        """Deletes the least recently used files until the store is below ``EVICT_TO * max_bytes``."""
+        keep = set(keep)
+        removed = []
+        with self._lock:
+            if self._bytes <= self.max_bytes:
+                return 0
+            for path, (size, _) in sorted(self._files.items(), key=lambda item: item[1][1]):
+                if self._bytes <= self.max_bytes * EVICT_TO:
+                    break
+                if path in keep:
+                    continue
+                del self._files[path]
+                self._bytes -= size
+                removed.append(path)
+        for path in removed:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+        return len(removed)
+
+    def prefetch(self, poster_urls, workers=MAX_WORKERS, rate=0, progress=print, chunk_size=200):
+        """Downloads every poster not on disk yet. Returns ``(downloaded, failed, already stored)`` counts."""
+        sources = list(dict.fromkeys(source for source in map(tmdb_path, poster_urls) if source is not None))
+        todo = [source for source in sources
+                if not all(self._touch(self._variant_path(source, variant)) for variant in VARIANTS)]
+        progress(f"{len(sources)} posters, {len(sources) - len(todo)} already stored, {len(todo)} to download")
+        # Its own client, so the rate applies instead of the shared default.
+        client = HttpClient(rates={'tmdb_image': rate})
+
+        def fetch(source):
+            return self._download(source, client)
+
+        downloaded = failed = 0
+        with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+            for start in range(0, len(todo), chunk_size):
+                results = list(executor.map(fetch, todo[start:start + chunk_size]))
+                downloaded += sum(results)
+                failed += len(results) - sum(results)
+                progress(f"{start + len(results)}/{len(todo)} downloaded, {failed} failed")
+        return downloaded, failed, len(sources) - len(todo)
+
+    def stats(self):
+        with self._lock:
+            files, size, hits, misses = len(self._files), self._bytes, self.hits, self.misses
+        lookups = hits + misses
+        return {
+            'files': files,
+            'bytes': size,
+            'max_bytes': self.max_bytes,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+        }
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_store():
+    """Process-wide store at ``POSTER_CACHE_DIR``."""
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = PosterStore()
+        return _default_store
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Download every poster of the catalog into the local poster store.")
+    parser.add_argument('--model', default='model', help="Model directory")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="Metadata cache holding the poster paths")
+    parser.add_argument('--dir', default=DEFAULT_POSTER_DIR, help="Poster store directory")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Concurrent downloads")
+    parser.add_argument('--rate', type=float, default=30, help="Maximum downloads per second (0 = unlimited)")
+    parser.add_argument('--limit', type=int, default=None, help="Only consider the first N movies")
+    args = parser.parse_args()
+
+    movie_ids = load_artifact(args.model).column('id').tolist()[:args.limit]
+    cached = MetadataCache(args.cache).get_many(f'tmdb:{movie_id}' for movie_id in movie_ids)
+    if len(cached) < len(movie_ids):
+        print(f"{len(movie_ids) - len(cached)} movies have no cached details; run `python -m recommender.warmup` first to include them.")
+    store = PosterStore(args.dir)
+    started = time.monotonic()
+    downloaded, failed, stored = store.prefetch([details.get('poster_path') for details in cached.values()],
+                                                workers=args.workers, rate=args.rate)
+    print(f"Done in {time.monotonic() - started:.1f}s: {downloaded} downloaded, {failed} failed, {stored} already stored. "
+          f"Store: {store.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,62 @@
+"""Ranking core: top-k selection over neighbor rows, free of any Streamlit code."""
+import numpy as np
+
+
+def top_k(scores, k):
+    """Positions and values of the k largest scores along the last axis, best first.
+
+    Uses ``np.argpartition`` so only the selected k entries get sorted.
+    Works on a single row or on a 2-D batch of rows.
+    """
+    scores = np.asarray(scores)
+    k = max(0, min(k, scores.shape[-1]))
+    if k == 0:
+        empty = scores[..., :0]
+        return empty.astype(np.intp), empty
+
+    positions = np.argpartition(-scores, k - 1, axis=-1)[..., :k]
+    selected = np.take_along_axis(scores, positions, axis=-1)
+    order = np.argsort(-selected, axis=-1, kind='stable')
+    return np.take_along_axis(positions, order, axis=-1), np.take_along_axis(selected, order, axis=-1)
+
+
+def similar_movies(neighbors, queries, k=6):
+    """Top-k neighbor row ids and scores for each query row index.
+
+    ``queries`` may be a single index, which returns 1-D arrays of length k,
+    or an array of indices, which returns arrays of shape ``queries.shape + (k,)``.
+    """
+    queries = np.asarray(queries, dtype=np.intp)
+    rows = neighbors[queries.reshape(-1)]
+    positions, scores = top_k(rows['score'], k)
+    ids = np.take_along_axis(rows['id'], positions, axis=-1)
+
+    shape = queries.shape + (ids.shape[-1],)
+    return ids.reshape(shape), scores.reshape(shape)
+
+
+def similar_to_many(neighbors, queries, k=6, weights=None):
+    """Top-k movies for a whole set of liked movies ("because you liked X, Y, Z").
+
+    The neighbor rows of every query are merged with one weighted
+    ``np.bincount``, so a movie close to several queries ranks higher.
+    Query movies themselves are never returned.
+    """
+    queries = np.asarray(queries, dtype=np.intp).reshape(-1)
+    if queries.size == 0:
+        return np.empty(0, dtype=np.intp), np.empty(0, dtype=np.float32)
+    weights = np.ones(queries.size, dtype=np.float32) if weights is None else np.asarray(weights, dtype=np.float32)
+
+    rows = neighbors[queries]
+    ids = rows['id'].reshape(-1)
+    contributions = (rows['score'] * weights[:, None]).reshape(-1)
+
+    num_movies = neighbors.shape[0]
+    totals = np.bincount(ids, weights=contributions, minlength=num_movies)
+    seen = np.bincount(ids, minlength=num_movies) > 0
+    totals[~seen] = -np.inf
+    totals[queries] = -np.inf
+
+    top_ids, top_scores = top_k(totals, k)
+    keep = np.isfinite(top_scores)
+    return top_ids[keep], top_scores[keep].astype(np.float32)
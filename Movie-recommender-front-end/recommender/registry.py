@@ -0,0 +1,179 @@
+"""Process-wide registry of loaded resources such as the model.
+
+A resource is loaded once per process under a name and shared read-only
+by every caller (Streamlit sessions, API requests). Each entry carries a
+``stamp`` supplied by the caller, e.g. the model header's modification
+time: while the stamp is unchanged ``get`` is a dictionary lookup, and a
+rebuilt model is picked up by loading it again.
+
+The registry records how long each load took and can report the memory
+held by each resource, split into heap memory and memory-mapped files
+(which the OS shares between worker processes).
+
+    python -m recommender.registry --model model
+"""
+import argparse
+import mmap
+import sys
+import threading
+import time
+import types
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from recommender import instrument
+
+_SKIPPED_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType)
+
+
+def memory_footprint(obj):
+    """``(heap_bytes, mapped_bytes)`` reachable from obj, counting shared objects once."""
+    heap = mapped = 0
+    seen = set()
+    stack = [obj]
+    while stack:
+        item = stack.pop()
+        if id(item) in seen or isinstance(item, _SKIPPED_TYPES):
+            continue
+        seen.add(id(item))
+
+        if isinstance(item, np.ndarray):
+            # Views are charged to the array that owns the memory.
+            if isinstance(item.base, np.ndarray):
+                stack.append(item.base)
+            elif isinstance(item, np.memmap) or isinstance(item.base, mmap.mmap):
+                mapped += item.nbytes
+            else:
+                heap += item.nbytes
+                if item.dtype == object:
+                    stack.extend(item.ravel())
+            continue
+        if isinstance(item, (pd.DataFrame, pd.Series, pd.Index)):
+            heap += int(item.memory_usage(deep=True).sum() if isinstance(item, pd.DataFrame) else item.memory_usage(deep=True))
+            continue
+        if sparse.issparse(item):
+            stack.extend(getattr(item, name) for name in ('data', 'indices', 'indptr') if hasattr(item, name))
+            continue
+
+        heap += sys.getsizeof(item)
+        if isinstance(item, dict):
+            stack.extend(item.keys())
+            stack.extend(item.values())
+        elif isinstance(item, (list, tuple, set, frozenset)):
+            stack.extend(item)
+        elif hasattr(item, '__dict__'):
+            stack.append(item.__dict__)
+    return heap, mapped
+
+
+class Resource:
+    """One loaded resource and its bookkeeping."""
+
+    def __init__(self, name, value, stamp, load_seconds):
+        self.name = name
+        self.value = value
+        self.stamp = stamp
+        self.load_seconds = load_seconds
+        self.loaded_at = time.time()
+        self._footprint = None
+
+    def footprint(self):
+        """Memory per component, ``{component: (heap_bytes, mapped_bytes)}``; computed on first use."""
+        if self._footprint is None:
+            components = getattr(self.value, 'memory_components', None)
+            parts = components() if components else {'total': self.value}
+            self._footprint = {component: memory_footprint(part) for component, part in parts.items()}
+        return self._footprint
+
+    def stats(self):
+        footprint = self.footprint()
+        return {
+            'name': self.name,
+            'load_seconds': self.load_seconds,
+            'loaded_at': self.loaded_at,
+            'heap_bytes': sum(heap for heap, _ in footprint.values()),
+            'mapped_bytes': sum(mapped for _, mapped in footprint.values()),
+            'components': {component: {'heap_bytes': heap, 'mapped_bytes': mapped}
+                           for component, (heap, mapped) in footprint.items()},
+        }
+
+
+class Registry:
+    """Name -> loaded resource, loading each at most once per stamp even under concurrent requests."""
+
+    def __init__(self):
+        self._resources = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, loader, stamp=None):
+        resource = self._resources.get(name)
+        if resource is not None and resource.stamp == stamp:
+            return resource.value
+
+        with self._lock:
+            name_lock = self._locks.setdefault(name, threading.Lock())
+        with name_lock:
+            resource = self._resources.get(name)
+            if resource is None or resource.stamp != stamp:
+                started = time.perf_counter()
+                with instrument.span('registry.load'):
+                    value = loader()
+                resource = Resource(name, value, stamp, time.perf_counter() - started)
+                self._resources[name] = resource
+        return resource.value
+
+    def resource(self, name):
+        return self._resources.get(name)
+
+    def stats(self):
+        """Load time and memory of every loaded resource."""
+        return [resource.stats() for resource in list(self._resources.values())]
+
+    def clear(self, name=None):
+        with self._lock:
+            if name is None:
+                self._resources.clear()
+            else:
+                self._resources.pop(name, None)
+
+
+_registry = Registry()
+
+
+def get_registry():
+    """The process-wide registry."""
+    return _registry
+
+
+def _megabytes(size):
+    return f"{size / 2**20:.1f} MB"
+
+
+def main():
+    # Run as a script this module is __main__; the shared registry lives in the imported copy.
+    from recommender import ann, registry, service
+
+    parser = argparse.ArgumentParser(description="Load the model once and report load time and memory footprint.")
+    parser.add_argument('--model', default='model', help="Model directory")
+    parser.add_argument('--backend', default=ann.DEFAULT_BACKEND, help="neighbors, exact or ivf")
+    args = parser.parse_args()
+
+    recommender = service.load_recommender(args.model, args.backend)
+    started = time.perf_counter()
+    for _ in range(1000):
+        service.load_recommender(args.model, args.backend)
+    print(f"Cached lookup: {(time.perf_counter() - started) * 1000:.1f} us per call")
+    for stats in registry.get_registry().stats():
+        print(f"{stats['name']}: loaded in {stats['load_seconds']:.3f}s, heap {_megabytes(stats['heap_bytes'])}, "
+              f"mapped {_megabytes(stats['mapped_bytes'])}")
+        for component, sizes in stats['components'].items():
+            seconds = recommender.load_timings.get(component)
+            timing = f", {seconds:.3f}s" if seconds is not None else ""
+            print(f"  {component:<12} heap {_megabytes(sizes['heap_bytes']):>10}, mapped {_megabytes(sizes['mapped_bytes']):>10}{timing}")
+
+
+if __name__ == '__main__':
+    main()
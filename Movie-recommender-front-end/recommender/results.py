@@ -0,0 +1,92 @@
+"""Bounded in-process cache of ranked recommendation results.
+
+Entries are keyed by ``(query, k, model_version)`` and hold only movie ids
+and scores. Titles and posters are looked up separately (posters through
+the metadata cache), so a TMDB failure never ends up inside a cached
+result, and a model rebuild simply misses every old key without flushing
+any metadata. The least recently used entries are evicted once the cache
+holds ``max_entries`` results.
+"""
+import os
+import threading
+from collections import OrderedDict
+
+from recommender import instrument
+
+MAX_ENTRIES = int(os.environ.get('RECOMMENDATION_CACHE_SIZE', 4096))
+
+
+class ResultCache:
+    """Thread-safe LRU of ``(ids, scores)`` tuples."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, query, k, model_version):
+        """Cached ``(ids, scores)`` or None."""
+        key = (query, k, model_version)
+        with self._lock:
+            result = self._entries.get(key)
+            if result is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(key)
+                self.hits += 1
+        instrument.cache_lookups('results', result is not None, result is None)
+        return result
+
+    def set(self, query, k, model_version, ids, scores):
+        """Stores a result; returns it in the cached ``(ids, scores)`` form."""
+        key = (query, k, model_version)
+        result = (tuple(int(movie_id) for movie_id in ids), tuple(float(score) for score in scores))
+        with self._lock:
+            self._entries[key] = result
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return result
+
+    def get_or_compute(self, query, k, model_version, compute):
+        """Cached result, or ``compute()`` stored and returned. A None from compute is returned but not cached."""
+        result = self.get(query, k, model_version)
+        if result is not None:
+            return result
+        computed = compute()
+        if computed is None:
+            return None
+        return self.set(query, k, model_version, *computed)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            hits, misses, entries = self.hits, self.misses, len(self._entries)
+        lookups = hits + misses
+        return {
+            'entries': entries,
+            'hits': hits,
+            'misses': misses,
+            'hit_ratio': hits / lookups if lookups else 0.0,
+        }
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_cache():
+    """Process-wide result cache."""
+    global _default_cache
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResultCache()
+        return _default_cache
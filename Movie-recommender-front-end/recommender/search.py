@@ -0,0 +1,146 @@
+"""Title search: normalized tokens, an inverted index, prefix lookup and typo tolerance.
+
+Built once per model load. ``search`` returns ranked row indices of the
+movie table, so callers slice only the rows they show instead of copying
+and regex-scanning the whole DataFrame.
+
+Every query token must match a title token, either exactly, as a prefix
+("dark kni" finds "The Dark Knight") or, for tokens of four or more
+characters, within a small edit distance ("godfahter" finds "The
+Godfather"). Adjacent title words are also indexed joined together, so
+"spiderman" matches "Spider-Man". Fuzzy candidates come from a character trigram index over
+the title vocabulary, so only a handful of tokens are ever compared.
+"""
+import bisect
+import re
+import unicodedata
+from collections import defaultdict
+
+import numpy as np
+
+EXACT_SCORE = 3.0
+PREFIX_SCORE = 2.0
+FUZZY_SCORE = 1.0
+FULL_TITLE_BONUS = 10.0 # Whole normalized title equals the query
+TITLE_PREFIX_BONUS = 5.0 # Title starts with the query
+MIN_FUZZY_LENGTH = 4
+FUZZY_CANDIDATES = 50 # Tokens per query token checked for edit distance
+
+_non_alnum = re.compile(r'[^0-9a-z]+')
+
+
+def normalize(text):
+    """Lowercase ASCII with accents stripped and punctuation turned into single spaces."""
+    text = unicodedata.normalize('NFKD', str(text)).encode('ascii', 'ignore').decode('ascii')
+    return _non_alnum.sub(' ', text.lower()).strip()
+
+
+def _trigrams(token):
+    padded = f' {token} '
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _within_distance(a, b, limit):
+    """True if a and b are at most limit edits apart (insert, delete, substitute, swap neighbors)."""
+    if abs(len(a) - len(b)) > limit:
+        return False
+    before, previous = None, list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            cost = min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (char_a != char_b))
+            if i > 1 and j > 1 and char_a == b[j - 2] and a[i - 2] == char_b:
+                cost = min(cost, before[j - 2] + 1)
+            current.append(cost)
+        if min(current) > limit:
+            return False
+        before, previous = previous, current
+    return previous[-1] <= limit
+
+
+class TitleIndex:
+    """Inverted index over the titles of the movie table; rows are table positions."""
+
+    def __init__(self, titles):
+        self.titles = [normalize(title) for title in titles]
+        postings = defaultdict(list)
+        for row, title in enumerate(self.titles):
+            words = title.split()
+            # Joined neighbors too, so "spiderman" finds "Spider-Man".
+            for token in dict.fromkeys(words + [a + b for a, b in zip(words, words[1:])]):
+                postings[token].append(row)
+
+        self.tokens = sorted(postings)
+        self._postings = [np.array(postings[token], dtype=np.intp) for token in self.tokens]
+        self._title_array = np.array(self.titles, dtype=str)
+        self._title_lengths = np.char.str_len(self._title_array)
+        trigrams = defaultdict(list)
+        for token_id, token in enumerate(self.tokens):
+            for trigram in _trigrams(token):
+                trigrams[trigram].append(token_id)
+        self._trigrams = {trigram: np.array(ids, dtype=np.intp) for trigram, ids in trigrams.items()}
+
+    def __len__(self):
+        return len(self.titles)
+
+    def _prefix_range(self, prefix):
+        start = bisect.bisect_left(self.tokens, prefix)
+        stop = bisect.bisect_left(self.tokens, prefix + '\x7f', lo=start)
+        return start, stop
+
+    def _fuzzy_tokens(self, token):
+        """Ids of vocabulary tokens within edit distance 1 (2 for long tokens) of token."""
+        grams = [self._trigrams[gram] for gram in _trigrams(token) if gram in self._trigrams]
+        if not grams:
+            return []
+        counts = np.bincount(np.concatenate(grams), minlength=len(self.tokens))
+        candidates = np.argsort(-counts, kind='stable')[:FUZZY_CANDIDATES]
+        limit = 1 if len(token) < 8 else 2
+        return [int(token_id) for token_id in candidates
+                if counts[token_id] and _within_distance(token, self.tokens[token_id], limit)]
+
+    def _token_scores(self, token, fuzzy):
+        """Best score per row for one query token: exact > prefix > fuzzy."""
+        scores = np.zeros(len(self.titles), dtype=np.float32)
+        start, stop = self._prefix_range(token)
+        for token_id in range(start, stop):
+            rows = self._postings[token_id]
+            scores[rows] = np.maximum(scores[rows], EXACT_SCORE if self.tokens[token_id] == token else PREFIX_SCORE)
+        if fuzzy and len(token) >= MIN_FUZZY_LENGTH:
+            for token_id in self._fuzzy_tokens(token):
+                rows = self._postings[token_id]
+                scores[rows] = np.maximum(scores[rows], FUZZY_SCORE)
+        return scores
+
+    def search(self, query, limit=None, fuzzy=True):
+        """Rows whose title matches every token of the query, best first.
+
+        Ranking: full-title and title-prefix matches first, then the summed
+        per-token match quality, then shorter titles, then table order.
+        """
+        normalized = normalize(query)
+        tokens = normalized.split()
+        if not tokens:
+            return []
+
+        total = np.zeros(len(self.titles), dtype=np.float32)
+        matched = np.ones(len(self.titles), dtype=bool)
+        for token in dict.fromkeys(tokens):
+            scores = self._token_scores(token, fuzzy)
+            matched &= scores > 0
+            total += scores
+            if not matched.any():
+                return []
+
+        rows = np.flatnonzero(matched)
+        titles = self._title_array[rows]
+        total = total[rows] + np.where(titles == normalized, FULL_TITLE_BONUS,
+                                       np.where(np.char.startswith(titles, normalized), TITLE_PREFIX_BONUS, 0))
+
+        order = np.lexsort((rows, self._title_lengths[rows], -total))
+        ranked = rows[order]
+        return ranked[:limit].tolist() if limit is not None else ranked.tolist()
+
+    def suggest(self, prefix, limit=10):
+        """Type-ahead: the best ``limit`` rows for a partially typed title."""
+        return self.search(prefix, limit=limit)
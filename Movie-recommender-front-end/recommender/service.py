@@ -0,0 +1,162 @@
+"""Everything needed to serve recommendations, loaded once and free of any UI code.
+
+``Recommender`` opens the model directory and builds the movie table, the
+title/id lookups, the title search index and (optionally) a live search
+backend. Both the Streamlit app and the HTTP API (``recommender.api``) sit
+on top of one instance per process, obtained through ``load_recommender``.
+"""
+import ast
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from recommender import ann, instrument, personalize, registry, results
+from recommender.artifacts import HEADER_FILE, ArtifactError, load_artifact
+from recommender.lookup import MovieLookup
+from recommender.ranking import similar_movies
+from recommender.search import TitleIndex
+
+REQUIRED_COLUMNS = ('id', 'title')
+DEFAULT_K = 6
+
+
+def parse_genres(value):
+    """Genre list from a list, a Python/JSON list literal or a ``|``-separated string."""
+    if isinstance(value, list):
+        return [str(genre) for genre in value]
+    if isinstance(value, str):
+        try:
+            parsed = ast.literal_eval(value)
+            return [str(genre) for genre in parsed] if isinstance(parsed, (list, tuple)) else [str(parsed)]
+        except (SyntaxError, ValueError):
+            return [genre.strip() for genre in value.split('|')] if '|' in value else [value.strip()]
+    return []
+
+
+class Recommender:
+    """Loaded model plus the indexes built from it. Read-only once constructed."""
+
+    def __init__(self, model_path='model', backend=ann.DEFAULT_BACKEND, result_cache=None):
+        self.model_path = model_path
+        self.load_timings = {}
+        started = time.perf_counter()
+        self.model = load_artifact(model_path)
+        missing = [column for column in REQUIRED_COLUMNS if column not in self.model.columns]
+        if missing:
+            raise ArtifactError(f"The model is missing the required {missing} columns. Please rebuild it.")
+
+        self.movies = pd.DataFrame(self.model.to_dict())
+        self.movies['genres'] = ([[] for _ in range(len(self.movies))] if 'genres' not in self.movies.columns
+                                 else self.movies['genres'].apply(parse_genres))
+        self.neighbors = self.model.neighbors
+        self.movie_ids = self.movies['id'].to_numpy()
+        self.titles = self.movies['title'].tolist()
+        self.lookup = MovieLookup(self.titles, self.movie_ids)
+        self.load_timings['model'] = time.perf_counter() - started
+
+        started = time.perf_counter()
+        self.title_index = TitleIndex(self.titles)
+        self.load_timings['title_index'] = time.perf_counter() - started
+
+        # Optional live search over the tag vectors instead of the precomputed neighbors.
+        self.backend = backend
+        self.engine = None
+        self.engine_error = None
+        if backend != 'neighbors':
+            started = time.perf_counter()
+            try:
+                self.engine = ann.load_index(model_path, backend)
+            except (FileNotFoundError, ValueError) as e:
+                self.engine_error = str(e)
+            self.load_timings['engine'] = time.perf_counter() - started
+        # Results from the precomputed neighbors and from a live search backend differ.
+        self.version = f"{self.model.build_hash}:{backend if self.engine is not None else 'neighbors'}"
+        self.result_cache = result_cache or results.get_cache()
+
+    def __len__(self):
+        return len(self.titles)
+
+    @property
+    def max_k(self):
+        """Most results ``recommend`` can return per title: the model stores only K neighbors per movie."""
+        if self.engine is not None:
+            return max(0, len(self.engine) - 1)
+        return self.neighbors.shape[1]
+
+    def memory_components(self):
+        """What this instance holds, by component, for ``registry.memory_footprint``."""
+        return {
+            'model': (self.model, self.movies, self.movie_ids, self.titles, self.lookup),
+            'title_index': self.title_index,
+            'engine': self.engine,
+        }
+
+    def title_for_id(self, movie_id):
+        row = self.lookup.row_for_id(movie_id)
+        return None if row is None else self.titles[row]
+
+    def titles_for_ids(self, movie_ids):
+        return [self.title_for_id(movie_id) for movie_id in movie_ids]
+
+    @instrument.timed('service.rank')
+    def _rank(self, row, k):
+        if self.engine is not None:
+            similar_rows, scores = self.engine.similar(row, k=k)
+        else:
+            similar_rows, scores = similar_movies(self.neighbors, row, k=k)
+        return self.movie_ids[similar_rows], scores
+
+    def recommend(self, title, k=DEFAULT_K):
+        """``(movie_ids, scores)`` of the k movies most similar to the title. Raises KeyError for unknown titles."""
+        row = self.lookup.row_for_title(title)
+        if row is None:
+            raise KeyError(title)
+        return self.result_cache.get_or_compute(title, k, self.version, lambda: self._rank(row, k))
+
+    def recommend_batch(self, titles, k=DEFAULT_K):
+        """``recommend`` for many titles; uncached ones are ranked in one batched pass. Unknown titles map to None."""
+        output = {}
+        todo = []
+        for title in dict.fromkeys(titles):
+            row = self.lookup.row_for_title(title)
+            if row is None:
+                output[title] = None
+                continue
+            cached = self.result_cache.get(title, k, self.version)
+            if cached is not None:
+                output[title] = cached
+            else:
+                todo.append((title, row))
+
+        if todo and self.engine is None:
+            rows = np.array([row for _, row in todo], dtype=np.intp)
+            with instrument.span('service.rank_batch'):
+                similar_rows, scores = similar_movies(self.neighbors, rows, k=k)
+            for (title, _), movie_rows, movie_scores in zip(todo, similar_rows, scores):
+                output[title] = self.result_cache.set(title, k, self.version, self.movie_ids[movie_rows], movie_scores)
+        else:
+            for title, row in todo:
+                output[title] = self.result_cache.set(title, k, self.version, *self._rank(row, k))
+        return [output[title] for title in titles]
+
+    def search(self, query, limit=10):
+        """``[(movie_id, title)]`` of the best title matches."""
+        return [(int(self.movie_ids[row]), self.titles[row]) for row in self.title_index.search(query, limit=limit)]
+
+    def for_you(self, user_id, k=personalize.DEFAULT_K, pool=None):
+        """Personalized ``(movie_ids, scores)`` from the user's ratings and watchlist."""
+        return personalize.recommend_for_user(user_id, self.neighbors, self.movie_ids, self.lookup, k=k,
+                                              model_version=self.model.build_hash, pool=pool)
+
+
+def load_recommender(model_path='model', backend=ann.DEFAULT_BACKEND):
+    """The process-wide ``Recommender`` for a model directory, loaded on first use.
+
+    Later calls cost one ``os.stat`` of the model header; rewriting the model
+    (which replaces the header) makes the next call load it again.
+    """
+    stamp = os.stat(os.path.join(model_path, HEADER_FILE)).st_mtime_ns
+    return registry.get_registry().get(('recommender', os.path.abspath(model_path), backend),
+                                       lambda: Recommender(model_path, backend), stamp=stamp)
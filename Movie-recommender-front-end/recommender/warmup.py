@@ -0,0 +1,93 @@
+"""Offline warm-up of the metadata cache for the whole catalog.
+
+Walks every movie id in the model, fetches TMDB details for the ones that
+are missing or close to expiry, and writes them into the same disk cache
+the app reads from, so page views never need to call TMDB.
+
+The job is incremental and resumable: results are committed chunk by
+chunk, and a rerun only fetches ids that are still missing or stale.
+
+    python -m recommender.warmup --model model --workers 8 --rate 30
+"""
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from recommender.artifacts import load_artifact
+from recommender.http_client import HttpClient
+from recommender.metadata import MAX_WORKERS, TMDB_BASE_URL, download_movie_details, store_movie_details
+from recommender.metadata_cache import DEFAULT_CACHE_PATH, MetadataCache
+
+WARM_TTL = 90 * 24 * 3600 # Catalog metadata is effectively static
+REFRESH_WITHIN = 7 * 24 * 3600 # Refetch entries expiring sooner than this
+CHUNK_SIZE = 200
+DEFAULT_RATE = 30 # Requests per second; TMDB allows roughly 40
+
+
+def stale_movie_ids(cache, movie_ids, refresh_within=REFRESH_WITHIN):
+    """Ids with no cached details, only a failed lookup, or details expiring within ``refresh_within`` seconds."""
+    deadline = time.time() + refresh_within
+    stale = []
+    for start in range(0, len(movie_ids), 1000):
+        chunk = movie_ids[start:start + 1000]
+        expiry = cache.expiry_times(f'tmdb:{movie_id}' for movie_id in chunk)
+        stale.extend(movie_id for movie_id in chunk if expiry.get(f'tmdb:{movie_id}', 0) <= deadline)
+    return stale
+
+
+def warm_up(movie_ids, cache, workers=MAX_WORKERS, rate=DEFAULT_RATE, ttl=WARM_TTL,
+            refresh_within=REFRESH_WITHIN, base_url=TMDB_BASE_URL, chunk_size=CHUNK_SIZE, progress=print):
+    """Fetches and caches details for every stale id. Returns ``(fetched, failed)`` counts."""
+    movie_ids = list(dict.fromkeys(int(movie_id) for movie_id in movie_ids))
+    todo = stale_movie_ids(cache, movie_ids, refresh_within)
+    progress(f"{len(movie_ids)} movies, {len(movie_ids) - len(todo)} already fresh, {len(todo)} to fetch")
+    if not todo:
+        return 0, 0
+
+    # Its own client, so --rate applies instead of the shared default.
+    client = HttpClient(rates={'tmdb': rate})
+
+    def fetch(movie_id):
+        return download_movie_details(movie_id, client, base_url)
+
+    fetched = failed = 0
+    started = time.monotonic()
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        for start in range(0, len(todo), chunk_size):
+            chunk = todo[start:start + chunk_size]
+            results = dict(zip(chunk, executor.map(fetch, chunk)))
+            store_movie_details(cache, results, ttl=ttl)
+
+            chunk_failed = sum('error' in details for details in results.values())
+            failed += chunk_failed
+            fetched += len(chunk) - chunk_failed
+            elapsed = time.monotonic() - started
+            done = start + len(chunk)
+            progress(f"{done}/{len(todo)} fetched, {failed} failed, {done / elapsed:.1f} movies/s")
+    return fetched, failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prefetch TMDB metadata for every movie in the model into the local cache.")
+    parser.add_argument('--model', default='model', help="Model directory")
+    parser.add_argument('--cache', default=DEFAULT_CACHE_PATH, help="Metadata cache file the app reads")
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help="Concurrent requests")
+    parser.add_argument('--rate', type=float, default=DEFAULT_RATE, help="Maximum requests per second (0 = unlimited)")
+    parser.add_argument('--ttl-days', type=float, default=WARM_TTL / 86400, help="How long fetched entries stay fresh")
+    parser.add_argument('--refresh-days', type=float, default=REFRESH_WITHIN / 86400,
+                        help="Refetch entries that expire within this many days")
+    parser.add_argument('--limit', type=int, default=None, help="Only consider the first N movies")
+    args = parser.parse_args()
+
+    movie_ids = load_artifact(args.model).column('id').tolist()[:args.limit]
+    cache = MetadataCache(args.cache)
+    if len(movie_ids) > cache.max_entries:
+        print(f"Warning: {len(movie_ids)} movies exceed the cache size of {cache.max_entries}; raise METADATA_CACHE_MAX_ENTRIES.")
+    started = time.monotonic()
+    fetched, failed = warm_up(movie_ids, cache, workers=args.workers, rate=args.rate,
+                              ttl=args.ttl_days * 86400, refresh_within=args.refresh_days * 86400)
+    print(f"Done in {time.monotonic() - started:.1f}s: {fetched} fetched, {failed} failed. Cache: {cache.stats()}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,22 @@
+import pytest
+
+from benchmarks.stub_tmdb import StubTMDB
+from recommender.http_client import HttpClient
+from recommender.metadata_cache import MetadataCache
+
+
+@pytest.fixture
+def stub():
+    with StubTMDB() as server:
+        yield server
+
+
+@pytest.fixture
+def client():
+    """Unlimited rate and near-instant backoff, so retries do not slow the tests down."""
+    return HttpClient(rates={}, backoff_base=0.001)
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return MetadataCache(str(tmp_path / 'metadata_cache.db'))
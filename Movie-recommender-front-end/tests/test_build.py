@@ -0,0 +1,81 @@
+import numpy as np
+import pytest
+from sklearn.feature_extraction.text import CountVectorizer
+
+from recommender.build import match_previous_rows, update_neighbors, vectorize
+from recommender.neighbors import neighbors_from_vectors, normalize_rows
+
+K = 5
+
+
+def _tags(rng, n, words=120, length=12):
+    return [' '.join(f"w{i}" for i in rng.integers(0, words, size=length)) for _ in range(n)]
+
+
+def _assert_same_index(patched, rebuilt):
+    """Equal scores everywhere; equal ids except where tied scores make the order arbitrary."""
+    np.testing.assert_allclose(patched['score'], rebuilt['score'], rtol=1e-5, atol=1e-6)
+    for row in range(len(rebuilt)):
+        kth = rebuilt['score'][row, -1]
+        above = rebuilt['score'][row] > kth + 1e-6
+        assert set(patched['id'][row][above]) == set(rebuilt['id'][row][above])
+        # Ties at the boundary may pick different movies, but never different scores.
+        assert len(set(patched['id'][row])) == K
+
+
+@pytest.fixture
+def previous_build():
+    rng = np.random.default_rng(0)
+    tags = _tags(rng, 60)
+    hashes = [f"h{i}" for i in range(60)]
+    matrix, vocabulary, reused, refit = vectorize(tags, hashes, None)
+    assert refit and reused == 0
+    neighbors = neighbors_from_vectors(normalize_rows(matrix), K, normalized=True)
+    return rng, tags, hashes, matrix, vocabulary, neighbors
+
+
+def test_vectorize_reuses_rows_of_unchanged_movies(previous_build):
+    rng, tags, hashes, matrix, vocabulary, _ = previous_build
+    new_tags = tags[:50] + _tags(rng, 3)
+    new_hashes = hashes[:50] + ['new1', 'new2', 'new3']
+    new_tags[10], new_hashes[10] = _tags(rng, 1)[0], 'changed10'
+
+    new_matrix, new_vocabulary, reused, refit = vectorize(new_tags, new_hashes, (matrix, hashes, vocabulary))
+
+    assert not refit and new_vocabulary == vocabulary
+    assert reused == 49
+    expected = CountVectorizer(vocabulary=vocabulary).transform(new_tags)
+    assert (new_matrix != expected).nnz == 0
+
+
+def test_match_previous_rows_with_removed_reordered_and_duplicate_hashes():
+    previous = ['a', 'b', 'c', 'd', 'b']
+    rows = match_previous_rows(['d', 'b', 'x', 'a', 'b', 'b'], previous)
+    # 'c' was removed, 'x' is new and a third 'b' has no old row left.
+    assert rows.tolist() == [3, 1, -1, 0, 4, -1]
+
+
+def test_update_neighbors_matches_a_full_rebuild(previous_build):
+    rng, tags, hashes, matrix, vocabulary, neighbors = previous_build
+    # Remove two movies, change three, add four and shuffle the catalog order.
+    keep = [i for i in range(60) if i not in (7, 31)]
+    new_tags = [tags[i] for i in keep]
+    new_hashes = [hashes[i] for i in keep]
+    for position in (0, 20, 45):
+        new_tags[position], new_hashes[position] = _tags(rng, 1)[0], f"changed{position}"
+    new_tags += _tags(rng, 4)
+    new_hashes += [f"new{i}" for i in range(4)]
+    order = rng.permutation(len(new_tags))
+    new_tags = [new_tags[i] for i in order]
+    new_hashes = [new_hashes[i] for i in order]
+
+    new_matrix, _, _, _ = vectorize(new_tags, new_hashes, (matrix, hashes, vocabulary))
+    normalized = normalize_rows(new_matrix)
+    previous_rows = match_previous_rows(new_hashes, hashes)
+    assert (previous_rows < 0).sum() == 7
+
+    patched, recomputed = update_neighbors(normalized, K, neighbors, previous_rows)
+    rebuilt = neighbors_from_vectors(normalized, K, normalized=True)
+
+    assert recomputed < len(new_hashes)
+    _assert_same_index(patched, rebuilt)
@@ -0,0 +1,94 @@
+import pytest
+
+from recommender import db
+
+RATING_STATS_COLUMNS = "movie_id, rating_sum, rating_count, stars_1, stars_2, stars_3, stars_4, stars_5"
+FROM_SCRATCH = f"""
+    SELECT movie_id, SUM(rating), COUNT(rating),
+           SUM(rating = 1), SUM(rating = 2), SUM(rating = 3), SUM(rating = 4), SUM(rating = 5)
+    FROM movie_ratings WHERE rating IS NOT NULL GROUP BY movie_id ORDER BY movie_id
+"""
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = db.ConnectionPool(str(tmp_path / 'user_profiles.db'), size=2)
+    yield pool
+    pool.close()
+
+
+def _aggregates(pool):
+    with pool.connection() as conn:
+        stats = conn.execute(f"SELECT {RATING_STATS_COLUMNS} FROM movie_rating_stats "
+                             "WHERE rating_count > 0 ORDER BY movie_id").fetchall()
+        expected = conn.execute(FROM_SCRATCH).fetchall()
+    return stats, expected
+
+
+def test_rating_aggregates_match_a_full_recount_after_inserts_and_rerates(pool):
+    for user_id, movie_id, rating in [(1, 10, 5), (2, 10, 3), (3, 10, 3), (1, 20, 1), (2, 20, 4), (3, 30, 2)]:
+        db.add_movie_rating(user_id, movie_id, rating, pool=pool)
+    # Re-rates, including one to the same value.
+    for user_id, movie_id, rating in [(2, 10, 4), (1, 20, 5), (3, 30, 2), (3, 10, 1)]:
+        db.add_movie_rating(user_id, movie_id, rating, pool=pool)
+
+    stats, expected = _aggregates(pool)
+    assert stats == expected
+    assert db.get_average_movie_rating(10, pool=pool) == (round((5 + 4 + 1) / 3, 1), 3)
+    assert db.get_rating_histogram(20, pool=pool) == [0, 0, 0, 1, 1]
+
+
+def test_backfill_matches_incremental_maintenance(pool):
+    for user_id, movie_id, rating in [(1, 10, 5), (2, 10, 2), (1, 20, 3)]:
+        db.add_movie_rating(user_id, movie_id, rating, pool=pool)
+    incremental, _ = _aggregates(pool)
+
+    db.backfill_aggregates(pool)
+    stats, expected = _aggregates(pool)
+    assert stats == expected == incremental
+
+
+def test_legacy_out_of_range_rating_can_be_changed(pool):
+    with pool.connection() as conn:
+        conn.execute("INSERT INTO movie_ratings (user_id, movie_id, rating) VALUES (1, 10, 7)")
+    db.backfill_aggregates(pool)
+
+    db.add_movie_rating(1, 10, 4, pool=pool)
+    db.add_movie_rating(2, 10, 2, pool=pool)
+
+    stats, expected = _aggregates(pool)
+    assert stats == expected
+    assert db.get_user_movie_rating(1, 10, pool=pool) == 4
+
+
+def test_new_ratings_outside_one_to_five_are_rejected(pool):
+    with pytest.raises(ValueError):
+        db.add_movie_rating(1, 10, 7, pool=pool)
+    stats, _ = _aggregates(pool)
+    assert stats == []
+
+
+def test_review_pages_follow_keyset_order_across_page_boundaries(pool):
+    db.create_user('reviewer', 'secret', pool=pool)
+    user_id, = db.verify_user('reviewer', 'secret', pool=pool)
+    # Several reviews share a timestamp, so page boundaries fall inside ties that review_id breaks.
+    stamps = ['2024-01-03', '2024-01-01', '2024-01-02', '2024-01-02', '2024-01-02', '2024-01-04', '2024-01-01', '2024-01-02']
+    with pool.connection() as conn:
+        for i, stamp in enumerate(stamps):
+            conn.execute("INSERT INTO movie_reviews (user_id, movie_id, review_text, timestamp) VALUES (?, 10, ?, ?)",
+                         (user_id, f"review {i}", stamp))
+        conn.execute("INSERT INTO movie_reviews (user_id, movie_id, review_text, timestamp) VALUES (?, 11, 'other', '2024-01-05')",
+                     (user_id,))
+        expected = [row[0] for row in conn.execute(
+            "SELECT review_text FROM movie_reviews WHERE movie_id = 10 ORDER BY timestamp DESC, review_id DESC")]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page, cursor = db.get_movie_reviews_page(10, limit=3, after=cursor, pool=pool)
+        seen += [text for text, username, _ in page]
+        assert all(username == 'reviewer' for _, username, _ in page)
+        pages += 1
+        if cursor is None:
+            break
+    assert seen == expected
+    assert pages == 3
@@ -0,0 +1,150 @@
+import random
+import threading
+import time
+
+import pytest
+import requests
+from requests.exceptions import ChunkedEncodingError, ConnectionError, HTTPError, InvalidURL
+
+from benchmarks.stub_tmdb import StubTMDB
+from recommender.http_client import CircuitOpenError, HttpClient
+
+
+def _breaker(client, api='tmdb'):
+    return client.stats()[api]
+
+
+class FlakySession:
+    """Raises the queued errors first, then passes calls on to a real session."""
+
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.session = requests.Session()
+
+    def get(self, url, **kwargs):
+        if self.errors:
+            raise self.errors.pop(0)
+        return self.session.get(url, **kwargs)
+
+
+def test_backoff_is_jittered_within_an_exponential_window(client):
+    random.seed(0)
+    for attempt in range(8):
+        window = min(client.backoff_cap, client.backoff_base * 2 ** attempt)
+        delays = [client.backoff(attempt) for _ in range(50)]
+        assert all(0 <= delay <= window for delay in delays)
+        assert len(set(delays)) > 1
+
+
+def test_transient_errors_are_retried(stub, client):
+    stub.fail_next(2)
+    assert client.get_json(f"{stub.url}/movie/1", api='tmdb')['id'] == 1
+    assert stub.requests == 3
+    assert _breaker(client) == {'state': 'closed', 'failures': 0, 'opened': 0, 'rate': 0}
+
+
+def test_gives_up_after_the_last_retry(stub, client):
+    stub.fail_next(3)
+    with pytest.raises(HTTPError):
+        client.get(f"{stub.url}/movie/1", api='tmdb')
+    assert stub.requests == 3
+    assert _breaker(client)['failures'] == 1
+
+
+def test_429_waits_for_retry_after(stub, client):
+    stub.fail_next(1, status=429)
+    started = time.monotonic()
+    assert client.get_json(f"{stub.url}/movie/1", api='tmdb')['id'] == 1
+    # The stub asks for one second; the client's own backoff would be a millisecond.
+    assert time.monotonic() - started >= stub.retry_after
+    assert stub.requests == 2
+
+
+def test_429_with_a_retry_after_beyond_the_cap_fails_at_once(stub):
+    client = HttpClient(rates={}, backoff_cap=0.5)
+    stub.fail_next(1, status=429)
+    with pytest.raises(HTTPError) as error:
+        client.get(f"{stub.url}/movie/1", api='tmdb')
+    assert error.value.response.status_code == 429
+    assert stub.requests == 1
+
+
+def test_breaker_opens_then_half_opens_and_closes(stub):
+    client = HttpClient(rates={}, retries=0, breaker_reset=0.2)
+    stub.fail_next(5)
+    for _ in range(5):
+        with pytest.raises(HTTPError):
+            client.get(f"{stub.url}/movie/1", api='tmdb')
+    assert _breaker(client)['state'] == 'open'
+    assert _breaker(client)['opened'] == 1
+
+    with pytest.raises(CircuitOpenError):
+        client.get(f"{stub.url}/movie/1", api='tmdb')
+    assert stub.requests == 5
+
+    time.sleep(0.25)
+    assert _breaker(client)['state'] == 'half-open'
+    assert client.get_json(f"{stub.url}/movie/1", api='tmdb')['id'] == 1
+    assert _breaker(client)['state'] == 'closed'
+    assert _breaker(client)['failures'] == 0
+
+
+def test_failed_trial_call_opens_the_breaker_again(stub):
+    client = HttpClient(rates={}, retries=0, breaker_threshold=1, breaker_reset=0.1)
+    stub.fail_next(2)
+    with pytest.raises(HTTPError):
+        client.get(f"{stub.url}/movie/1", api='tmdb')
+    time.sleep(0.15)
+    with pytest.raises(HTTPError):
+        client.get(f"{stub.url}/movie/1", api='tmdb')
+    assert _breaker(client)['state'] == 'open'
+    assert _breaker(client)['opened'] == 2
+
+
+def test_not_found_does_not_trip_the_breaker(stub):
+    client = HttpClient(rates={}, retries=0)
+    for _ in range(client.breaker_threshold + 1):
+        with pytest.raises(HTTPError) as error:
+            client.get(f"{stub.url}/unknown", api='tmdb')
+        assert error.value.response.status_code == 404
+    assert stub.requests == client.breaker_threshold + 1
+    assert _breaker(client)['state'] == 'closed'
+    assert _breaker(client)['failures'] == 0
+
+
+def test_identical_concurrent_gets_share_one_request(client):
+    callers = 8
+    barrier = threading.Barrier(callers)
+    results = []
+
+    def fetch():
+        barrier.wait()
+        results.append(client.get_json(f"{stub.url}/movie/7", {'append_to_response': 'credits'}, api='tmdb'))
+
+    with StubTMDB(delay=0.3) as stub:
+        threads = [threading.Thread(target=fetch) for _ in range(callers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert stub.requests == 1
+    assert len(results) == callers
+    assert all(result == results[0] for result in results)
+
+
+@pytest.mark.parametrize('error', [InvalidURL("bad url"), ChunkedEncodingError("connection broken")])
+def test_trial_call_error_is_recorded(stub, error):
+    # A trial call that raised without recording an outcome left the breaker half-open for good.
+    session = FlakySession(ConnectionError("refused"), error)
+    client = HttpClient(session=session, rates={}, retries=0, breaker_threshold=1, breaker_reset=0.1)
+    with pytest.raises(ConnectionError):
+        client.get(f"{stub.url}/movie/1", api='tmdb')
+    time.sleep(0.15)
+    with pytest.raises(type(error)):
+        client.get(f"{stub.url}/movie/1", api='tmdb')
+    assert _breaker(client)['state'] == 'open'
+    assert _breaker(client)['opened'] == 2
+
+    time.sleep(0.15)
+    assert client.get_json(f"{stub.url}/movie/1", api='tmdb')['id'] == 1
+    assert _breaker(client)['state'] == 'closed'
@@ -0,0 +1,76 @@
+from recommender import metadata
+from recommender.http_client import HttpClient
+
+
+def test_fetch_many_returns_input_order_and_fetches_duplicates_once(stub, client, cache):
+    results = metadata.fetch_movie_details_many([5, 3, 9, 3], client=client, base_url=stub.url, cache=cache)
+
+    assert list(results) == [5, 3, 9]
+    assert results[3]['poster_path'] == metadata.POSTER_BASE_URL + '/poster3.jpg'
+    assert stub.requests == 3
+
+
+def test_fetch_many_answers_cached_ids_without_requests(stub, client, cache):
+    metadata.fetch_movie_details_many([1, 2], client=client, base_url=stub.url, cache=cache)
+    results = metadata.fetch_movie_details_many([2, 4, 1], client=client, base_url=stub.url, cache=cache)
+
+    assert list(results) == [2, 4, 1]
+    assert stub.requests == 3
+
+
+def test_failed_fetch_returns_error_dict_and_is_negatively_cached(stub, cache):
+    client = HttpClient(rates={}, retries=0)
+    stub.fail_next(2)
+    results = metadata.fetch_movie_details_many([1, 2], client=client, base_url=stub.url, cache=cache)
+
+    for details in results.values():
+        assert details['poster_path'] == metadata.ERROR_POSTER_URL
+        assert 'error' in details and not details.get('circuit_open')
+    assert set(cache.get_many(['tmdb:1', 'tmdb:2'])) == {'tmdb:1', 'tmdb:2'}
+
+
+def test_error_message_does_not_leak_the_api_key(cache):
+    client = HttpClient(rates={}, retries=0)
+    details = metadata.fetch_movie_details(1, client=client, base_url='http://127.0.0.1:1/3', cache=cache)
+
+    assert 'error' in details
+    assert metadata.TMDB_API_KEY not in details['error']
+    assert 'api_key' not in details['error']
+
+
+def test_calls_skipped_by_open_circuit_are_flagged_and_not_cached(stub, cache):
+    client = HttpClient(rates={}, retries=0, breaker_threshold=1)
+    stub.fail_next(1)
+    first = metadata.fetch_movie_details(1, client=client, base_url=stub.url, cache=cache)
+    second = metadata.fetch_movie_details(2, client=client, base_url=stub.url, cache=cache)
+
+    assert 'error' in first and not first.get('circuit_open')
+    assert second['circuit_open'] and second['poster_path'] == metadata.ERROR_POSTER_URL
+    assert stub.requests == 1
+    assert cache.get('tmdb:2') is None
+
+
+def test_expired_details_are_served_while_tmdb_fails(stub, cache):
+    client = HttpClient(rates={}, retries=0)
+    stale = {'poster_path': metadata.POSTER_BASE_URL + '/old.jpg', 'overview': "Old overview."}
+    cache.set('tmdb:7', stale, ttl=-1)
+    stub.fail_next(2)
+    results = metadata.fetch_movie_details_many([7, 8], client=client, base_url=stub.url, cache=cache)
+
+    assert results[7] == stale
+    assert 'error' in results[8]
+    # The failure must not replace the expired entry with a negative one.
+    assert cache.get_stale_many(['tmdb:7']) == {'tmdb:7': stale}
+
+
+def test_store_movie_details_prefers_stale_entries_over_failures(cache):
+    stale = {'poster_path': 'stale'}
+    cache.set('tmdb:1', stale, ttl=-1)
+    failure = {'poster_path': metadata.ERROR_POSTER_URL, 'error': "boom"}
+    fresh = {'poster_path': 'fresh'}
+
+    shown = metadata.store_movie_details(cache, {1: failure, 2: failure, 3: fresh})
+
+    assert shown == {1: stale, 2: failure, 3: fresh}
+    assert cache.get('tmdb:3') == fresh
+    assert cache.get('tmdb:2') == failure
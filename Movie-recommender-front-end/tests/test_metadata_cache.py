@@ -0,0 +1,32 @@
+import threading
+
+from recommender.metadata_cache import MetadataCache
+
+
+def test_connections_are_reused_across_threads(cache):
+    # Each Streamlit rerun runs on a new thread; none of them should open a connection of its own.
+    for _ in range(20):
+        thread = threading.Thread(target=cache.get, args=('tmdb:1',))
+        thread.start()
+        thread.join()
+    assert cache._created == 1
+
+
+def test_pool_never_grows_past_its_size(tmp_path):
+    cache = MetadataCache(str(tmp_path / 'cache.db'), pool_size=2)
+    threads = [threading.Thread(target=cache.set, args=(f'k{i}', i)) for i in range(16)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert cache._created <= 2
+    assert cache.get_many(f'k{i}' for i in range(16)) == {f'k{i}': i for i in range(16)}
+
+
+def test_expired_and_negative_entries(cache):
+    cache.set('fresh', {'a': 1})
+    cache.set('expired', {'b': 2}, ttl=-1)
+    cache.set('failed', {'error': "x"}, negative=True)
+
+    assert cache.get_many(['fresh', 'expired', 'failed']) == {'fresh': {'a': 1}, 'failed': {'error': "x"}}
+    assert cache.get_stale_many(['fresh', 'expired', 'failed']) == {'fresh': {'a': 1}, 'expired': {'b': 2}}